@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""Encoding benchmark for the long-video audio profiles.
+
+Generates a synthetic speech-like input (amplitude-modulated tones over low
+noise, stereo 48 kHz AAC, similar to a YouTube audio stream), then runs the
+same single-pass segment/speed-up/encode chain as the long-video path once
+per profile in ``yt_t.audio_utils.AUDIO_PROFILES``. Reports output size and
+encode time, plus the size projected to a 3-hour video.
+
+Usage:
+    python benchmarks/audio_profiles.py
+    python benchmarks/audio_profiles.py --minutes 20 --profile speech-opus --json
+"""
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from yt_t.audio_utils import AUDIO_PROFILES, prepare_audio_segments  # noqa: E402
+
+PROJECTED_HOURS = 3
+
+
+def generate_input(path: str, minutes: float):
+    """Write a synthetic stereo 48 kHz AAC file of the given length."""
+    seconds = int(minutes * 60)
+    source = (
+        f"aevalsrc='0.3*sin(2*PI*(180+40*sin(2*PI*0.5*t))*t)*(0.5+0.5*sin(2*PI*3*t))"
+        f"|0.3*sin(2*PI*(200+40*sin(2*PI*0.4*t))*t)*(0.5+0.5*sin(2*PI*3*t))'"
+        f":s=48000:d={seconds}"
+    )
+    subprocess.run(
+        ['ffmpeg', '-loglevel', 'error', '-f', 'lavfi', '-i', source,
+         '-f', 'lavfi', '-i', f'anoisesrc=a=0.01:r=48000:d={seconds}',
+         '-filter_complex', '[1]aformat=channel_layouts=stereo[n];[0][n]amix=inputs=2',
+         '-c:a', 'aac', '-b:a', '128k', '-y', path],
+        check=True,
+    )
+
+
+def measure(input_path: str, profile: str, speed: float, work_dir: str):
+    """Encode ``input_path`` with ``profile``; return (seconds, total output bytes)."""
+    output_dir = os.path.join(work_dir, profile)
+    os.makedirs(output_dir, exist_ok=True)
+    started = time.perf_counter()
+    # One segment per run: the benchmark measures encoding, not splitting
+    with contextlib.redirect_stdout(sys.stderr):
+        segments = prepare_audio_segments(input_path, speed=speed, segment_minutes=10 ** 6,
+                                          output_dir=output_dir, profile=profile)
+    elapsed = time.perf_counter() - started
+    return elapsed, sum(os.path.getsize(p) for p in segments)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--minutes', type=float, default=10.0, help='length of the synthetic input')
+    parser.add_argument('--speed', type=float, default=2.0)
+    parser.add_argument('--profile', action='append', choices=list(AUDIO_PROFILES),
+                        help='profile to measure (repeatable, default: all)')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    profiles = args.profile or list(AUDIO_PROFILES)
+    scale = PROJECTED_HOURS * 60 / args.minutes
+    results = []
+    with tempfile.TemporaryDirectory(prefix='yt_t_bench_') as work_dir:
+        input_path = os.path.join(work_dir, 'input.m4a')
+        generate_input(input_path, args.minutes)
+        input_bytes = os.path.getsize(input_path)
+        for profile in profiles:
+            elapsed, size = measure(input_path, profile, args.speed, work_dir)
+            results.append({
+                'profile': profile,
+                'mime_type': AUDIO_PROFILES[profile]['mime_type'],
+                'encode_seconds': round(elapsed, 3),
+                'realtime_factor': round(args.minutes * 60 / elapsed, 1),
+                'bytes': size,
+                'kbps': round(size * 8 / 1000 / (args.minutes * 60 / args.speed), 1),
+                f'projected_{PROJECTED_HOURS}h_mb': round(size * scale / 1e6, 1),
+            })
+
+    report = {
+        'input_minutes': args.minutes,
+        'input_bytes': input_bytes,
+        'speed': args.speed,
+        'results': results,
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"input: {args.minutes:g} min, {input_bytes / 1e6:.1f} MB, speed {args.speed:g}x")
+    for r in results:
+        print(f"  {r['profile']:<12} {r['bytes'] / 1e6:7.2f} MB  {r['kbps']:6.1f} kbps  "
+              f"{r['encode_seconds']:6.2f} s ({r['realtime_factor']:g}x realtime)  "
+              f"~{r[f'projected_{PROJECTED_HOURS}h_mb']} MB for {PROJECTED_HOURS} h")
+
+
+if __name__ == '__main__':
+    main()
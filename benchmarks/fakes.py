@@ -0,0 +1,526 @@
+#!/usr/bin/env python3
+"""Local stand-ins for the Gemini API and YouTube.
+
+``FakeGemini`` is an HTTP server that implements the part of the Gemini REST
+API yt_t uses: resumable file upload, file get/delete and streaming
+generation (``streamGenerateContent?alt=sse``). The time to first chunk,
+chunk count and cadence, 429/5xx injection, a concurrency quota and
+mid-stream hangs are all configurable. Point the CLI at it with
+``YT_T_GEMINI_BASE_URL``.
+
+``FakeYouTube`` is a deterministic synthetic catalog keyed by video ID.
+``install()`` replaces the functions that reach YouTube (caption track
+listing behind ``get_native_subtitles``, ``get_video_info``,
+``download_audio`` and the title lookup) in the current process. The caption
+selection, Gemini, segmenting and output code above them runs unchanged.
+``--streaming`` and ``yt-t sync`` still need the real yt-dlp and are not
+covered.
+
+Usage:
+    python benchmarks/fakes.py gemini --port 8900 --rate-limit-rate 0.05
+    YT_T_GEMINI_BASE_URL=http://127.0.0.1:8900 GEMINI_API_KEY=fake \\
+        python benchmarks/fakes.py youtube --caption-ratio 0.5 -- batch urls.txt
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Remote files expire after this long, like the real Files API
+FILE_TTL = timedelta(hours=48)
+
+
+def _jittered(value: float, jitter: float, rng: random.Random) -> float:
+    return max(0.0, value * rng.uniform(1 - jitter, 1 + jitter))
+
+
+def synthetic_srt(cues: int, seconds_per_cue: float = 4.0) -> str:
+    """SRT text with ``cues`` entries, one every ``seconds_per_cue`` seconds."""
+    def stamp(t: float) -> str:
+        ms = int(round(t * 1000))
+        return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d},{ms % 1000:03d}"
+
+    blocks = []
+    for i in range(cues):
+        start = i * seconds_per_cue
+        blocks.append(f"{i + 1}\n{stamp(start)} --> {stamp(start + seconds_per_cue - 0.5)}\n"
+                      f"合成字幕第 {i + 1} 条 synthetic caption\n")
+    return "\n".join(blocks)
+
+
+class FakeGemini:
+    """Threaded HTTP server speaking a subset of the Gemini API.
+
+    Args:
+        ttft: seconds before the first streamed chunk
+        chunks: number of SSE chunks the transcript is split into
+        chunk_interval: seconds between chunks
+        cues: subtitle entries per response
+        jitter: relative random jitter applied to ttft and chunk_interval
+        rate_limit_rate: probability of answering a request with 429
+        error_rate: probability of answering a request with 503
+        hang_rate: probability of a stream stalling halfway and then dropping the connection
+        hang_seconds: how long a hanging stream stalls before the connection drops
+        max_concurrent: streams served at once; requests beyond it get 429 (0 = unlimited)
+        upload_bytes_per_second: simulated upload bandwidth (0 = unlimited)
+        seed: random seed for reproducible injection
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, ttft: float = 0.5,
+                 chunks: int = 8, chunk_interval: float = 0.05, cues: int = 40,
+                 jitter: float = 0.3, rate_limit_rate: float = 0.0, error_rate: float = 0.0,
+                 hang_rate: float = 0.0, hang_seconds: float = 5.0, max_concurrent: int = 0,
+                 upload_bytes_per_second: float = 0.0, seed: int = 0):
+        self.ttft = ttft
+        self.chunks = max(1, chunks)
+        self.chunk_interval = chunk_interval
+        self.cues = cues
+        self.jitter = jitter
+        self.rate_limit_rate = rate_limit_rate
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.max_concurrent = max_concurrent
+        self.upload_bytes_per_second = upload_bytes_per_second
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.files = {}
+        self.uploads = {}
+        self.active = 0
+        self.stats = {
+            'requests': 0, 'uploads': 0, 'upload_bytes': 0, 'generate': 0, 'completed': 0,
+            'deleted': 0, 'injected_429': 0, 'quota_429': 0, 'injected_503': 0, 'hangs': 0,
+            'max_active': 0,
+        }
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                fake._handle(self, 'POST')
+
+            def do_GET(self):
+                fake._handle(self, 'GET')
+
+            def do_DELETE(self):
+                fake._handle(self, 'DELETE')
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'FakeGemini':
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _count(self, key: str, value: int = 1):
+        with self.lock:
+            self.stats[key] += value
+
+    def _roll(self, probability: float) -> bool:
+        if probability <= 0:
+            return False
+        with self.lock:
+            return self.rng.random() < probability
+
+    # Responses
+
+    @staticmethod
+    def _send_json(handler, status: int, body: dict, headers: dict = None):
+        data = json.dumps(body).encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json; charset=UTF-8')
+        handler.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            handler.send_header(key, value)
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def _send_error(self, handler, code: int, status: str, message: str):
+        self._send_json(handler, code, {'error': {'code': code, 'message': message, 'status': status}})
+
+    def _inject(self, handler) -> bool:
+        """Answer with an injected 429/503 when the dice say so; True when handled."""
+        if self._roll(self.rate_limit_rate):
+            self._count('injected_429')
+            self._send_error(handler, 429, 'RESOURCE_EXHAUSTED', 'Resource has been exhausted (fake).')
+            return True
+        if self._roll(self.error_rate):
+            self._count('injected_503')
+            self._send_error(handler, 503, 'UNAVAILABLE', 'The model is overloaded (fake).')
+            return True
+        return False
+
+    # Routing
+
+    def _handle(self, handler, method: str):
+        self._count('requests')
+        parsed = urlparse(handler.path)
+        length = int(handler.headers.get('Content-Length') or 0)
+        body = handler.rfile.read(length) if length else b''
+        path = parsed.path
+
+        if path == '/_stats' and method == 'GET':
+            with self.lock:
+                stats = dict(self.stats, files=len(self.files))
+            return self._send_json(handler, 200, stats)
+        if path.endswith('/files') and path.startswith('/upload/') and method == 'POST':
+            return self._upload(handler, parse_qs(parsed.query), body)
+        if ':streamGenerateContent' in path and method == 'POST':
+            return self._generate(handler, body)
+        if '/files/' in path:
+            name = 'files/' + path.rsplit('/files/', 1)[1]
+            if method == 'GET':
+                with self.lock:
+                    entry = self.files.get(name)
+                if entry is None:
+                    return self._send_error(handler, 404, 'NOT_FOUND', f'File {name} not found.')
+                return self._send_json(handler, 200, entry)
+            if method == 'DELETE':
+                with self.lock:
+                    self.files.pop(name, None)
+                self._count('deleted')
+                return self._send_json(handler, 200, {})
+        self._send_error(handler, 404, 'NOT_FOUND', f'{method} {path} is not implemented by the fake.')
+
+    def _upload(self, handler, query: dict, body: bytes):
+        upload_id = query.get('upload_id', [None])[0]
+        if upload_id is None:
+            # Start of a resumable upload
+            if self._inject(handler):
+                return
+            with self.lock:
+                upload_id = f"{len(self.uploads) + 1:08d}"
+                self.uploads[upload_id] = 0
+            try:
+                mime_type = json.loads(body or b'{}').get('file', {}).get('mimeType')
+            except ValueError:
+                mime_type = None
+            host = handler.headers.get('Host')
+            return self._send_json(handler, 200, {}, {
+                'X-Goog-Upload-URL': f"http://{host}/upload/v1beta/files?upload_id={upload_id}"
+                                     f"&mime_type={mime_type or 'audio/ogg'}",
+                'X-Goog-Upload-Status': 'active',
+            })
+
+        if self.upload_bytes_per_second > 0:
+            time.sleep(len(body) / self.upload_bytes_per_second)
+        with self.lock:
+            self.uploads[upload_id] = self.uploads.get(upload_id, 0) + len(body)
+        self._count('upload_bytes', len(body))
+        if 'finalize' not in (handler.headers.get('X-Goog-Upload-Command') or ''):
+            return self._send_json(handler, 200, {}, {'X-Goog-Upload-Status': 'active'})
+
+        now = datetime.now(timezone.utc)
+        name = f"files/fake{upload_id}"
+        host = handler.headers.get('Host')
+        entry = {
+            'name': name,
+            'mimeType': query.get('mime_type', ['audio/ogg'])[0],
+            'sizeBytes': str(self.uploads.pop(upload_id, 0)),
+            'createTime': now.strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+            'expirationTime': (now + FILE_TTL).strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+            'uri': f"http://{host}/v1beta/{name}",
+            'state': 'ACTIVE',
+        }
+        with self.lock:
+            self.files[name] = entry
+        self._count('uploads')
+        self._send_json(handler, 200, {'file': entry}, {'X-Goog-Upload-Status': 'final'})
+
+    def _generate(self, handler, body: bytes):
+        self._count('generate')
+        if self._inject(handler):
+            return
+        with self.lock:
+            if self.max_concurrent and self.active >= self.max_concurrent:
+                self.stats['quota_429'] += 1
+                quota_exceeded = True
+            else:
+                quota_exceeded = False
+                self.active += 1
+                self.stats['max_active'] = max(self.stats['max_active'], self.active)
+            rng = random.Random(self.rng.random())
+        if quota_exceeded:
+            return self._send_error(handler, 429, 'RESOURCE_EXHAUSTED',
+                                    'Quota exceeded for concurrent requests (fake).')
+        try:
+            self._stream(handler, rng)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+    def _stream(self, handler, rng: random.Random):
+        text = synthetic_srt(self.cues)
+        step = max(1, -(-len(text) // self.chunks))
+        pieces = [text[i:i + step] for i in range(0, len(text), step)]
+        hang_at = len(pieces) // 2 if self._roll(self.hang_rate) else None
+
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'text/event-stream')
+        handler.send_header('Transfer-Encoding', 'chunked')
+        handler.end_headers()
+
+        def send(payload: dict):
+            data = f"data: {json.dumps(payload, ensure_ascii=False)}\r\n\r\n".encode('utf-8')
+            handler.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+            handler.wfile.flush()
+
+        try:
+            time.sleep(_jittered(self.ttft, self.jitter, rng))
+            for i, piece in enumerate(pieces):
+                if i == hang_at:
+                    # Stall, then drop the connection without finishing the chunked body
+                    self._count('hangs')
+                    time.sleep(self.hang_seconds)
+                    handler.close_connection = True
+                    handler.connection.shutdown(socket.SHUT_RDWR)
+                    return
+                if i:
+                    time.sleep(_jittered(self.chunk_interval, self.jitter, rng))
+                candidate = {'content': {'parts': [{'text': piece}], 'role': 'model'}, 'index': 0}
+                if i == len(pieces) - 1:
+                    candidate['finishReason'] = 'STOP'
+                send({'candidates': [candidate], 'modelVersion': 'fake-gemini'})
+            handler.wfile.write(b"0\r\n\r\n")
+            handler.wfile.flush()
+            self._count('completed')
+        except (BrokenPipeError, ConnectionResetError):
+            handler.close_connection = True
+
+
+class FakeTrack:
+    """Caption track with the attributes youtube.select_track reads."""
+
+    def __init__(self, language_code: str, is_generated: bool, entries, latency: float):
+        self.language_code = language_code
+        self.language = language_code
+        self.is_generated = is_generated
+        self.is_translatable = False
+        self.translation_languages = []
+        self._entries = entries
+        self._latency = latency
+
+    def fetch(self):
+        time.sleep(self._latency)
+        return self._entries
+
+
+class FakeYouTube:
+    """Deterministic synthetic videos keyed by video ID.
+
+    Every property of a video (captions or not, duration, title) comes from a
+    random generator seeded with its ID, so repeated runs see the same catalog.
+
+    Args:
+        caption_ratio: share of videos with a caption track in the requested language
+        long_ratio: share of videos longer than the direct-transcription limit
+        short_minutes: (min, max) duration of the other videos
+        long_minutes: durations to pick from for long videos (the audio is cached per duration)
+        language: language code of the synthetic caption tracks
+        latency: seconds for each simulated YouTube request (track list, caption fetch, video info)
+        download_bytes_per_second: simulated audio download bandwidth (0 = unlimited)
+        work_dir: where generated audio is cached
+    """
+
+    def __init__(self, caption_ratio: float = 0.7, long_ratio: float = 0.0,
+                 short_minutes=(2, 45), long_minutes=(60, 90, 120), language: str = 'zh-CN',
+                 latency: float = 0.05, download_bytes_per_second: float = 0.0,
+                 work_dir: str = None):
+        self.caption_ratio = caption_ratio
+        self.long_ratio = long_ratio
+        self.short_minutes = short_minutes
+        self.long_minutes = long_minutes
+        self.language = language
+        self.latency = latency
+        self.download_bytes_per_second = download_bytes_per_second
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix='yt_t_fake_youtube_')
+        self._audio_lock = threading.Lock()
+
+    def video(self, video_id: str) -> dict:
+        rng = random.Random(video_id)
+        has_captions = rng.random() < self.caption_ratio
+        if rng.random() < self.long_ratio:
+            duration = rng.choice(self.long_minutes) * 60
+        else:
+            duration = rng.randint(int(self.short_minutes[0] * 60), int(self.short_minutes[1] * 60))
+        return {'id': video_id, 'title': f"Synthetic video {video_id}", 'duration': duration,
+                'captions': has_captions}
+
+    # Stand-ins for the network-facing functions
+
+    def list_tracks(self, video_id: str):
+        time.sleep(self.latency)
+        video = self.video(video_id)
+        if not video['captions']:
+            raise RuntimeError(f"Subtitles are disabled for this video ({video_id}, fake)")
+        entries = [{'start': float(t), 'duration': 3.5, 'text': f"原生字幕 {video_id} {t}"}
+                   for t in range(0, video['duration'], 4)]
+        return [FakeTrack(self.language, False, entries, self.latency)]
+
+    def get_video_info(self, url: str) -> dict:
+        from yt_t.youtube import extract_video_id
+
+        time.sleep(self.latency)
+        video = self.video(extract_video_id(url) or url)
+        return {
+            'title': video['title'],
+            'duration': video['duration'],
+            'video_id': video['id'],
+            'uploader': 'Synthetic channel',
+            'upload_date': '20240101',
+            'info': {'id': video['id'], 'title': video['title'], 'duration': video['duration']},
+        }
+
+    def get_video_title(self, video_id: str) -> str:
+        time.sleep(self.latency)
+        return self.video(video_id)['title']
+
+    def download_audio(self, youtube_url: str, output_dir: str = None, transcode: bool = True,
+                       info: dict = None, profile: str = None, cancel=None):
+        from yt_t import metrics
+        from yt_t.audio_utils import check_ffmpeg
+        from yt_t.youtube import extract_video_id
+
+        if not check_ffmpeg():
+            return None
+        video = self.video(extract_video_id(youtube_url) or youtube_url)
+        source = self._audio(video['duration'])
+        if output_dir is None:
+            output_dir = tempfile.mkdtemp(prefix="yt_audio_")
+        path = os.path.join(output_dir, f"{video['id']}.ogg")
+        with metrics.span('download', transcode=False) as span:
+            print("正在下载音频（模拟）...")
+            if self.download_bytes_per_second > 0:
+                time.sleep(os.path.getsize(source) / self.download_bytes_per_second)
+            if cancel is not None and cancel.is_set():
+                print("音频下载已取消")
+                return None
+            shutil.copyfile(source, path)
+            span.set(bytes_out=os.path.getsize(path))
+        print(f"音频已下载到: {path}")
+        return path
+
+    def _audio(self, seconds: int) -> str:
+        """Low-bitrate silent audio of the given length, generated once per duration."""
+        path = os.path.join(self.work_dir, f"silence_{seconds}.ogg")
+        with self._audio_lock:
+            if not os.path.exists(path):
+                subprocess.run(
+                    ['ffmpeg', '-loglevel', 'error', '-f', 'lavfi',
+                     '-i', f'anullsrc=r=8000:cl=mono:d={seconds}',
+                     '-c:a', 'libopus', '-b:a', '6k', '-y', path + '.tmp.ogg'],
+                    check=True,
+                )
+                os.replace(path + '.tmp.ogg', path)
+        return path
+
+    def install(self):
+        """Replace the YouTube-facing functions of yt_t in this process."""
+        from yt_t import audio_utils, gemini, utils, video_utils, youtube
+
+        youtube.list_tracks = self.list_tracks
+        video_utils.get_video_info = self.get_video_info
+        gemini.get_video_info = self.get_video_info
+        audio_utils.download_audio = self.download_audio
+        gemini.download_audio = self.download_audio
+        utils.get_video_title = self.get_video_title
+
+
+def add_youtube_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--caption-ratio', type=float, default=0.7,
+                        help='share of videos with native captions')
+    parser.add_argument('--long-ratio', type=float, default=0.0,
+                        help='share of videos that take the long-video path (needs ffmpeg)')
+    parser.add_argument('--youtube-latency', type=float, default=0.05,
+                        help='seconds per simulated YouTube request')
+
+
+def add_gemini_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--ttft', type=float, default=0.5, help='seconds to the first chunk')
+    parser.add_argument('--chunks', type=int, default=8, help='SSE chunks per response')
+    parser.add_argument('--chunk-interval', type=float, default=0.05, help='seconds between chunks')
+    parser.add_argument('--cues', type=int, default=40, help='subtitle entries per response')
+    parser.add_argument('--jitter', type=float, default=0.3, help='relative latency jitter')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='probability of a 429')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='probability of a 503')
+    parser.add_argument('--hang-rate', type=float, default=0.0,
+                        help='probability of a stream stalling and dropping mid-way')
+    parser.add_argument('--hang-seconds', type=float, default=5.0)
+    parser.add_argument('--max-concurrent', type=int, default=0,
+                        help='concurrent streams before answering 429 (0 = unlimited)')
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def gemini_from_args(args, host: str = '127.0.0.1', port: int = 0) -> FakeGemini:
+    return FakeGemini(host=host, port=port, ttft=args.ttft, chunks=args.chunks,
+                      chunk_interval=args.chunk_interval, cues=args.cues, jitter=args.jitter,
+                      rate_limit_rate=args.rate_limit_rate, error_rate=args.error_rate,
+                      hang_rate=args.hang_rate, hang_seconds=args.hang_seconds,
+                      max_concurrent=args.max_concurrent, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve = commands.add_parser('gemini', help='serve the fake Gemini API until interrupted')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8900, help='0 picks a free port')
+    add_gemini_arguments(serve)
+
+    run = commands.add_parser('youtube', help='run the yt-t CLI with the fake YouTube installed')
+    add_youtube_arguments(run)
+    run.add_argument('cli_args', nargs=argparse.REMAINDER,
+                     help='arguments for yt-t, after --')
+
+    args = parser.parse_args()
+    if args.command == 'gemini':
+        fake = gemini_from_args(args, args.host, args.port).start()
+        # The load harness reads the address from the first line
+        print(fake.url, flush=True)
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            fake.stop()
+        return
+
+    FakeYouTube(caption_ratio=args.caption_ratio, long_ratio=args.long_ratio,
+                latency=args.youtube_latency).install()
+    from yt_t.cli import main as cli_main
+
+    cli_args = args.cli_args[1:] if args.cli_args[:1] == ['--'] else args.cli_args
+    cli_main(cli_args, prog_name='yt-t')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Import-time benchmark for the CLI entry point.
+
+Runs ``python -X importtime -c "import yt_t.cli"`` in fresh interpreters and
+reports the cumulative import time of ``yt_t.cli``. Fails when the median
+exceeds the budget or when a heavy module that should be deferred (genai,
+yt-dlp, requests, youtube-transcript-api) is imported at startup.
+
+Usage:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --runs 10 --budget-ms 120 --json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must not be imported just to start the CLI
+DEFERRED_MODULES = [
+    'google.genai',
+    'yt_dlp',
+    'requests',
+    'youtube_transcript_api',
+]
+
+
+def measure(module: str = 'yt_t.cli'):
+    """Import ``module`` once in a fresh interpreter.
+
+    Returns:
+        (cumulative import time of ``module`` in microseconds, set of imported module names)
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    cumulative = None
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line.split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].strip()
+        imported.add(name)
+        if name == module:
+            cumulative = int(parts[1])
+    return cumulative, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--module', default='yt_t.cli')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=120.0,
+                        help='fail when the median import time exceeds this budget')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    timings = []
+    imported = set()
+    for _ in range(args.runs):
+        cumulative, modules = measure(args.module)
+        timings.append(cumulative / 1000.0)
+        imported |= modules
+
+    leaked = [m for m in DEFERRED_MODULES if m in imported]
+    median = statistics.median(timings)
+    report = {
+        'module': args.module,
+        'runs': args.runs,
+        'min_ms': round(min(timings), 2),
+        'median_ms': round(median, 2),
+        'max_ms': round(max(timings), 2),
+        'budget_ms': args.budget_ms,
+        'deferred_modules_imported': leaked,
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{args.module}: min {report['min_ms']} ms, median {report['median_ms']} ms, "
+              f"max {report['max_ms']} ms (budget {args.budget_ms} ms, {args.runs} runs)")
+        for name in leaked:
+            print(f"  heavy module imported at startup: {name}")
+
+    if leaked or median > args.budget_ms:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
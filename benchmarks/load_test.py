@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""Batch load test against the local Gemini/YouTube stand-ins.
+
+Starts the fake Gemini server from fakes.py, writes a list of synthetic video
+URLs and runs ``yt-t batch`` on them through ``fakes.py youtube`` with
+metrics enabled. Throughput, per-job latency percentiles (overall and per
+source) and the per-stage timings are computed from the metrics JSON lines,
+and the fake server's counters show how many 429/503s and hangs were
+injected. No network access or API key is needed; the run uses its own cache
+directory so it never touches the user's cache.
+
+Usage:
+    python benchmarks/load_test.py --jobs 2000
+    python benchmarks/load_test.py --jobs 500 --caption-ratio 0.3 --rate-limit-rate 0.1 \\
+        --error-rate 0.02 --gemini-workers 16
+    python benchmarks/load_test.py --jobs 1000 --json > load.json
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from fakes import add_gemini_arguments, add_youtube_arguments
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FAKES = os.path.join(HERE, 'fakes.py')
+
+# Characters allowed in a YouTube video ID
+ID_ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz-_'
+
+# Stages reported from the metrics, in pipeline order
+STAGES = ('native_subtitles', 'video_info', 'download', 'segment_audio', 'upload',
+          'generate', 'segment', 'save')
+
+
+def video_id(n: int, run: str) -> str:
+    """An 11-character ID; ``run`` keeps different runs from sharing IDs."""
+    digits = []
+    for _ in range(7):
+        n, rest = divmod(n, len(ID_ALPHABET))
+        digits.append(ID_ALPHABET[rest])
+    return (run + 'xxxx')[:4] + ''.join(reversed(digits))
+
+
+def percentile(values, q: float) -> float:
+    """Nearest-rank percentile of ``values`` (0 when empty)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))]
+
+
+def summarize_durations(values) -> dict:
+    return {
+        'count': len(values),
+        'mean_s': round(statistics.fmean(values), 4) if values else 0.0,
+        'p50_s': round(percentile(values, 50), 4),
+        'p90_s': round(percentile(values, 90), 4),
+        'p99_s': round(percentile(values, 99), 4),
+        'max_s': round(max(values), 4) if values else 0.0,
+    }
+
+
+def read_metrics(path: str):
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    pass
+    return records
+
+
+def analyze(records, wall_seconds: float) -> dict:
+    jobs = [r for r in records if r.get('stage') == 'job' and 'source' in r]
+    ok = [r for r in jobs if r.get('status') == 'ok']
+    by_source = {}
+    for r in ok:
+        by_source.setdefault(r.get('source') or 'unknown', []).append(r['duration_s'])
+
+    stages = {}
+    for stage in STAGES:
+        rows = [r for r in records if r.get('stage') == stage]
+        if not rows:
+            continue
+        stages[stage] = summarize_durations([r['duration_s'] for r in rows])
+        stages[stage]['errors'] = sum(1 for r in rows if r.get('status') != 'ok')
+        ttft = [r['ttft_s'] for r in rows if 'ttft_s' in r]
+        if ttft:
+            stages[stage]['ttft_p50_s'] = round(percentile(ttft, 50), 4)
+            stages[stage]['ttft_p99_s'] = round(percentile(ttft, 99), 4)
+
+    return {
+        'jobs': len(jobs),
+        'ok': len(ok),
+        'failed': len(jobs) - len(ok),
+        'wall_s': round(wall_seconds, 3),
+        'throughput_jobs_per_s': round(len(ok) / wall_seconds, 3) if wall_seconds > 0 else 0.0,
+        'latency': summarize_durations([r['duration_s'] for r in ok]),
+        'by_source': {source: summarize_durations(values) for source, values in sorted(by_source.items())},
+        'stages': stages,
+        'retries': sum(int(r.get('retries', 0)) for r in records),
+    }
+
+
+def start_gemini(args, log) -> tuple:
+    command = [sys.executable, FAKES, 'gemini', '--port', '0',
+               '--ttft', str(args.ttft), '--chunks', str(args.chunks),
+               '--chunk-interval', str(args.chunk_interval), '--cues', str(args.cues),
+               '--jitter', str(args.jitter), '--rate-limit-rate', str(args.rate_limit_rate),
+               '--error-rate', str(args.error_rate), '--hang-rate', str(args.hang_rate),
+               '--hang-seconds', str(args.hang_seconds), '--max-concurrent', str(args.max_concurrent),
+               '--seed', str(args.seed)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=log, text=True)
+    url = process.stdout.readline().strip()
+    if not url.startswith('http'):
+        process.kill()
+        raise RuntimeError('fake Gemini server did not start')
+    return process, url
+
+
+def server_stats(url: str) -> dict:
+    try:
+        with urllib.request.urlopen(f"{url}/_stats", timeout=5) as response:
+            return json.load(response)
+    except OSError:
+        return {}
+
+
+def print_report(report: dict):
+    print(f"jobs: {report['jobs']}  ok: {report['ok']}  failed: {report['failed']}")
+    print(f"wall: {report['wall_s']:.1f} s  throughput: {report['throughput_jobs_per_s']:.2f} jobs/s  "
+          f"retries: {report['retries']}")
+    header = f"{'':<18}{'count':>7}{'mean':>9}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}"
+    print(header)
+
+    def row(name, s, extra=''):
+        print(f"{name:<18}{s['count']:>7}{s['mean_s']:>9.3f}{s['p50_s']:>9.3f}{s['p90_s']:>9.3f}"
+              f"{s['p99_s']:>9.3f}{s['max_s']:>9.3f}{extra}")
+
+    row('job', report['latency'])
+    for source, s in report['by_source'].items():
+        row(f"  {source}", s)
+    for stage, s in report['stages'].items():
+        extra = f"  errors {s['errors']}" if s['errors'] else ''
+        if 'ttft_p50_s' in s:
+            extra += f"  ttft p50 {s['ttft_p50_s']:.3f} p99 {s['ttft_p99_s']:.3f}"
+        row(stage, s, extra)
+    fake = report.get('fake_gemini') or {}
+    if fake:
+        print("fake gemini: " + "  ".join(f"{k} {v}" for k, v in fake.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test yt-t batch against local stand-ins.')
+    parser.add_argument('--jobs', type=int, default=1000, help='number of synthetic URLs')
+    parser.add_argument('--caption-workers', type=int, default=16)
+    parser.add_argument('--gemini-workers', type=int, default=8)
+    parser.add_argument('--segment-workers', type=int, default=4)
+    parser.add_argument('--format', dest='output_format', choices=['srt', 'txt', 'vtt', 'json'])
+    parser.add_argument('--archive', action='store_true', help='write into a transcript archive')
+    parser.add_argument('--timeout', type=float, default=3600, help='seconds before the run is killed')
+    parser.add_argument('--keep', action='store_true', help='keep the work directory')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    add_youtube_arguments(parser)
+    add_gemini_arguments(parser)
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix='yt_t_load_')
+    log_path = os.path.join(work, 'run.log')
+    metrics_path = os.path.join(work, 'metrics.jsonl')
+    urls_path = os.path.join(work, 'urls.txt')
+    run = format(int(time.time()) % 4096, '03x') + 'L'
+    with open(urls_path, 'w', encoding='utf-8') as f:
+        for n in range(args.jobs):
+            f.write(f"https://www.youtube.com/watch?v={video_id(n, run)}\n")
+
+    env = dict(os.environ, GEMINI_API_KEY='fake', YT_T_CACHE_DIR=os.path.join(work, 'cache'),
+               PYTHONUNBUFFERED='1')
+    env.pop('YT_T_METRICS', None)
+    with open(log_path, 'w', encoding='utf-8') as log:
+        server, url = start_gemini(args, log)
+        env['YT_T_GEMINI_BASE_URL'] = url
+        command = [sys.executable, FAKES, 'youtube',
+                   '--caption-ratio', str(args.caption_ratio), '--long-ratio', str(args.long_ratio),
+                   '--youtube-latency', str(args.youtube_latency), '--',
+                   '--metrics', metrics_path, 'batch', urls_path, '--no-cache',
+                   '--output-dir', os.path.join(work, 'out'),
+                   '--caption-workers', str(args.caption_workers),
+                   '--gemini-workers', str(args.gemini_workers),
+                   '--segment-workers', str(args.segment_workers)]
+        if args.output_format:
+            command += ['--format', args.output_format]
+        if args.archive:
+            command += ['--archive', os.path.join(work, 'archive')]
+        started = time.monotonic()
+        try:
+            returncode = subprocess.run(command, stdout=log, stderr=subprocess.STDOUT, env=env,
+                                        timeout=args.timeout).returncode
+        except subprocess.TimeoutExpired:
+            returncode = None
+        wall = time.monotonic() - started
+        fake = server_stats(url)
+        server.terminate()
+        server.wait()
+
+    report = analyze(read_metrics(metrics_path), wall)
+    report['fake_gemini'] = fake
+    report['returncode'] = returncode
+    report['config'] = {k: v for k, v in vars(args).items() if k not in ('json', 'keep')}
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    if args.keep or returncode not in (0, 1):
+        print(f"work directory: {work} (log: {log_path})", file=sys.stderr)
+    else:
+        shutil.rmtree(work, ignore_errors=True)
+    # batch exits 1 when some URLs failed, which the report already shows
+    sys.exit(0 if returncode in (0, 1) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""Offline micro-benchmarks for the local processing stages.
+
+Every benchmark runs on synthetic input, so no network access or API key is
+needed. Covers URL parsing, native caption formatting, SRT parsing, segment
+merging and serialization, the transcript cache, transcript writes, and (when
+ffmpeg/ffprobe are installed) the audio speed-up/split stages.
+
+Results can be saved as a baseline and compared on later runs. The exit code
+is non-zero when a stage is slower than its baseline by more than the
+tolerance.
+
+Usage:
+    python benchmarks/stages.py
+    python benchmarks/stages.py --json --save benchmarks/baseline.json
+    python benchmarks/stages.py --compare benchmarks/baseline.json --tolerance 0.2
+    python benchmarks/stages.py --only srt --runs 10
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from yt_t.cues import CueList, SrtParser, from_native_entries, parse_srt, serialize  # noqa: E402
+from yt_t.gemini import merge_transcripts  # noqa: E402
+from yt_t.youtube import extract_video_id  # noqa: E402
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Register ``fn(scale, work_dir) -> (callable, items)`` as a benchmark."""
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+
+def _video_id(rng):
+    alphabet = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_-'
+    return ''.join(rng.choice(alphabet) for _ in range(11))
+
+
+def _srt(cues):
+    return serialize(cues, 'srt')
+
+
+def _synthetic_cues(count, step=2.5, seed=0):
+    rng = random.Random(seed)
+    cues = CueList()
+    t = 0.0
+    for i in range(count):
+        duration = rng.uniform(1.0, step)
+        cues.append(t, t + duration, f"第 {i} 句字幕 sentence number {i} " + "词" * rng.randint(4, 20))
+        t += duration + rng.uniform(0.0, 0.5)
+    return cues
+
+
+@benchmark('extract_video_id')
+def bench_extract_video_id(scale, work_dir):
+    rng = random.Random(1)
+    templates = [
+        'https://www.youtube.com/watch?v={}',
+        'https://youtu.be/{}',
+        'https://www.youtube.com/embed/{}',
+        'https://www.youtube.com/watch?v={}&list=PL123&index=4',
+        'https://m.youtube.com/watch?feature=share&v={}',
+    ]
+    urls = [rng.choice(templates).format(_video_id(rng)) for _ in range(int(100_000 * scale))]
+
+    def run():
+        for url in urls:
+            extract_video_id(url)
+    return run, len(urls)
+
+
+@benchmark('native_format')
+def bench_native_format(scale, work_dir):
+    rng = random.Random(2)
+    entries = []
+    t = 0.0
+    for i in range(int(100_000 * scale)):
+        duration = rng.uniform(0.5, 4.0)
+        entries.append({'start': t, 'duration': duration, 'text': f"caption line {i}\nsecond part"})
+        t += duration
+
+    def run():
+        serialize(from_native_entries(entries), 'txt')
+    return run, len(entries)
+
+
+@benchmark('srt_parse')
+def bench_srt_parse(scale, work_dir):
+    # About three hours of speech at 2-3 seconds per cue
+    text = _srt(_synthetic_cues(int(5_000 * scale)))
+
+    def run():
+        parse_srt(text)
+    return run, len(text)
+
+
+@benchmark('srt_parse_stream')
+def bench_srt_parse_stream(scale, work_dir):
+    text = _srt(_synthetic_cues(int(5_000 * scale)))
+    # Roughly the chunk size of a streamed Gemini response
+    chunks = [text[i:i + 200] for i in range(0, len(text), 200)]
+
+    def run():
+        parser = SrtParser()
+        for chunk in chunks:
+            parser.feed(chunk)
+        parser.close()
+    return run, len(text)
+
+
+@benchmark('merge_transcripts')
+def bench_merge_transcripts(scale, work_dir):
+    segments = [_srt(_synthetic_cues(int(1_250 * scale), seed=i)) for i in range(4)]
+
+    def run():
+        merge_transcripts(segments, 50 * 60, 2.0)
+    return run, sum(len(s) for s in segments)
+
+
+@benchmark('serialize')
+def bench_serialize(scale, work_dir):
+    cues = _synthetic_cues(int(5_000 * scale))
+
+    def run():
+        for fmt in ('txt', 'srt', 'vtt', 'json'):
+            serialize(cues, fmt)
+    return run, len(cues) * 4
+
+
+@benchmark('cache_roundtrip')
+def bench_cache_roundtrip(scale, work_dir):
+    from yt_t.cache import TranscriptCache, SOURCE_GEMINI
+    cache = TranscriptCache(os.path.join(work_dir, 'cache.sqlite'))
+    data = _synthetic_cues(int(5_000 * scale)).to_json()
+    keys = [f"video{i:04d}" for i in range(20)]
+
+    def run():
+        for key in keys:
+            cache.put(key, 'zh-CN', SOURCE_GEMINI, 'bench', data)
+        for key in keys:
+            CueList.from_json(cache.get(key, 'zh-CN', SOURCE_GEMINI, 'bench'))
+    return run, len(keys)
+
+
+@benchmark('save_transcript')
+def bench_save_transcript(scale, work_dir):
+    from yt_t.utils import save_transcript
+    transcript = _srt(_synthetic_cues(int(5_000 * scale)))
+    output_dir = os.path.join(work_dir, 'transcripts')
+
+    def run():
+        save_transcript(transcript, 'abcdefghijk', 'https://youtu.be/abcdefghijk', output_dir,
+                        title='Benchmark')
+    return run, len(transcript)
+
+
+def _have_ffmpeg():
+    return shutil.which('ffmpeg') is not None
+
+
+def _audio_input(work_dir, scale):
+    """Generate a sine + noise mp3 (10 minutes at scale 1) once per run."""
+    path = os.path.join(work_dir, 'input.mp3')
+    if not os.path.exists(path):
+        seconds = max(10, int(600 * scale))
+        subprocess.run(
+            ['ffmpeg', '-loglevel', 'error', '-f', 'lavfi', '-i', f'sine=f=220:d={seconds}',
+             '-f', 'lavfi', '-i', f'anoisesrc=a=0.02:r=44100:d={seconds}',
+             '-filter_complex', 'amix=inputs=2', '-ac', '2', '-c:a', 'libmp3lame', '-b:a', '192k',
+             '-y', path],
+            check=True,
+        )
+    return path
+
+
+@benchmark('speed_up_audio')
+def bench_speed_up_audio(scale, work_dir):
+    if not _have_ffmpeg():
+        return None
+    from yt_t.audio_utils import speed_up_audio
+    path = _audio_input(work_dir, scale)
+    return (lambda: speed_up_audio(path, 2.0)), os.path.getsize(path)
+
+
+@benchmark('split_audio')
+def bench_split_audio(scale, work_dir):
+    if not _have_ffmpeg() or shutil.which('ffprobe') is None:
+        return None
+    from yt_t.audio_utils import split_audio
+    path = _audio_input(work_dir, scale)
+    return (lambda: split_audio(path, segment_minutes=2)), os.path.getsize(path)
+
+
+@benchmark('prepare_audio_segments')
+def bench_prepare_audio_segments(scale, work_dir):
+    if not _have_ffmpeg():
+        return None
+    from yt_t.audio_utils import prepare_audio_segments
+    path = _audio_input(work_dir, scale)
+    output_dir = os.path.join(work_dir, 'segments')
+    os.makedirs(output_dir, exist_ok=True)
+    return (lambda: prepare_audio_segments(path, 2.0, segment_minutes=2,
+                                           output_dir=output_dir)), os.path.getsize(path)
+
+
+def measure(fn, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        # Keep progress output of the measured code out of the report
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def compare(results, baseline, tolerance):
+    """Return (name, ratio) for stages slower than baseline by more than ``tolerance``."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get('results', {}).get(name)
+        if not base or 'median_s' not in result or not base.get('median_s'):
+            continue
+        ratio = result['median_s'] / base['median_s']
+        result['baseline_median_s'] = base['median_s']
+        result['ratio'] = round(ratio, 3)
+        if ratio > 1 + tolerance:
+            regressions.append((name, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--scale', type=float, default=1.0, help='input size multiplier')
+    parser.add_argument('--only', action='append', help='run benchmarks whose name contains this')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    parser.add_argument('--save', help='write results to this file (use as a baseline later)')
+    parser.add_argument('--compare', help='baseline file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed slowdown relative to the baseline (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    names = [n for n in BENCHMARKS if not args.only or any(o in n for o in args.only)]
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='yt_t_bench_') as work_dir:
+        for name in names:
+            prepared = BENCHMARKS[name](args.scale, work_dir)
+            if prepared is None:
+                results[name] = {'skipped': 'ffmpeg/ffprobe not installed'}
+                continue
+            fn, items = prepared
+            timings = measure(fn, args.runs)
+            median = statistics.median(timings)
+            results[name] = {
+                'runs': args.runs,
+                'items': items,
+                'min_s': round(min(timings), 6),
+                'median_s': round(median, 6),
+                'max_s': round(max(timings), 6),
+                'items_per_s': round(items / median, 1) if median else None,
+            }
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'scale': args.scale,
+        'results': results,
+    }
+
+    regressions = []
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('scale') != args.scale:
+            print(f"warning: baseline scale {baseline.get('scale')} differs from {args.scale}",
+                  file=sys.stderr)
+        regressions = compare(results, baseline, args.tolerance)
+        report['regressions'] = [name for name, _ in regressions]
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for name, r in results.items():
+            if 'skipped' in r:
+                print(f"{name:<24} skipped ({r['skipped']})")
+                continue
+            line = f"{name:<24} median {r['median_s'] * 1000:9.2f} ms  min {r['min_s'] * 1000:9.2f} ms"
+            if 'ratio' in r:
+                line += f"  {r['ratio']:.2f}x baseline"
+            print(line)
+        for name, ratio in regressions:
+            print(f"  regression: {name} is {ratio:.2f}x its baseline (tolerance {args.tolerance:.0%})")
+
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
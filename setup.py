@@ -25,6 +25,9 @@ setup(
         "google-genai>=0.1.0",
         "requests>=2.25.0",
     ],
+    extras_require={
+        "silence": ["numpy>=1.21"],
+    },
     entry_points={
         "console_scripts": [
             "yt-t=yt_t.cli:main",
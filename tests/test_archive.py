@@ -0,0 +1,156 @@
+import os
+
+import pytest
+from click.testing import CliRunner
+
+from yt_t import archive as archive_module
+from yt_t.archive import INDEX_NAME, TranscriptArchive
+from yt_t.cli import main
+
+SRT = "1\n00:00:00,000 --> 00:00:02,000\nhello\n\n2\n00:00:02,000 --> 00:00:04,000\nworld\n"
+
+
+def video_id(n: int) -> str:
+    return f"vid{n:08d}"
+
+
+@pytest.fixture
+def archive(tmp_path):
+    a = TranscriptArchive(str(tmp_path / "archive"))
+    yield a
+    a.close()
+
+
+def test_put_and_get(archive):
+    locator = archive.put("abcdefghijk", SRT, url="https://youtu.be/abcdefghijk", title="Title",
+                          fmt='srt', source='gemini', generated_at=1700000000.0)
+    assert locator.endswith("#abcdefghijk")
+
+    record = archive.get("abcdefghijk")
+    assert record == {
+        'video_id': "abcdefghijk",
+        'url': "https://youtu.be/abcdefghijk",
+        'title': "Title",
+        'format': 'srt',
+        'source': 'gemini',
+        'generated_at': 1700000000.0,
+        'text': SRT,
+    }
+    assert "abcdefghijk" in archive
+    assert archive.get("missing0000") is None
+    assert "missing0000" not in archive
+
+
+def test_overwrite_returns_latest_and_compact_drops_old_records(archive):
+    archive.put("abcdefghijk", "old", fmt='txt')
+    archive.put("otherotheri", "other")
+    archive.put("abcdefghijk", SRT, fmt='srt')
+
+    assert archive.get("abcdefghijk")['text'] == SRT
+    assert archive.get("abcdefghijk")['format'] == 'srt'
+    stats = archive.stats()
+    assert stats['records'] == 2
+    assert stats['live_bytes'] < stats['bytes']
+    assert sorted(r['text'] for r in archive.iter_records()) == sorted([SRT, "other"])
+
+    compacted = archive.compact()
+    assert compacted['records'] == 2
+    assert compacted['bytes'] == compacted['live_bytes'] < compacted['bytes_before']
+    assert archive.get("abcdefghijk")['text'] == SRT
+    assert archive.get("otherotheri")['text'] == "other"
+
+
+def test_compact_while_another_instance_holds_read_fds(tmp_path):
+    path = str(tmp_path / "archive")
+    writer = TranscriptArchive(path)
+    reader = TranscriptArchive(path)
+    try:
+        for n in range(20):
+            writer.put(video_id(n), f"v1 {n}")
+        # The reader caches a read fd for the original shard
+        assert [reader.get(video_id(n))['text'] for n in range(20)] == [f"v1 {n}" for n in range(20)]
+        old_shards = writer.shard_numbers()
+
+        for n in range(0, 20, 2):
+            writer.put(video_id(n), f"v2 {n}")
+        writer.compact()
+        assert not set(old_shards) & set(writer.shard_numbers())
+
+        expected = [f"v2 {n}" if n % 2 == 0 else f"v1 {n}" for n in range(20)]
+        assert [reader.get(video_id(n))['text'] for n in range(20)] == expected
+        assert sorted(r['text'] for r in reader.iter_records()) == sorted(expected)
+        # Fds on the deleted shards were released rather than kept open
+        assert set(reader._read_fds) <= set(reader.shard_numbers())
+
+        # Writes from the reader land in the new shard and are visible to the writer
+        reader.put(video_id(1), "v3 1")
+        assert writer.get(video_id(1))['text'] == "v3 1"
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_tail_is_merged_into_sorted_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive_module, 'TAIL_MAX', 8)
+    path = str(tmp_path / "archive")
+    index_path = os.path.join(path, INDEX_NAME)
+    with TranscriptArchive(path) as a, TranscriptArchive(path) as reader:
+        for n in range(30):
+            a.put(video_id(n), f"v1 {n}")
+            # Another instance keeps up with appends and index rewrites
+            assert reader.get(video_id(n))['text'] == f"v1 {n}"
+        for n in range(0, 30, 3):
+            a.put(video_id(n), f"v2 {n}")
+
+        with open(index_path, 'rb') as f:
+            _, sorted_count = archive_module.INDEX_HEADER.unpack(f.read(archive_module.INDEX_HEADER.size))
+            entries = (os.fstat(f.fileno()).st_size - archive_module.INDEX_HEADER.size) \
+                // archive_module.INDEX_ENTRY.size
+        assert sorted_count > 0
+        assert entries - sorted_count <= 8
+
+        expected = {video_id(n): f"v2 {n}" if n % 3 == 0 else f"v1 {n}" for n in range(30)}
+        for archive in (a, reader):
+            assert {vid: archive.get(vid)['text'] for vid in expected} == expected
+            assert archive.get("missing0000") is None
+        assert a.stats()['records'] == 30
+
+
+def test_index_is_rebuilt_after_index_file_is_deleted(tmp_path):
+    path = str(tmp_path / "archive")
+    with TranscriptArchive(path) as a:
+        for n in range(10):
+            a.put(video_id(n), f"v1 {n}")
+        a.put(video_id(3), "v2 3")
+    os.remove(os.path.join(path, INDEX_NAME))
+
+    with TranscriptArchive(path) as a:
+        assert os.path.exists(os.path.join(path, INDEX_NAME))
+        assert a.stats()['records'] == 10
+        # The later record of an overwritten video wins
+        assert a.get(video_id(3))['text'] == "v2 3"
+        assert [a.get(video_id(n))['text'] for n in range(10) if n != 3] == \
+            [f"v1 {n}" for n in range(10) if n != 3]
+
+
+def test_pack_detects_format_from_content(tmp_path):
+    directory = tmp_path / "transcripts"
+    directory.mkdir()
+    header = ("原始视频地址: https://www.youtube.com/watch?v=abcdefghijk\n"
+              "视频ID: abcdefghijk\n"
+              "视频标题: Title\n"
+              "生成时间: 2024-01-02 03:04:05\n"
+              + "=" * 50 + "\n\n")
+    # Gemini transcripts are SRT bodies saved with a .txt extension
+    (directory / "Title_transcript_20240102_030405.txt").write_text(header + SRT, encoding='utf-8')
+    (directory / "Other_transcript_20240102_030405.txt").write_text(
+        header.replace("abcdefghijk", "otherotheri") + "[00:00] hello\n[00:02] world\n", encoding='utf-8')
+
+    path = str(tmp_path / "archive")
+    result = CliRunner().invoke(main, ['archive', 'pack', path, str(directory)])
+    assert result.exit_code == 0, result.output
+
+    with TranscriptArchive(path) as a:
+        assert a.get("abcdefghijk")['format'] == 'srt'
+        assert a.get("abcdefghijk")['text'] == SRT
+        assert a.get("otherotheri")['format'] == 'txt'
@@ -0,0 +1,167 @@
+import os
+import sqlite3
+
+import pytest
+
+from yt_t import cache as cache_module
+from yt_t.cache import ACCESS_UPDATE_INTERVAL, SOURCE_GEMINI, SOURCE_NATIVE, TranscriptCache
+
+DAY = 24 * 3600
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(cache_module, 'time', fake)
+    return fake
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "transcripts.sqlite")
+
+
+def rows(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {key: (size, accessed_at) for key, size, accessed_at in
+                conn.execute("SELECT key, size, accessed_at FROM transcripts")}
+    finally:
+        conn.close()
+
+
+def stored_total(path):
+    return sum(size for size, _ in rows(path).values())
+
+
+def test_round_trip_is_compressed(path):
+    text = "字幕内容 subtitle line\n" * 500
+    c = TranscriptCache(path)
+    c.put("abcdefghijk", "zh-CN", SOURCE_GEMINI, "v1", text)
+    assert c.get("abcdefghijk", "zh-CN", SOURCE_GEMINI, "v1") == text
+    # Other languages, sources and versions are separate entries
+    assert c.get("abcdefghijk", "en", SOURCE_GEMINI, "v1") is None
+    assert c.get("abcdefghijk", "zh-CN", SOURCE_NATIVE, "v1") is None
+    assert c.get("abcdefghijk", "zh-CN", SOURCE_GEMINI, "v2") is None
+
+    (size, _), = rows(path).values()
+    assert size < len(text.encode('utf-8')) / 10
+    assert c.total_bytes() == size
+    c.close()
+
+
+def test_ttl_differs_by_source(path, clock):
+    c = TranscriptCache(path)
+    c.put("abcdefghijk", "en", SOURCE_NATIVE, "v1", "native")
+    c.put("abcdefghijk", "en", SOURCE_GEMINI, "v1", "gemini")
+
+    clock.now += 7 * DAY - 1
+    assert c.get("abcdefghijk", "en", SOURCE_NATIVE, "v1") == "native"
+    clock.now += 2
+    assert c.get("abcdefghijk", "en", SOURCE_NATIVE, "v1") is None
+    assert c.get("abcdefghijk", "en", SOURCE_GEMINI, "v1") == "gemini"
+    # The expired entry is deleted and no longer counted
+    assert len(rows(path)) == 1
+    assert c.total_bytes() == stored_total(path)
+
+    clock.now += 83 * DAY
+    assert c.get("abcdefghijk", "en", SOURCE_GEMINI, "v1") is None
+    assert c.total_bytes() == 0
+    c.close()
+
+
+def test_custom_ttls_override_defaults(path, clock):
+    c = TranscriptCache(path, ttls={SOURCE_GEMINI: 60})
+    c.put("abcdefghijk", "en", SOURCE_GEMINI, "v1", "gemini")
+    clock.now += 61
+    assert c.get("abcdefghijk", "en", SOURCE_GEMINI, "v1") is None
+    c.close()
+
+
+def test_eviction_removes_least_recently_used_first(path, clock):
+    texts = {vid: os.urandom(2000).hex() for vid in ("aaaaaaaaaaa", "bbbbbbbbbbb", "ccccccccccc", "ddddddddddd")}
+    c = TranscriptCache(path, max_bytes=10 ** 9)
+    c.put("aaaaaaaaaaa", "en", SOURCE_GEMINI, "v1", texts["aaaaaaaaaaa"])
+    size = c.total_bytes()
+    c.close()
+
+    c = TranscriptCache(path, max_bytes=int(size * 3.5))
+    for vid in ("bbbbbbbbbbb", "ccccccccccc"):
+        clock.now += 10
+        c.put(vid, "en", SOURCE_GEMINI, "v1", texts[vid])
+
+    # A hit long after the last recorded access makes "a" the most recently used
+    clock.now += ACCESS_UPDATE_INTERVAL
+    assert c.get("aaaaaaaaaaa", "en", SOURCE_GEMINI, "v1") == texts["aaaaaaaaaaa"]
+
+    clock.now += 10
+    c.put("ddddddddddd", "en", SOURCE_GEMINI, "v1", texts["ddddddddddd"])
+    present = [vid for vid in texts if c.get(vid, "en", SOURCE_GEMINI, "v1")]
+    assert present == ["aaaaaaaaaaa", "ccccccccccc", "ddddddddddd"]
+    assert c.total_bytes() == stored_total(path) <= c.max_bytes
+    c.close()
+
+
+def test_recent_hits_do_not_rewrite_access_time(path, clock):
+    c = TranscriptCache(path)
+    c.put("abcdefghijk", "en", SOURCE_GEMINI, "v1", "text")
+    (_, accessed_at), = rows(path).values()
+
+    clock.now += ACCESS_UPDATE_INTERVAL - 1
+    assert c.get("abcdefghijk", "en", SOURCE_GEMINI, "v1") == "text"
+    assert list(rows(path).values())[0][1] == accessed_at
+
+    clock.now += 1
+    assert c.get("abcdefghijk", "en", SOURCE_GEMINI, "v1") == "text"
+    assert list(rows(path).values())[0][1] == clock.now
+    c.close()
+
+
+def test_running_total_tracks_overwrites_and_clear(path):
+    c = TranscriptCache(path)
+    c.put("abcdefghijk", "en", SOURCE_GEMINI, "v1", "short")
+    c.put("abcdefghijk", "en", SOURCE_GEMINI, "v1", os.urandom(500).hex())
+    c.put("otherotheri", "en", SOURCE_NATIVE, "v1", "other")
+    assert len(rows(path)) == 2
+    assert c.total_bytes() == stored_total(path)
+
+    # A second handle (another process) sees the same total
+    other = TranscriptCache(path)
+    other.put("thirdthirdx", "en", SOURCE_NATIVE, "v1", "third")
+    assert c.total_bytes() == other.total_bytes() == stored_total(path)
+
+    c.clear()
+    assert other.total_bytes() == 0
+    other.close()
+    c.close()
+
+
+def test_total_is_initialized_for_existing_cache(path):
+    conn = sqlite3.connect(path)
+    conn.execute(
+        """CREATE TABLE transcripts (
+            key TEXT PRIMARY KEY, video_id TEXT NOT NULL, language TEXT NOT NULL,
+            source TEXT NOT NULL, version TEXT NOT NULL, data BLOB NOT NULL,
+            size INTEGER NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL
+        )"""
+    )
+    conn.execute("INSERT INTO transcripts VALUES ('k1', 'v', 'en', 'native', 'v1', x'00', 100, 0, 0)")
+    conn.execute("INSERT INTO transcripts VALUES ('k2', 'v', 'en', 'native', 'v2', x'00', 50, 0, 1)")
+    conn.commit()
+    conn.close()
+
+    c = TranscriptCache(path, max_bytes=120)
+    assert c.total_bytes() == 150
+    c.put("abcdefghijk", "en", SOURCE_GEMINI, "v1", "text")
+    # The oldest entry is evicted to get under the cap
+    assert set(rows(path)) == {'k2', TranscriptCache.make_key("abcdefghijk", "en", SOURCE_GEMINI, "v1")}
+    assert c.total_bytes() == stored_total(path)
+    c.close()
@@ -0,0 +1,116 @@
+import pytest
+
+from yt_t.cues import CueList, SrtParser, merge_segments, parse_srt, serialize
+
+SRT = (
+    "1\n"
+    "00:00:01,000 --> 00:00:02,500\n"
+    "hello\n"
+    "\n"
+    "2\n"
+    "00:00:03,000 --> 00:00:04,000\n"
+    "two\n"
+    "lines\n"
+    "\n"
+    "3\n"
+    "00:01:05,250 --> 00:01:06,000\n"
+    "world\n"
+)
+
+
+def as_tuples(cues):
+    return [(round(start, 3), round(end, 3), text) for start, end, text in cues]
+
+
+def test_parse_standard_srt():
+    assert as_tuples(parse_srt(SRT)) == [
+        (1.0, 2.5, "hello"),
+        (3.0, 4.0, "two\nlines"),
+        (65.25, 66.0, "world"),
+    ]
+
+
+def test_numeric_text_after_blank_line_is_kept():
+    text = ("1\n00:00:00,000 --> 00:00:01,000\n2024\n\n"
+            "2\n00:00:01,000 --> 00:00:02,000\n2\n\n"
+            "3\n00:00:02,000 --> 00:00:03,000\n42\n")
+    assert [cue[2] for cue in parse_srt(text)] == ["2024", "2", "42"]
+
+
+def test_sequence_numbers_without_blank_lines():
+    # Gemini sometimes drops the blank lines between cues
+    text = ("1\n00:00:00,000 --> 00:00:01,000\nhello\n"
+            "2\n00:00:01,000 --> 00:00:02,000\n2024\n"
+            "3\n00:00:02,000 --> 00:00:03,000\nworld\n")
+    assert [cue[2] for cue in parse_srt(text)] == ["hello", "2024", "world"]
+
+
+def test_digit_line_that_is_not_the_next_index_stays_text():
+    text = ("1\n00:00:00,000 --> 00:00:01,000\n7\n"
+            "00:00:01,000 --> 00:00:02,000\nnext\n")
+    assert [cue[2] for cue in parse_srt(text)] == ["7", "next"]
+
+
+def test_crlf_input():
+    assert as_tuples(parse_srt(SRT.replace("\n", "\r\n"))) == as_tuples(parse_srt(SRT))
+
+
+def test_webvtt_and_noise_are_ignored():
+    text = ("```srt\nWEBVTT\n\n00:01.000 --> 00:02.000\nhello\n\n"
+            "1:00:00.5 --> 1:00:01.25\nlate\n```\n")
+    assert as_tuples(parse_srt(text)) == [(1.0, 2.0, "hello"), (3600.5, 3601.25, "late")]
+
+
+def test_entries_without_timing_are_skipped():
+    assert len(parse_srt("")) == 0
+    assert len(parse_srt("no subtitles here\n\n1\n")) == 0
+    # A timing line without text produces no cue
+    assert len(parse_srt("1\n00:00:00,000 --> 00:00:01,000\n\n")) == 0
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 16])
+def test_incremental_feed_matches_whole_parse(size):
+    parser = SrtParser()
+    cues = CueList()
+    for i in range(0, len(SRT), size):
+        cues.extend(parser.feed(SRT[i:i + size]))
+    cues.extend(parser.close())
+    assert as_tuples(cues) == as_tuples(parse_srt(SRT))
+
+
+def test_feed_split_inside_timestamp_returns_cues_once_complete():
+    parser = SrtParser()
+    assert len(parser.feed("1\n00:00:01,0")) == 0
+    assert len(parser.feed("00 --> 00:00:0")) == 0
+    assert len(parser.feed("2,500\nhel")) == 0
+    assert len(parser.feed("lo\n")) == 0
+    # The blank line ends the cue
+    assert as_tuples(parser.feed("\n2\n00:00:03,000")) == [(1.0, 2.5, "hello")]
+    assert len(parser.feed(" --> 00:00:04,000\r\nbye")) == 0
+    assert as_tuples(parser.close()) == [(3.0, 4.0, "bye")]
+
+
+def test_merge_segments_at_speed():
+    first = CueList([0.0, 100.0], [5.0, 110.0], ["a", "b"])
+    second = CueList([10.0], [20.0], ["c"])
+    third = CueList([0.5], [1.0], ["d"])
+    # 300-second segments at 2x each cover 600 seconds of the original video
+    merged = merge_segments([first, second, third], segment_seconds=300, speed=2.0)
+    assert as_tuples(merged) == [
+        (0.0, 10.0, "a"),
+        (200.0, 220.0, "b"),
+        (620.0, 640.0, "c"),
+        (1201.0, 1202.0, "d"),
+    ]
+
+
+def test_merge_segments_keeps_empty_segments_in_place():
+    merged = merge_segments([CueList(), CueList([1.5], [2.0], ["x"])], segment_seconds=60, speed=1.5)
+    assert as_tuples(merged) == [(92.25, 93.0, "x")]
+    assert as_tuples(merge_segments([CueList([1.0], [2.0], ["y"])], segment_seconds=60)) == [(1.0, 2.0, "y")]
+
+
+def test_serialized_srt_parses_back():
+    cues = CueList([0.0, 61.5], [1.25, 3661.001], ["2024", "a\nb"])
+    assert as_tuples(parse_srt(serialize(cues, 'srt'))) == as_tuples(cues)
+    assert as_tuples(parse_srt(serialize(cues, 'vtt'))) == as_tuples(cues)
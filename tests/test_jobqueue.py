@@ -0,0 +1,158 @@
+import threading
+import time
+
+import pytest
+
+from yt_t import gemini, jobqueue, metrics
+from yt_t.jobqueue import DEAD, DONE, LEASED, PENDING, JobQueue
+from yt_t.worker import QueueWorker
+
+URL = "https://www.youtube.com/watch?v=abcdefghijk"
+
+
+@pytest.fixture
+def queue(tmp_path):
+    q = JobQueue(str(tmp_path / "queue.sqlite"))
+    yield q
+    q.close()
+
+
+def status_of(queue, job_id):
+    return next(job for job in queue.list() if job['id'] == job_id)
+
+
+def test_expired_lease_is_reclaimed_and_stale_complete_rejected(queue):
+    (job_id,), _ = queue.enqueue([URL])
+    stale = queue.lease('worker-a', lease_seconds=0.05)
+    assert stale['id'] == job_id and stale['attempts'] == 1
+    assert queue.lease('worker-b') is None
+
+    time.sleep(0.1)
+    fresh = queue.lease('worker-b')
+    assert fresh['id'] == job_id
+    assert fresh['attempts'] == 2
+    assert fresh['token'] != stale['token']
+    assert [e['status'] for e in queue.events(job_id) if e['stage'] == 'lease'] == [LEASED, 'expired', LEASED]
+
+    # The first worker lost its lease: its heartbeat and result are ignored
+    assert queue.heartbeat(stale) is False
+    assert queue.complete(stale, source='gemini', path='/tmp/a.srt') is False
+    assert queue.fail(stale, 'boom') is None
+    assert status_of(queue, job_id)['status'] == LEASED
+
+    assert queue.complete(fresh, source='native', path='/tmp/b.txt') is True
+    row = status_of(queue, job_id)
+    assert (row['status'], row['worker'], row['path']) == (DONE, 'worker-b', '/tmp/b.txt')
+
+
+def test_expired_lease_on_last_attempt_goes_dead(queue):
+    (job_id,), _ = queue.enqueue([URL], max_attempts=1)
+    queue.lease('worker-a', lease_seconds=0.01)
+    time.sleep(0.05)
+    assert queue.lease('worker-b') is None
+    assert status_of(queue, job_id)['status'] == DEAD
+
+
+def test_fail_backs_off_then_dead_then_retry(queue, monkeypatch):
+    (job_id,), _ = queue.enqueue([URL], max_attempts=2)
+
+    job = queue.lease('worker')
+    before = time.time()
+    assert queue.fail(job, 'first') == PENDING
+    row = status_of(queue, job_id)
+    assert row['available_at'] >= before + jobqueue.RETRY_BASE_DELAY
+    assert row['error'] == 'first'
+    # Still backing off
+    assert queue.lease('worker') is None
+
+    monkeypatch.setattr(jobqueue, 'RETRY_BASE_DELAY', 0.0)
+    with queue._transaction() as conn:
+        conn.execute("UPDATE queue SET available_at = 0 WHERE id = ?", (job_id,))
+    job = queue.lease('worker')
+    assert job['attempts'] == 2
+    assert queue.fail(job, 'second') == DEAD
+    assert queue.lease('worker') is None
+    assert queue.counts()[DEAD] == 1
+
+    assert queue.retry() == 1
+    assert queue.retry() == 0
+    job = queue.lease('worker')
+    assert job['id'] == job_id
+    assert job['attempts'] == 1
+    assert queue.complete(job) is True
+
+
+def test_retry_only_selected_dead_jobs(queue):
+    ids, _ = queue.enqueue([URL, "https://youtu.be/bcdefghijkl"], max_attempts=1)
+    for _ in ids:
+        queue.fail(queue.lease('worker'), 'boom')
+    assert queue.counts()[DEAD] == 2
+    assert queue.retry([ids[1]]) == 1
+    assert queue.retry([]) == 0
+    assert status_of(queue, ids[0])['status'] == DEAD
+    assert status_of(queue, ids[1])['status'] == PENDING
+
+
+def test_duplicate_enqueue_without_force(queue):
+    added, skipped = queue.enqueue([URL, "https://youtu.be/abcdefghijk", "not a url"])
+    assert len(added) == 1
+    assert skipped == ["https://youtu.be/abcdefghijk", "not a url"]
+
+    # Leased and finished videos are not queued again
+    job = queue.lease('worker')
+    assert queue.enqueue([URL]) == ([], [URL])
+    queue.complete(job)
+    assert queue.enqueue([URL]) == ([], [URL])
+
+
+def test_duplicate_enqueue_with_force(queue):
+    (first,), _ = queue.enqueue([URL])
+    # force does not duplicate a video that is still pending or leased
+    assert queue.enqueue([URL], force=True) == ([], [URL])
+    job = queue.lease('worker')
+    assert queue.enqueue([URL], force=True) == ([], [URL])
+
+    queue.complete(job)
+    (second,), skipped = queue.enqueue(["https://youtu.be/abcdefghijk"], force=True)
+    assert skipped == []
+    assert second != first
+    assert queue.counts() == {PENDING: 1, LEASED: 0, DONE: 1, DEAD: 0}
+
+
+class SegmentedRunner:
+    """Stands in for BatchRunner: transcribes a long video as segments on a thread pool"""
+
+    def __init__(self):
+        self.threads = set()
+        self.worker_thread = None
+
+    def process(self, url):
+        self.worker_thread = threading.get_ident()
+        segments = gemini.transcribe_segments(None, ["a.ogg", "b.ogg", "c.ogg"], max_workers=3)
+        assert all(segments)
+        return {'status': 'ok', 'source': 'gemini', 'path': '/tmp/long.srt', 'error': None}
+
+
+def test_worker_records_stages_of_segments_on_pool_threads(queue, monkeypatch):
+    runner = SegmentedRunner()
+
+    def transcribe_audio_file(client, audio_path, segment_info="", uploads=None, on_upload=None):
+        runner.threads.add(threading.get_ident())
+        with metrics.span('upload', path=audio_path):
+            pass
+        with metrics.span('generate'):
+            return "1\n00:00:00,000 --> 00:00:01,000\nhello\n"
+
+    monkeypatch.setattr(gemini, 'transcribe_audio_file', transcribe_audio_file)
+    (job_id,), _ = queue.enqueue([URL])
+    worker = QueueWorker(queue, runner, name='worker')
+    assert worker.run(exit_when_idle=True) == 1
+
+    # The stages ran on the segment pool, not on the worker thread that leased the job
+    assert runner.threads and runner.worker_thread not in runner.threads
+    assert status_of(queue, job_id)['status'] == DONE
+    events = [(e['stage'], e['status']) for e in queue.events(job_id)]
+    for stage in ('segment', 'upload', 'generate'):
+        assert events.count((stage, 'started')) == 3
+        assert events.count((stage, 'ok')) == 3
+    assert events[-1] == ('job', DONE)
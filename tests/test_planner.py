@@ -0,0 +1,100 @@
+import random
+
+import pytest
+
+from yt_t import planner
+from yt_t.jobs import Job, long_video_params
+from yt_t.planner import (
+    DEFAULT_FAILURE_RATE, DEFAULT_OVERHEAD_SECONDS, DEFAULT_SECONDS_PER_MINUTE, MIN_SAMPLES, SPEEDS,
+    StatsStore, default_model, fit_latency, plan_long_video, plan_segments
+)
+
+THREE_HOURS = 3 * 3600
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    """An in-memory stats store used by plan_long_video; jobs live under tmp_path"""
+    monkeypatch.setenv('YT_T_CACHE_DIR', str(tmp_path))
+    s = StatsStore(':memory:')
+    monkeypatch.setattr(planner, '_store', s)
+    yield s
+    s.close()
+
+
+def record_fitted(store, overhead=20.0, per_minute=6.0, speed=2.0, count=40):
+    rng = random.Random(0)
+    for _ in range(count):
+        minutes = rng.uniform(5, 50)
+        store.record(speed, minutes, overhead + per_minute * minutes, True)
+
+
+def test_fit_latency():
+    assert fit_latency([(10.0, 50.0)] * (MIN_SAMPLES - 1)) is None
+    overhead, per_minute = fit_latency([(m, 15.0 + 3.0 * m) for m in (5, 10, 20, 30, 45)])
+    assert overhead == pytest.approx(15.0)
+    assert per_minute == pytest.approx(3.0)
+    # Identical segment lengths cannot separate overhead from per-minute cost
+    assert fit_latency([(10.0, 130.0)] * MIN_SAMPLES) == (DEFAULT_OVERHEAD_SECONDS, 10.0)
+    # A negative slope is clamped, the overhead cannot go below zero
+    overhead, per_minute = fit_latency([(m, 100.0 - m) for m in (5, 10, 20, 30, 45)])
+    assert per_minute == 0.1 and overhead >= 0.0
+
+
+def test_empty_store_uses_default_model(store):
+    assert store.model() == default_model()
+    plan = plan_segments(THREE_HOURS, 4, store.model())
+    assert plan == plan_segments(THREE_HOURS, 4, default_model())
+    assert plan['samples'] == 0
+    assert plan['speed'] == SPEEDS[0]
+    assert default_model()['latency'][2.0] == (DEFAULT_OVERHEAD_SECONDS, DEFAULT_SECONDS_PER_MINUTE)
+
+
+def test_plan_long_video_without_stats(store, capsys):
+    params = plan_long_video('abcdefghijk', THREE_HOURS, 4, 'speech-opus')
+    plan = plan_segments(THREE_HOURS, 4, default_model())
+    assert params == long_video_params('speech-opus', False, plan['speed'], plan['segment_minutes'])
+    assert "尚无统计数据" in capsys.readouterr().out
+
+
+def test_fitted_model_shortens_segments_as_workers_increase(store):
+    record_fitted(store)
+    model = store.model()
+    assert model['latency'][2.0] == pytest.approx((20.0, 6.0))
+    assert model['samples'][2.0] == 40
+    # 40 successes pull the failure rate below the prior
+    assert model['failure'][2.0] < DEFAULT_FAILURE_RATE
+
+    plans = [plan_segments(THREE_HOURS, workers, model) for workers in (1, 4, 8, 16)]
+    minutes = [plan['segment_minutes'] for plan in plans]
+    assert minutes == sorted(minutes, reverse=True) and len(set(minutes)) == len(minutes)
+    assert [plan['segments'] for plan in plans] == [2, 4, 8, 16]
+    expected = [plan['expected_seconds'] for plan in plans]
+    assert expected == sorted(expected, reverse=True)
+    assert all(plan['speed'] == 2.0 for plan in plans)
+
+
+def test_failure_rate_steers_away_from_a_speed(store):
+    record_fitted(store, speed=2.0)
+    record_fitted(store, speed=1.5)
+    for _ in range(40):
+        store.record(2.0, 20.0, 30.0, False)
+    model = store.model()
+    assert model['failure'][2.0] == pytest.approx((40 + DEFAULT_FAILURE_RATE * 10) / (80 + 10))
+    assert plan_segments(THREE_HOURS, 4, model)['speed'] == 1.5
+
+
+def test_resume_returns_saved_params_unchanged(store):
+    saved = long_video_params('speech-opus', True, 1.25, 17)
+    job = Job.open('abcdefghijk', 'https://youtu.be/abcdefghijk', saved)
+    job.release()
+    record_fitted(store)
+
+    assert plan_long_video('abcdefghijk', THREE_HOURS, 8, 'speech-opus', remove_silence=True,
+                           resume=True) == saved
+    # Without resume, or with different encoding options, the plan follows the stats
+    fresh = plan_segments(THREE_HOURS, 8, store.model())
+    replanned = long_video_params('speech-opus', True, fresh['speed'], fresh['segment_minutes'])
+    assert plan_long_video('abcdefghijk', THREE_HOURS, 8, 'speech-opus', remove_silence=True) == replanned
+    assert plan_long_video('abcdefghijk', THREE_HOURS, 8, 'speech-opus', resume=True) == \
+        long_video_params('speech-opus', False, fresh['speed'], fresh['segment_minutes'])
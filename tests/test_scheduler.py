@@ -0,0 +1,208 @@
+import threading
+
+import pytest
+
+from yt_t import scheduler
+from yt_t.scheduler import (
+    FATAL, RATE_LIMIT, TRANSIENT, AIMDLimiter, RequestScheduler, classify_error, retry_after
+)
+
+
+class FakeResponse:
+    def __init__(self, status_code=None, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class APIError(Exception):
+    """Shaped like google.genai.errors.APIError"""
+
+    def __init__(self, code, message='', headers=None, details=None):
+        super().__init__(f"{code} {message}")
+        self.code = code
+        self.details = details
+        self.response = FakeResponse(code, headers)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(scheduler, 'time', fake)
+    # Full jitter always picks the upper bound
+    monkeypatch.setattr(scheduler.random, 'uniform', lambda low, high: high)
+    return fake
+
+
+def test_classify_error():
+    assert classify_error(APIError(429)) == RATE_LIMIT
+    assert classify_error(APIError(None, 'RESOURCE_EXHAUSTED: quota')) == RATE_LIMIT
+    for code in (408, 500, 502, 503, 504):
+        assert classify_error(APIError(code)) == TRANSIENT
+    assert classify_error(APIError(None, 'UNAVAILABLE')) == TRANSIENT
+    assert classify_error(APIError(None, 'DEADLINE_EXCEEDED')) == TRANSIENT
+    assert classify_error(APIError(400, 'INVALID_ARGUMENT')) == FATAL
+    assert classify_error(APIError(403)) == FATAL
+
+    # Status code only on the response object
+    error = Exception("bad gateway")
+    error.response = FakeResponse(502)
+    assert classify_error(error) == TRANSIENT
+
+    assert classify_error(ConnectionResetError()) == TRANSIENT
+    assert classify_error(TimeoutError()) == TRANSIENT
+    assert classify_error(ValueError("bad")) == FATAL
+
+
+def test_classify_httpx_transport_errors():
+    httpx = pytest.importorskip('httpx')
+    assert classify_error(httpx.ConnectTimeout("timed out")) == TRANSIENT
+    assert classify_error(httpx.RemoteProtocolError("peer closed")) == TRANSIENT
+
+
+def test_retry_after():
+    assert retry_after(APIError(429, headers={'retry-after': '7'})) == 7.0
+    assert retry_after(APIError(429, headers={'retry-after': '2.5'})) == 2.5
+    details = {'error': {'details': [{'@type': 'type.googleapis.com/google.rpc.RetryInfo',
+                                      'retryDelay': '32s'}]}}
+    assert retry_after(APIError(429, details=details)) == 32.0
+    # An HTTP date is not parsed; the RetryInfo hint is used instead
+    assert retry_after(APIError(429, headers={'retry-after': 'Wed, 21 Oct 2015 07:28:00 GMT'},
+                                details=details)) == 32.0
+    assert retry_after(APIError(429, 'Quota exceeded. Please retry in 12.5s.')) == 12.5
+    assert retry_after(APIError(503, 'overloaded')) is None
+    assert retry_after(ValueError()) is None
+
+
+def test_additive_increase_is_about_one_per_window(clock):
+    limiter = AIMDLimiter(initial=4, maximum=16)
+    for _ in range(4):
+        limiter.acquire()
+        limiter.release()
+    assert limiter.limit == 4
+    assert 4.9 < limiter._limit < 5.0
+    limiter.acquire()
+    limiter.release()
+    assert limiter.limit == 5
+
+    for _ in range(1000):
+        limiter.acquire()
+        limiter.release()
+    assert limiter._limit == 16
+
+
+def test_multiplicative_decrease_with_cooldown_and_minimum(clock):
+    limiter = AIMDLimiter(initial=8, minimum=1, maximum=16, decrease=0.5, cooldown=5.0)
+    outcomes = [(RATE_LIMIT, 4), (RATE_LIMIT, 4), (TRANSIENT, 4), (FATAL, 4)]
+    for outcome, expected in outcomes:
+        limiter.acquire()
+        limiter.release(outcome)
+        assert limiter.limit == expected
+
+    clock.now += 5.0
+    limiter.acquire()
+    limiter.release(RATE_LIMIT)
+    assert limiter.limit == 2
+    for _ in range(3):
+        clock.now += 5.0
+        limiter.acquire()
+        limiter.release(RATE_LIMIT)
+    assert limiter._limit == 1.0
+
+
+def test_limiter_initial_value_is_clamped():
+    assert AIMDLimiter(initial=0, minimum=1).limit == 1
+    assert AIMDLimiter(initial=100, maximum=16).limit == 16
+
+
+def test_acquire_waits_for_a_free_slot():
+    limiter = AIMDLimiter(initial=2, maximum=2)
+    limiter.acquire()
+    limiter.acquire()
+    acquired = threading.Event()
+
+    def third():
+        limiter.acquire()
+        acquired.set()
+
+    thread = threading.Thread(target=third)
+    thread.start()
+    assert not acquired.wait(0.1)
+    limiter.release()
+    assert acquired.wait(5)
+    thread.join()
+
+
+def scripted(*outcomes):
+    """A request function that raises or returns the scripted outcomes in order"""
+    calls = []
+
+    def fn(*args, **kwargs):
+        outcome = outcomes[len(calls)]
+        calls.append((args, kwargs))
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+    fn.calls = calls
+    return fn
+
+
+def test_call_retries_rate_limits_and_transient_errors(clock):
+    limiter = AIMDLimiter(initial=4, maximum=16)
+    requests = RequestScheduler(limiter, max_attempts=6, base_delay=1.0, max_delay=60.0)
+    fn = scripted(APIError(429, headers={'retry-after': '10'}), APIError(503), APIError(429), 'ok')
+
+    assert requests.call(fn, 'a', key='b') == 'ok'
+    assert fn.calls == [(('a',), {'key': 'b'})] * 4
+    # Server hint beats the 2 s backoff, then 4 s and 8 s exponential backoff
+    assert clock.sleeps == [10.0, 4.0, 8.0]
+    # 4 -> 2 on the first 429, 14 s later the second 429 halves again, then one success adds 1 / 1
+    assert limiter._limit == 2.0
+    assert limiter._in_flight == 0
+
+
+def test_call_honours_cooldown_between_rate_limits(clock):
+    limiter = AIMDLimiter(initial=8, maximum=16, cooldown=30.0)
+    requests = RequestScheduler(limiter, base_delay=1.0)
+    fn = scripted(APIError(429), APIError(429), 'ok')
+    assert requests.call(fn) == 'ok'
+    assert clock.sleeps == [2.0, 4.0]
+    # The second 429 came 2 s after the first, within the cooldown
+    assert limiter._limit == pytest.approx(4 + 1 / 4)
+
+
+def test_call_raises_fatal_errors_without_retrying(clock):
+    limiter = AIMDLimiter(initial=4)
+    fn = scripted(APIError(400, 'INVALID_ARGUMENT'))
+    with pytest.raises(APIError):
+        RequestScheduler(limiter).call(fn)
+    assert len(fn.calls) == 1
+    assert clock.sleeps == []
+    assert limiter.limit == 4 and limiter._in_flight == 0
+
+
+def test_call_gives_up_after_max_attempts(clock):
+    fn = scripted(*[APIError(503)] * 4)
+    with pytest.raises(APIError):
+        RequestScheduler(AIMDLimiter(), max_attempts=4, base_delay=1.0).call(fn)
+    assert len(fn.calls) == 4
+    assert clock.sleeps == [2.0, 4.0, 8.0]
+
+
+def test_backoff_is_capped(clock):
+    requests = RequestScheduler(AIMDLimiter(), base_delay=1.0, max_delay=60.0)
+    assert [requests.backoff(attempt, APIError(503)) for attempt in (1, 5, 6, 20)] == [2.0, 32.0, 60.0, 60.0]
+    # A server hint longer than the cap is still honoured
+    assert requests.backoff(1, APIError(429, headers={'retry-after': '120'})) == 120.0
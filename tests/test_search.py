@@ -0,0 +1,162 @@
+import os
+
+import pytest
+
+from yt_t.search import (
+    SearchIndex, detect_format, parse_body, parse_transcript_file, parse_txt_cues
+)
+from yt_t.utils import transcript_header
+
+SRT = ("1\n00:00:01,000 --> 00:00:03,000\n今天我们讨论机器学习\n\n"
+       "2\n00:01:05,500 --> 00:01:08,000\nhe said \"hi\" OR NEAR(x) at 5% off\n")
+
+
+def header(video_id, title="Title"):
+    return transcript_header(video_id, f"https://www.youtube.com/watch?v={video_id}", title)
+
+
+def as_tuples(cues):
+    return [(start, text) for start, _, text in cues]
+
+
+@pytest.fixture
+def index(tmp_path):
+    i = SearchIndex(str(tmp_path / "search.sqlite"))
+    yield i
+    i.close()
+
+
+@pytest.fixture
+def directory(tmp_path):
+    d = tmp_path / "transcripts"
+    d.mkdir()
+    return d
+
+
+def test_detect_format_uses_content():
+    # Gemini SRT saved with the default .txt extension
+    assert detect_format(SRT, 'txt') == 'srt'
+    assert detect_format("WEBVTT\n\n00:01.000 --> 00:02.000\nhi\n", 'txt') == 'vtt'
+    assert detect_format('[\n{"start": 1.0, "end": 2.0, "text": "hi"}\n]\n', 'txt') == 'json'
+    assert detect_format('[]\n') == 'json'
+    assert detect_format("[00:01] hello\n[00:02] world\n", 'srt') == 'txt'
+    assert detect_format("plain text", 'txt') == 'txt'
+
+
+def test_txt_cues_with_minutes_and_hours():
+    text = "[00:05] hello\n  continued line\n\n[75:10] long minutes\n[1:02:03] with hours\nbefore-nothing"
+    assert as_tuples(parse_txt_cues(text)) == [
+        (5.0, "hello continued line"),
+        (4510.0, "long minutes"),
+        (3723.0, "with hours before-nothing"),
+    ]
+    # Lines before the first cue are dropped
+    assert len(parse_txt_cues("intro\n")) == 0
+
+
+def test_parse_body_falls_back_to_other_parser():
+    assert as_tuples(parse_body(SRT, 'txt'))[0] == (1.0, "今天我们讨论机器学习")
+    assert as_tuples(parse_body('[{"start": 2, "text": "x"}]', 'json')) == [(2.0, "x")]
+    assert len(parse_body('[{"broken": 1}]', 'json')) == 0
+
+
+def test_parse_transcript_file_video_id():
+    parsed = parse_transcript_file("Title_transcript_20240101_000000.txt", header("abcdefghijk") + SRT)
+    assert parsed['video_id'] == "abcdefghijk"
+    assert parsed['url'] == "https://www.youtube.com/watch?v=abcdefghijk"
+    assert parsed['title'] == "Title"
+    assert len(parsed['cues']) == 2
+
+    # Headerless formats carry the ID in the default file name
+    assert parse_transcript_file("Title_transcript_abc-efg_ijk_20240101_000000.srt", SRT)['video_id'] == \
+        "abc-efg_ijk"
+    assert parse_transcript_file("youtube_transcript_abcdefghijk.vtt", SRT)['video_id'] == "abcdefghijk"
+    assert parse_transcript_file("custom.srt", SRT)['video_id'] is None
+
+
+def test_update_rescan_prune_and_skip(index, directory):
+    (directory / "a_transcript_20240101_000000.txt").write_text(header("aaaaaaaaaaa") + SRT, encoding='utf-8')
+    sub = directory / "sub"
+    sub.mkdir()
+    (sub / "B_transcript_bbbbbbbbbbb_20240101_000000.srt").write_text(SRT, encoding='utf-8')
+    (directory / "custom.srt").write_text(SRT, encoding='utf-8')
+    (directory / ".hidden.txt").write_text(header("hhhhhhhhhhh") + SRT, encoding='utf-8')
+    (directory / "x.txt.tmp").write_text(header("ttttttttttt") + SRT, encoding='utf-8')
+
+    stats = index.update(str(directory))
+    assert stats == {'scanned': 3, 'added': 2, 'updated': 0, 'unchanged': 0, 'removed': 0, 'skipped': 1,
+                     'failed': 0}
+    assert index.stats()['files'] == 2
+    assert index.stats()['cues'] == 4
+
+    stats = index.update(str(directory))
+    assert (stats['unchanged'], stats['added'], stats['updated']) == (2, 0, 0)
+
+    # Touched but unchanged content is not re-parsed; changed content is
+    path = directory / "a_transcript_20240101_000000.txt"
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert index.update(str(directory))['unchanged'] == 2
+    path.write_text(header("aaaaaaaaaaa") + "[00:07] replaced text\n", encoding='utf-8')
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 2 * 10 ** 9))
+    stats = index.update(str(directory))
+    assert (stats['updated'], stats['unchanged']) == (1, 1)
+    assert [r['text'] for r in index.search("replaced")] == ["replaced text"]
+    assert [r['video_id'] for r in index.search("机器学习")] == ["bbbbbbbbbbb"]
+
+    (sub / "B_transcript_bbbbbbbbbbb_20240101_000000.srt").unlink()
+    stats = index.update(str(directory))
+    assert stats['removed'] == 1
+    assert index.search("机器学习") == []
+    assert index.stats() == {'files': 1, 'cues': 1, 'tokenizer': index.tokenizer}
+
+    # Indexing another directory does not prune this one
+    other = directory.parent / "other"
+    other.mkdir()
+    assert index.update(str(other))['removed'] == 0
+    assert index.stats()['files'] == 1
+
+
+@pytest.fixture
+def indexed(index, directory):
+    (directory / "a_transcript_20240101_000000.txt").write_text(header("aaaaaaaaaaa") + SRT, encoding='utf-8')
+    (directory / "b_transcript_20240101_000000.txt").write_text(
+        header("bbbbbbbbbbb") + "[00:03] 机器学习入门\n[00:09] 5 percent\n", encoding='utf-8')
+    index.update(str(directory))
+    return index
+
+
+def test_search_cjk_substring_and_links(indexed):
+    if indexed.tokenizer != 'trigram':
+        pytest.skip("SQLite without the trigram tokenizer")
+    results = indexed.search("机器学习")
+    assert sorted(r['video_id'] for r in results) == ["aaaaaaaaaaa", "bbbbbbbbbbb"]
+    hit = indexed.search("讨论机器", video_id="aaaaaaaaaaa")
+    assert len(hit) == 1
+    assert hit[0]['timestamp'] == "00:00:01"
+    assert hit[0]['link'] == "https://www.youtube.com/watch?v=aaaaaaaaaaa&t=1s"
+    assert hit[0]['title'] == "Title"
+
+
+def test_short_queries_use_like_fallback(indexed):
+    if indexed.tokenizer != 'trigram':
+        pytest.skip("SQLite without the trigram tokenizer")
+    assert sorted(r['video_id'] for r in indexed.search("学习")) == ["aaaaaaaaaaa", "bbbbbbbbbbb"]
+    assert [r['video_id'] for r in indexed.search("学习", video_id="bbbbbbbbbbb")] == ["bbbbbbbbbbb"]
+    # LIKE wildcards in the query are literal
+    assert [r['text'] for r in indexed.search("5%")] == ['he said "hi" OR NEAR(x) at 5% off']
+    assert indexed.search("_x") == []
+    assert indexed.search("  ") == []
+
+
+@pytest.mark.parametrize('query', ['said "hi"', '"hi" OR', 'OR NEAR(x)', 'NEAR(', 'hi" OR NEAR(x'])
+def test_fts_syntax_in_queries_is_quoted(indexed, query):
+    results = indexed.search(query)
+    assert [r['timestamp'] for r in results] == ["00:01:05"]
+    assert results[0]['link'] == "https://www.youtube.com/watch?v=aaaaaaaaaaa&t=65s"
+
+
+def test_queries_match_as_a_phrase(indexed):
+    # "OR" is not an operator: a line containing only one side does not match
+    assert indexed.search("percent OR 机器") == []
+    assert indexed.search("NEAR(x) said") == []
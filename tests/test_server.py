@@ -0,0 +1,105 @@
+import sys
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+from yt_t import batch
+from yt_t.batch import BatchRunner
+from yt_t.server import TranscriptionService, job_view
+
+URL = "https://www.youtube.com/watch?v=abcdefghijk"
+
+
+class InterleavedResult(dict):
+    """A result dict whose items() lets a "worker" finish the job mid-iteration"""
+
+    def items(self):
+        for i, item in enumerate(super().items()):
+            if i == 1:
+                self.pop('partial_path')
+            yield item
+
+
+class FakeWriter:
+    temp_path = "/tmp/partial.srt.tmp"
+
+
+@pytest.fixture
+def release(monkeypatch):
+    """Run the Gemini stage with fakes; it blocks until the returned event is set"""
+    event = threading.Event()
+
+    def stream(url, video_id, language, writer, cache, **kwargs):
+        event.wait(5)
+        return f"/tmp/{video_id}.srt"
+
+    monkeypatch.setenv('GEMINI_API_KEY', 'fake')
+    monkeypatch.setattr(batch, 'get_cached_transcript', lambda *args: (None, None))
+    monkeypatch.setattr(batch, 'fetch_native_transcript', lambda *args: None)
+    monkeypatch.setattr(batch, 'resolve_video_info', lambda url: {'title': 'Title'})
+    monkeypatch.setattr(batch, 'open_writer', lambda *args, **kwargs: FakeWriter())
+    monkeypatch.setattr(batch, 'stream_gemini_transcript', stream)
+    return event
+
+
+def test_job_view_is_stable_while_job_changes_stage(release):
+    # Switch threads often so that polls interleave with the workers' updates
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        run_service_while_polling(release)
+    finally:
+        sys.setswitchinterval(interval)
+
+
+def run_service_while_polling(release):
+    service = TranscriptionService(BatchRunner(caption_workers=4, gemini_workers=4))
+    views, errors = [], []
+    stop = threading.Event()
+
+    def poll():
+        while not stop.is_set():
+            try:
+                views.extend(job_view(job) for job in service.list())
+            except Exception as e:
+                errors.append(e)
+
+    pollers = [threading.Thread(target=poll) for _ in range(2)]
+    for t in pollers:
+        t.start()
+    try:
+        job = service.submit(URL)
+        while job_view(job)['state'] != 'running' or not job_view(job)['partial']:
+            pass
+        running = job_view(job)
+        assert running['stage'] == 'gemini'
+        assert running['source'] == 'gemini'
+
+        release.set()
+        # Push more jobs through every stage while the pollers keep reading
+        more = [service.submit(f"https://www.youtube.com/watch?v=abcdefgh{n:03d}") for n in range(200)]
+        for j in [job] + more:
+            j['future'].result(timeout=10)
+    finally:
+        stop.set()
+        for t in pollers:
+            t.join()
+        service.close()
+
+    assert errors == []
+    done = job_view(job)
+    assert done['state'] == 'done'
+    assert done['stage'] == 'done'
+    assert done['path'] == "/tmp/abcdefghijk.srt"
+    assert done['partial'] is False
+    assert 'partial_path' not in done and 'status' not in done
+    assert views
+
+
+def test_job_view_copies_result_before_iterating():
+    result = InterleavedResult(BatchRunner._new_result(URL), stage='gemini', partial_path="/tmp/a.tmp")
+    job = {'id': 'job', 'submitted_at': 0.0, 'result': result, 'future': Future()}
+    view = job_view(job)
+    assert view['stage'] == 'gemini'
+    assert view['partial'] is True
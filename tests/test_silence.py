@@ -0,0 +1,135 @@
+import re
+
+import pytest
+
+from yt_t.cues import CueList
+from yt_t.silence import RemapTable, merge_regions
+
+REGIONS = [(2.0, 5.0), (10.0, 12.0), (20.0, 30.0)]
+
+
+def compile_expression(expression: str):
+    """Parses the subset of ffmpeg expressions used by filter_expression into a function of t"""
+    tokens = re.findall(r'[a-z]+|[-\d.]+|[(),]', expression)
+    position = 0
+
+    def take(expected=None):
+        nonlocal position
+        token = tokens[position]
+        position += 1
+        if expected is not None:
+            assert token == expected, (token, expected)
+        return token
+
+    def node():
+        token = take()
+        if token == 't':
+            return lambda t: t
+        if token[0].isdigit() or token[0] == '-':
+            number = float(token)
+            return lambda t: number
+        take('(')
+        args = [node()]
+        while take() == ',':
+            args.append(node())
+        if token == 'between':
+            x, low, high = args
+            return lambda t: float(low(t) <= x(t) <= high(t))
+        if token == 'lt':
+            a, b = args
+            return lambda t: float(a(t) < b(t))
+        if token == 'if':
+            cond, then, other = args
+            return lambda t: then(t) if cond(t) else other(t)
+        raise AssertionError(f"unexpected function {token}")
+
+    function = node()
+    assert position == len(tokens)
+    return function
+
+
+def test_to_original_maps_region_boundaries():
+    table = RemapTable(REGIONS)
+    assert table.offsets == [0.0, 3.0, 5.0]
+    assert table.duration == 15.0
+    assert table.to_original(0.0) == 2.0
+    assert table.to_original(2.5) == 4.5
+    # A boundary belongs to the next region
+    assert table.to_original(3.0) == 10.0
+    assert table.to_original(5.0) == 20.0
+    assert table.to_original(15.0) == 30.0
+    # Times past the trimmed duration continue from the last region
+    assert table.to_original(17.0) == 32.0
+
+
+def test_empty_table_is_identity():
+    table = RemapTable([])
+    cues = CueList([1.0], [2.0], ["x"])
+    assert table.to_original(7.0) == 7.0
+    assert table.apply(cues) is cues
+    assert table.filter_expression() == '1'
+
+
+def test_apply_sorted_and_unsorted_cues_match_to_original():
+    table = RemapTable(REGIONS)
+    starts = [0.0, 1.0, 2.99, 3.0, 4.0, 5.0, 14.0, 16.0]
+    ends = [s + 0.5 for s in starts]
+    mapped = table.apply(CueList(starts, ends, [str(s) for s in starts]))
+    assert list(mapped.starts) == [table.to_original(s) for s in starts]
+    assert list(mapped.ends) == [table.to_original(e) for e in ends]
+    assert mapped.texts == [str(s) for s in starts]
+
+    # Cues out of order (e.g. a model restarting its timestamps) fall back to bisect
+    shuffled = [14.0, 0.5, 5.0, 3.5, 3.5, 1.0, 16.0, 0.0]
+    mapped = table.apply(CueList(shuffled, shuffled, [''] * len(shuffled)))
+    assert list(mapped.starts) == [table.to_original(s) for s in shuffled]
+    assert list(mapped.starts) == [29.0, 2.5, 20.0, 10.5, 10.5, 3.0, 31.0, 2.0]
+
+
+def test_merge_regions_joins_short_gaps():
+    regions = [(0.0, 1.0), (1.5, 2.0), (4.0, 5.0), (5.2, 6.0), (9.0, 10.0)]
+    assert merge_regions(regions, min_gap=1.0) == [(0.0, 2.0), (4.0, 6.0), (9.0, 10.0)]
+    # A gap exactly min_gap long is still cut
+    assert merge_regions([(0.0, 1.0), (2.0, 3.0)], min_gap=1.0) == [(0.0, 1.0), (2.0, 3.0)]
+    assert merge_regions([(0.0, 1.0)]) == [(0.0, 1.0)]
+    assert merge_regions([]) == []
+
+
+def test_merge_regions_caps_count_keeping_longest_gaps():
+    # Gaps of 1, 5, 2, 4 and 3 seconds
+    regions = [(0.0, 1.0), (2.0, 3.0), (8.0, 9.0), (11.0, 12.0), (16.0, 17.0), (20.0, 21.0)]
+    assert merge_regions(regions, min_gap=1.0, max_regions=6) == regions
+    capped = merge_regions(regions, min_gap=1.0, max_regions=3)
+    assert len(capped) == 3
+    # The 5 s and 4 s gaps are cut; shorter ones are merged back into the regions
+    assert capped == [(0.0, 3.0), (8.0, 12.0), (16.0, 21.0)]
+    assert merge_regions(regions, min_gap=1.0, max_regions=1) == [(0.0, 21.0)]
+
+
+@pytest.mark.parametrize('max_regions', [2, 10, 100, 999])
+def test_merge_regions_cap_is_exact(max_regions):
+    regions = [(i * 3.0, i * 3.0 + 1.0 + (i % 7) * 0.1) for i in range(1000)]
+    merged = merge_regions(regions, min_gap=0.5, max_regions=max_regions)
+    assert len(merged) == max_regions
+    assert merged[0][0] == regions[0][0] and merged[-1][1] == regions[-1][1]
+    assert all(a[1] < b[0] for a, b in zip(merged, merged[1:]))
+
+
+@pytest.mark.parametrize('count', [1, 2, 3, 7, 64, 1000])
+def test_filter_expression_selects_exactly_the_regions(count):
+    regions = [(i * 2.0 + 0.5, i * 2.0 + 1.25) for i in range(count)]
+    expression = RemapTable(regions).filter_expression()
+    # A balanced tree: the nesting depth grows with log2 of the region count
+    assert expression.count('if(') == count - 1
+    depth = max_depth = 0
+    for char in expression:
+        depth += char == '('
+        depth -= char == ')'
+        max_depth = max(max_depth, depth)
+    assert max_depth <= 2 * (count - 1).bit_length() + 2
+
+    selected = compile_expression(expression)
+    for i in range(count * 2 + 1):
+        for t in (i, i + 0.5, i + 1.0, i + 1.25, i + 1.5):
+            inside = any(start <= t <= end for start, end in regions)
+            assert selected(t) == float(inside), t
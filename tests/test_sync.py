@@ -0,0 +1,152 @@
+import sys
+import types
+
+import pytest
+
+from yt_t.sync import DONE, FAILED, KNOWN_STREAK, MAX_SYNC_ATTEMPTS, SyncIndex, find_new, iter_entries
+
+CHANNEL = "https://www.youtube.com/@channel"
+VIDEOS = CHANNEL + "/videos"
+SHORTS = CHANNEL + "/shorts"
+PLAYLIST = "https://www.youtube.com/playlist?list=PL123"
+
+
+def vid(prefix, n):
+    return f"{prefix}{n:010d}"
+
+
+class FakeSite:
+    """Flat yt-dlp results for a channel with two tabs and a playlist; counts the entries read"""
+
+    def __init__(self, videos=100, shorts=100):
+        tab = {'_type': 'url', 'ie_key': 'YoutubeTab'}
+        self.lists = {
+            CHANNEL: [dict(tab, url=VIDEOS), dict(tab, url=SHORTS), dict(tab, url=VIDEOS)],
+            VIDEOS: [{'id': vid('v', n), 'title': f"video {n}"} for n in range(videos)],
+            SHORTS: [{'id': vid('s', n), 'title': f"short {n}"} for n in range(shorts)],
+            PLAYLIST: [{'id': vid('v', n)} for n in range(0, videos, 2)] + [None, {'title': 'no id'}],
+        }
+        self.read = {url: 0 for url in self.lists}
+
+    def entries(self, url):
+        for entry in self.lists[url]:
+            self.read[url] += 1
+            yield entry
+
+    def extract_info(self, url, download=True, process=True):
+        assert download is False and process is False
+        if url not in self.lists:
+            return {'id': url.rsplit('=', 1)[-1], 'title': 'single'}
+        return {'_type': 'playlist', 'entries': self.entries(url)}
+
+
+@pytest.fixture
+def site(monkeypatch):
+    fake = FakeSite()
+
+    class YoutubeDL:
+        def __init__(self, options):
+            assert options['extract_flat'] and options['lazy_playlist']
+
+        def __enter__(self):
+            return fake
+
+        def __exit__(self, *exc):
+            return False
+
+    monkeypatch.setitem(sys.modules, 'yt_dlp', types.SimpleNamespace(YoutubeDL=YoutubeDL))
+    return fake
+
+
+def done(*ids):
+    return {video_id: (DONE, 1) for video_id in ids}
+
+
+def new_ids(found):
+    return [entry['video_id'] for entry in found['new']]
+
+
+def test_each_tab_stops_after_known_streak(site):
+    # Videos: 5 new uploads, then everything is known
+    states = done(*(vid('v', n) for n in range(5, 100)))
+    # Shorts: 3 new, 29 known, 1 new (the streak restarts), then known
+    states.update(done(*(vid('s', n) for n in range(3, 32))))
+    states.update(done(*(vid('s', n) for n in range(33, 100))))
+
+    found = find_new(CHANNEL, states)
+    assert new_ids(found) == [vid('v', n) for n in range(5)] + [vid('s', n) for n in (0, 1, 2, 32)]
+    assert found['complete'] is False
+    # Each tab reads exactly up to the end of its streak; the duplicate tab is not walked again
+    assert site.read[VIDEOS] == 5 + KNOWN_STREAK
+    assert site.read[SHORTS] == 33 + KNOWN_STREAK
+    assert found['entries'] == site.read[VIDEOS] + site.read[SHORTS]
+    assert site.read[CHANNEL] == 3
+
+
+def test_streak_one_short_of_the_limit_keeps_reading(site):
+    states = done(*(vid('v', n) for n in range(KNOWN_STREAK - 1)))
+    found = find_new(CHANNEL, states)
+    assert vid('v', KNOWN_STREAK - 1) in new_ids(found)
+    assert site.read[VIDEOS] == 100
+
+
+def test_stopped_lists_are_reported(site):
+    stopped = []
+    known = done(*(vid('v', n) for n in range(100)))
+    entries = list(iter_entries(CHANNEL, lambda video_id: video_id in known, stopped))
+    assert stopped == [VIDEOS]
+    assert len(entries) == KNOWN_STREAK + 100
+    assert entries[0] == {'video_id': vid('v', 0), 'url': f"https://www.youtube.com/watch?v={vid('v', 0)}",
+                          'title': "video 0", 'duration': None}
+
+
+def test_full_sync_reads_every_entry(site):
+    states = done(*(vid('v', n) for n in range(100)), *(vid('s', n) for n in range(100)))
+    found = find_new(CHANNEL, states, full=True)
+    assert new_ids(found) == []
+    assert found == {'entries': 200, 'new': [], 'complete': True}
+    assert site.read[VIDEOS] == site.read[SHORTS] == 100
+
+
+def test_playlists_are_always_read_in_full(site):
+    states = done(*(vid('v', n) for n in range(0, 100, 2) if n != 98))
+    found = find_new(PLAYLIST, states)
+    assert new_ids(found) == [vid('v', 98)]
+    assert found['complete'] is True
+    assert found['entries'] == 50
+
+
+def test_failed_videos_are_retried_up_to_the_limit(site):
+    states = {
+        vid('v', 0): (FAILED, MAX_SYNC_ATTEMPTS - 1),
+        vid('v', 2): (FAILED, MAX_SYNC_ATTEMPTS),
+        vid('v', 4): (DONE, 1),
+    }
+    assert new_ids(find_new(PLAYLIST, states))[:2] == [vid('v', 0), vid('v', 6)]
+    assert vid('v', 2) in new_ids(find_new(PLAYLIST, states, retry_failed=True))
+
+
+def test_single_video_url(site):
+    found = find_new("https://www.youtube.com/watch?v=abcdefghijk", {})
+    assert new_ids(found) == ["abcdefghijk"]
+
+
+def test_index_states_feed_the_next_sync(site, tmp_path):
+    index = SyncIndex(str(tmp_path / "sync.sqlite"))
+    index.mark_done(vid('v', 0), PLAYLIST, "video 0", 'native', "/out/0.txt")
+    for _ in range(MAX_SYNC_ATTEMPTS):
+        index.mark_failed(vid('v', 2), PLAYLIST, "video 2", "boom")
+    index.mark_failed(vid('v', 4), PLAYLIST, "video 4", "boom")
+    # A later success clears the failure
+    index.mark_failed(vid('v', 6), PLAYLIST, "video 6", "boom")
+    index.mark_done(vid('v', 6), PLAYLIST, "video 6", 'gemini', "/out/6.txt")
+    states = index.states()
+    assert states[vid('v', 2)] == (FAILED, MAX_SYNC_ATTEMPTS)
+    assert states[vid('v', 6)] == (DONE, 2)
+
+    found = find_new(PLAYLIST, states)
+    assert new_ids(found)[:2] == [vid('v', 4), vid('v', 8)]
+    assert len(found['new']) == 50 - 3
+    index.record_sync(PLAYLIST, found['entries'], len(found['new']), 0)
+    assert [(s['url'], s['entries'], s['new']) for s in index.sources()] == [(PLAYLIST, 50, 47)]
+    index.close()
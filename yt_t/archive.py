@@ -0,0 +1,451 @@
+import io
+import os
+import json
+import mmap
+import time
+import zlib
+import struct
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows：只在进程内加锁
+    fcntl = None
+
+# 分片文件超过该大小后写入新的分片
+SHARD_MAX_BYTES = 256 * 1024 * 1024
+
+SHARD_PREFIX = "shard-"
+SHARD_SUFFIX = ".ytz"
+INDEX_NAME = "index.bin"
+LOCK_NAME = "lock"
+
+# 记录头：magic、视频ID（右侧补 0）、压缩数据长度、压缩数据的 CRC32；之后是 zlib 压缩的 JSON
+RECORD_MAGIC = b'YTR1'
+RECORD_HEADER = struct.Struct('<4s16sII')
+
+# 索引文件头：magic、按视频ID排序的条目数；之后是定长条目，排序的条目在前，之后追加的条目在后
+INDEX_MAGIC = b'YTAIDX01'
+INDEX_HEADER = struct.Struct('<8sQ')
+
+# 索引条目：视频ID、分片号、记录在分片中的偏移、记录长度（包括记录头）
+INDEX_ENTRY = struct.Struct('<16sIQI')
+KEY_BYTES = 16
+
+# 追加的（未排序的）索引条目超过该数时合并进排序部分
+TAIL_MAX = 4096
+
+# 顺序扫描分片时的读缓冲区大小
+SCAN_BUFFER = 8 * 1024 * 1024
+
+# 压缩级别：字幕文本压缩率高，较低的级别已足够，写入更快
+COMPRESS_LEVEL = 6
+
+
+def _key(video_id: str) -> bytes:
+    key = video_id.encode('ascii')
+    if len(key) > KEY_BYTES:
+        raise ValueError(f"视频ID过长: {video_id}")
+    return key.ljust(KEY_BYTES, b'\0')
+
+
+def _shard_name(number: int) -> str:
+    return f"{SHARD_PREFIX}{number:05d}{SHARD_SUFFIX}"
+
+
+def encode_record(video_id: str, metadata: Dict) -> bytes:
+    """把字幕和元数据编码为一条记录（记录头 + 压缩的 JSON）"""
+    payload = zlib.compress(json.dumps(metadata, ensure_ascii=False).encode('utf-8'), COMPRESS_LEVEL)
+    return RECORD_HEADER.pack(RECORD_MAGIC, _key(video_id), len(payload), zlib.crc32(payload)) + payload
+
+
+def decode_record(data: bytes) -> Dict:
+    """解码一条完整的记录，数据损坏时抛出 ValueError"""
+    magic, _, length, crc = RECORD_HEADER.unpack_from(data)
+    payload = data[RECORD_HEADER.size:RECORD_HEADER.size + length]
+    if magic != RECORD_MAGIC or len(payload) != length or zlib.crc32(payload) != crc:
+        raise ValueError("归档记录已损坏")
+    return json.loads(zlib.decompress(payload))
+
+
+class TranscriptArchive:
+    """压缩、分片、只追加的字幕归档
+
+    归档是一个目录：字幕逐条追加到分片文件（shard-NNNNN.ytz），每条记录单独压缩，
+    包含字幕文本和元数据（地址、标题、格式、来源、生成时间）；分片达到 SHARD_MAX_BYTES 后换新分片。
+    index.bin 是定长条目的索引（视频ID -> 分片、偏移、长度），读取时内存映射：
+    排序部分二分查找，新追加的条目在文件末尾从后往前查找，超过 TAIL_MAX 条时合并排序。
+    同一视频再次写入时追加新记录，索引指向最新的记录，旧记录在 compact() 时清除。
+
+    读取单个字幕只需一次 pread；iter_records() 顺序读取分片，跳过已被覆盖的记录。
+    写入在进程内和进程间（fcntl 文件锁）都是互斥的，读取不加锁。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._index_path = os.path.join(path, INDEX_NAME)
+        self._lock = threading.RLock()
+        self._read_fds: Dict[int, int] = {}
+        self._index_map: Optional[mmap.mmap] = None
+        self._index_stat: Optional[Tuple[int, int]] = None
+        self._tail: Dict[bytes, Tuple[int, int, int]] = {}
+        self._tail_count = 0
+
+        os.makedirs(path, exist_ok=True)
+        self._lock_file = open(os.path.join(path, LOCK_NAME), 'a+b')
+        with self._write_lock():
+            if not os.path.exists(self._index_path):
+                self._rebuild_index()
+
+    # 锁和文件
+
+    @contextmanager
+    def _write_lock(self):
+        with self._lock:
+            if fcntl:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def shard_numbers(self) -> List[int]:
+        """现有分片的编号，从小到大"""
+        numbers = []
+        for name in os.listdir(self.path):
+            if name.startswith(SHARD_PREFIX) and name.endswith(SHARD_SUFFIX):
+                try:
+                    numbers.append(int(name[len(SHARD_PREFIX):-len(SHARD_SUFFIX)]))
+                except ValueError:
+                    continue
+        return sorted(numbers)
+
+    def _shard_path(self, number: int) -> str:
+        return os.path.join(self.path, _shard_name(number))
+
+    def _read_fd(self, shard: int) -> int:
+        fd = self._read_fds.get(shard)
+        if fd is None:
+            fd = self._read_fds[shard] = os.open(self._shard_path(shard), os.O_RDONLY)
+        return fd
+
+    def _close_read_fds(self):
+        for fd in self._read_fds.values():
+            os.close(fd)
+        self._read_fds.clear()
+
+    # 索引
+
+    def _index(self) -> memoryview:
+        """内存映射的索引文件；文件被追加或替换后重新映射
+
+        索引被替换（可能是其他实例的 compact()）时同时关闭缓存的分片文件，
+        不继续占用已删除的旧分片。
+        """
+        st = os.stat(self._index_path)
+        if self._index_stat != (st.st_ino, st.st_size):
+            if self._index_stat is None or self._index_stat[0] != st.st_ino:
+                self._tail, self._tail_count = {}, 0
+                self._close_read_fds()
+            if self._index_map is not None:
+                self._index_map.close()
+            with open(self._index_path, 'rb') as f:
+                self._index_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._index_stat = (st.st_ino, st.st_size)
+        return memoryview(self._index_map)
+
+    @staticmethod
+    def _counts(view: memoryview) -> Tuple[int, int]:
+        """(排序的条目数, 条目总数)；末尾不完整的条目（写入中断）忽略"""
+        magic, sorted_count = INDEX_HEADER.unpack_from(view)
+        if magic != INDEX_MAGIC:
+            raise ValueError("归档索引已损坏")
+        return sorted_count, (len(view) - INDEX_HEADER.size) // INDEX_ENTRY.size
+
+    def _lookup(self, video_id: str) -> Optional[Tuple[int, int, int]]:
+        """查找视频的记录位置 (分片, 偏移, 长度)"""
+        key = _key(video_id)
+        with self._lock:
+            view = self._index()
+            try:
+                sorted_count, count = self._counts(view)
+                # 追加的条目较新：只解析上次之后新追加的条目，保存在字典中
+                for i in range(max(sorted_count, self._tail_count), count):
+                    entry = INDEX_ENTRY.unpack_from(view, INDEX_HEADER.size + i * INDEX_ENTRY.size)
+                    self._tail[entry[0]] = entry[1:]
+                self._tail_count = count
+                if key in self._tail:
+                    return self._tail[key]
+
+                lo, hi = 0, sorted_count
+                while lo < hi:
+                    mid = (lo + hi) // 2
+                    offset = INDEX_HEADER.size + mid * INDEX_ENTRY.size
+                    if bytes(view[offset:offset + KEY_BYTES]) < key:
+                        lo = mid + 1
+                    else:
+                        hi = mid
+                offset = INDEX_HEADER.size + lo * INDEX_ENTRY.size
+                if lo < sorted_count and view[offset:offset + KEY_BYTES] == key:
+                    return INDEX_ENTRY.unpack_from(view, offset)[1:]
+                return None
+            finally:
+                view.release()
+
+    def _entries(self) -> Dict[bytes, Tuple[int, int, int]]:
+        """所有视频最新记录的位置"""
+        with self._lock:
+            view = self._index()
+            try:
+                _, count = self._counts(view)
+                entries = {}
+                for i in range(count):
+                    key, shard, offset, length = INDEX_ENTRY.unpack_from(
+                        view, INDEX_HEADER.size + i * INDEX_ENTRY.size)
+                    entries[key] = (shard, offset, length)
+                return entries
+            finally:
+                view.release()
+
+    def _write_index(self, entries: Dict[bytes, Tuple[int, int, int]]):
+        """按视频ID排序写入完整的索引（先写临时文件再重命名）"""
+        tmp_path = self._index_path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, len(entries)))
+            for key in sorted(entries):
+                f.write(INDEX_ENTRY.pack(key, *entries[key]))
+        os.replace(tmp_path, self._index_path)
+
+    def _rebuild_index(self):
+        """扫描所有分片重建索引（索引文件丢失时）"""
+        entries = {}
+        for shard in self.shard_numbers():
+            for key, offset, length in self._scan_shard(shard):
+                entries[key] = (shard, offset, length)
+        if entries:
+            print(f"已从分片重建归档索引: {len(entries)} 条")
+        self._write_index(entries)
+
+    # 写入
+
+    def put(self, video_id: str, text: str, url: str = '', title: Optional[str] = None,
+            fmt: str = 'txt', source: Optional[str] = None,
+            generated_at: Optional[float] = None) -> str:
+        """追加一条字幕，返回其位置（归档目录#视频ID）"""
+        metadata = {
+            'video_id': video_id,
+            'url': url,
+            'title': title,
+            'format': fmt,
+            'source': source,
+            'generated_at': generated_at if generated_at is not None else time.time(),
+            'text': text,
+        }
+        record = encode_record(video_id, metadata)
+
+        with self._write_lock():
+            numbers = self.shard_numbers()
+            shard = numbers[-1] if numbers else 0
+            shard_path = self._shard_path(shard)
+            size = os.path.getsize(shard_path) if numbers else 0
+            if size and size + len(record) > SHARD_MAX_BYTES:
+                shard, size = shard + 1, 0
+                shard_path = self._shard_path(shard)
+            with open(shard_path, 'ab') as f:
+                f.write(record)
+            # 记录写完后才写索引条目：中断时最多留下没有索引的记录，compact() 时清除
+            with open(self._index_path, 'r+b') as f:
+                _, sorted_count = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+                end = os.fstat(f.fileno()).st_size
+                # 丢弃写入中断留下的不完整条目，保持条目对齐
+                end -= (end - INDEX_HEADER.size) % INDEX_ENTRY.size
+                f.seek(end)
+                f.truncate()
+                f.write(INDEX_ENTRY.pack(_key(video_id), shard, size, len(record)))
+                count = (f.tell() - INDEX_HEADER.size) // INDEX_ENTRY.size
+            if count - sorted_count > TAIL_MAX:
+                self._write_index(self._entries())
+        return self.locator(video_id)
+
+    def locator(self, video_id: str) -> str:
+        return f"{os.path.abspath(self.path)}#{video_id}"
+
+    # 读取
+
+    def get(self, video_id: str) -> Optional[Dict]:
+        """读取视频的字幕和元数据，不存在时返回 None"""
+        for attempt in range(2):
+            location = self._lookup(video_id)
+            if location is None:
+                return None
+            shard, offset, length = location
+            try:
+                with self._lock:
+                    data = os.pread(self._read_fd(shard), length, offset)
+                return decode_record(data)
+            except FileNotFoundError:
+                # 查找之后分片被其他实例的 compact() 删除：索引已经替换，重新查找一次
+                if attempt:
+                    raise
+
+    def __contains__(self, video_id: str) -> bool:
+        return self._lookup(video_id) is not None
+
+    def _scan_shard(self, shard: int) -> Iterator[Tuple[bytes, int, int]]:
+        """按记录头依次遍历分片中的记录（重建索引时使用）
+
+        Yields:
+            (视频ID键, 偏移, 记录长度)；遇到损坏或不完整的记录时停止
+        """
+        offset = 0
+        with io.open(self._shard_path(shard), 'rb', buffering=SCAN_BUFFER) as f:
+            file_size = os.fstat(f.fileno()).st_size
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    return
+                magic, key, size, _ = RECORD_HEADER.unpack(header)
+                length = RECORD_HEADER.size + size
+                if magic != RECORD_MAGIC or offset + length > file_size:
+                    print(f"归档分片 {_shard_name(shard)} 在偏移 {offset} 处损坏，跳过之后的记录")
+                    return
+                f.seek(size, os.SEEK_CUR)
+                yield key, offset, length
+                offset += length
+
+    def _read_live(self) -> Iterator[Tuple[bytes, bytes]]:
+        """按分片和偏移顺序读取所有有效记录
+
+        每个分片只打开一次，用大缓冲区顺序读取，跳过被覆盖的记录。
+
+        Yields:
+            (视频ID键, 记录数据)
+        """
+        by_shard: Dict[int, List[Tuple[int, int, bytes]]] = {}
+        for key, (shard, offset, length) in self._entries().items():
+            by_shard.setdefault(shard, []).append((offset, length, key))
+        for shard in sorted(by_shard):
+            with io.open(self._shard_path(shard), 'rb', buffering=SCAN_BUFFER) as f:
+                for offset, length, key in sorted(by_shard[shard]):
+                    if f.tell() != offset:
+                        f.seek(offset)
+                    yield key, f.read(length)
+
+    def iter_records(self) -> Iterator[Dict]:
+        """遍历所有视频的最新字幕，按写入顺序（顺序读取分片，只解压有效的记录）"""
+        for _, data in self._read_live():
+            yield decode_record(data)
+
+    def stats(self) -> Dict:
+        """归档的记录数、分片数和大小"""
+        entries = self._entries()
+        numbers = self.shard_numbers()
+        return {
+            'records': len(entries),
+            'shards': len(numbers),
+            'bytes': sum(os.path.getsize(self._shard_path(n)) for n in numbers),
+            'live_bytes': sum(length for _, _, length in entries.values()),
+        }
+
+    # 整理
+
+    def compact(self) -> Dict:
+        """把有效记录复制到新的分片并重写索引，清除被覆盖的旧记录和没有索引的记录
+
+        记录按原样复制，不重新压缩。新分片和新索引写完后才删除旧分片，中途中断时旧索引仍然有效。
+
+        Returns:
+            stats() 的结果，另加整理前的大小 bytes_before
+        """
+        with self._write_lock():
+            old = self.shard_numbers()
+            before = sum(os.path.getsize(self._shard_path(n)) for n in old)
+            shard = (old[-1] + 1) if old else 0
+            new_entries = {}
+            out = open(self._shard_path(shard), 'wb')
+            size = 0
+            try:
+                for key, data in self._read_live():
+                    if size and size + len(data) > SHARD_MAX_BYTES:
+                        out.close()
+                        shard, size = shard + 1, 0
+                        out = open(self._shard_path(shard), 'wb')
+                    out.write(data)
+                    new_entries[key] = (shard, size, len(data))
+                    size += len(data)
+            finally:
+                out.close()
+            self._write_index(new_entries)
+            with self._lock:
+                self._close_read_fds()
+            for number in old:
+                os.remove(self._shard_path(number))
+        return dict(self.stats(), bytes_before=before)
+
+    def close(self):
+        with self._lock:
+            self._close_read_fds()
+            if self._index_map is not None:
+                self._index_map.close()
+                self._index_map = None
+                self._index_stat = None
+        self._lock_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ArchiveWriter:
+    """写入归档的字幕输出，与 utils.TranscriptWriter 接口相同
+
+    内容先保存在内存中，commit() 时作为一条记录追加到归档；abort() 丢弃内容。
+    """
+
+    def __init__(self, archive: TranscriptArchive, video_id: str, url: str,
+                 title: Optional[str] = None, fmt: str = 'txt', source: Optional[str] = None):
+        self.archive = archive
+        self.video_id = video_id
+        self.url = url
+        self.title = title
+        self.fmt = fmt
+        self.source = source
+        self.path = archive.locator(video_id)
+        self.body_offset = 0
+        self._buffer = io.StringIO()
+
+    @property
+    def temp_path(self) -> Optional[str]:
+        return None
+
+    def write(self, text: str):
+        self._buffer.write(text)
+
+    def tell(self) -> int:
+        return self._buffer.tell()
+
+    def rewind(self, offset: int):
+        self._buffer.seek(offset)
+        self._buffer.truncate()
+
+    def commit(self) -> str:
+        return self.archive.put(self.video_id, self._buffer.getvalue(), url=self.url,
+                                title=self.title, fmt=self.fmt, source=self.source)
+
+    def abort(self) -> Optional[str]:
+        self._buffer = io.StringIO()
+        return None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
@@ -1,11 +1,64 @@
 import os
+import copy
 import tempfile
 import shutil
 import subprocess
 import json
-from typing import List, Optional
-import yt_dlp
+import time
+import threading
+from typing import Iterator, List, Optional
 import math
+from . import metrics
+
+# 音频编码配置：ffmpeg 编码参数、分段文件扩展名、segment muxer 格式、上传时的 MIME 类型，
+# 以及 download_audio 转码时 yt-dlp 使用的编码名
+# 语音识别只需要单声道 16kHz，speech-* 配置的文件大小约为 128k 立体声 mp3 的 1/5 到 1/8
+# speech-* 配置加 bitexact：Ogg muxer 默认使用随机的流序列号，不加时同一音频每次编码的字节都不同，
+# 上传登记表按 sha256 查找已上传文件会失效
+BITEXACT_ARGS = ['-fflags', '+bitexact', '-flags:a', '+bitexact']
+
+AUDIO_PROFILES = {
+    'speech-opus': {
+        'codec_args': ['-ac', '1', '-ar', '16000', '-c:a', 'libopus', '-b:a', '16k',
+                       '-application', 'voip', '-compression_level', '5'] + BITEXACT_ARGS,
+        'ext': 'ogg',
+        'format': 'ogg',
+        'mime_type': 'audio/ogg',
+        'download_codec': 'opus',
+    },
+    'speech-aac': {
+        'codec_args': ['-ac', '1', '-ar', '16000', '-c:a', 'aac', '-b:a', '32k'] + BITEXACT_ARGS,
+        'ext': 'aac',
+        'format': 'adts',
+        'mime_type': 'audio/aac',
+        'download_codec': 'aac',
+    },
+    'mp3': {
+        'codec_args': ['-c:a', 'libmp3lame', '-b:a', '128k'],
+        'ext': 'mp3',
+        'format': 'mp3',
+        'mime_type': 'audio/mpeg',
+        'download_codec': 'mp3',
+    },
+}
+
+DEFAULT_AUDIO_PROFILE = 'speech-opus'
+
+# 按扩展名确定上传时的 MIME 类型
+AUDIO_MIME_TYPES = {
+    '.mp3': 'audio/mpeg',
+    '.ogg': 'audio/ogg',
+    '.opus': 'audio/ogg',
+    '.aac': 'audio/aac',
+    '.m4a': 'audio/mp4',
+    '.wav': 'audio/wav',
+    '.flac': 'audio/flac',
+}
+
+
+def audio_mime_type(audio_path: str) -> str:
+    """根据文件扩展名返回音频的 MIME 类型，未知扩展名按 mp3 处理"""
+    return AUDIO_MIME_TYPES.get(os.path.splitext(audio_path)[1].lower(), 'audio/mpeg')
 
 
 def check_ffmpeg():
@@ -21,15 +74,22 @@ def check_ffmpeg():
         return False
 
 
-def download_audio(youtube_url: str, output_dir: str = None) -> Optional[str]:
+def download_audio(youtube_url: str, output_dir: str = None, transcode: bool = True,
+                   info: Optional[dict] = None,
+                   profile: str = DEFAULT_AUDIO_PROFILE,
+                   cancel: Optional[threading.Event] = None) -> Optional[str]:
     """下载YouTube视频的音频
     
     Args:
         youtube_url: YouTube视频URL
         output_dir: 输出目录，默认使用临时目录
+        transcode: 是否按 profile 转码；为False时保留原始音频流，交给 prepare_audio_segments 一次性处理
+        info: get_video_info 返回的 yt-dlp 信息字典，提供时直接下载，不再重新解析视频页面
+        profile: 转码使用的编码配置（AUDIO_PROFILES 的键）
+        cancel: 设置后在下一个数据块中止下载（提前开始的下载不再需要时）
     
     Returns:
-        下载的音频文件路径，失败返回None
+        下载的音频文件路径，失败或取消时返回None
     """
     if not check_ffmpeg():
         return None
@@ -37,38 +97,59 @@ def download_audio(youtube_url: str, output_dir: str = None) -> Optional[str]:
     if output_dir is None:
         output_dir = tempfile.mkdtemp(prefix="yt_audio_")
     
+    import yt_dlp
+    
     # 配置yt-dlp只下载音频
     ydl_opts = {
         'format': 'bestaudio/best',
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'mp3',
-            'preferredquality': '192',
-        }],
         'outtmpl': os.path.join(output_dir, '%(title)s.%(ext)s'),
         'quiet': True,
         'no_warnings': True,
     }
+    if transcode:
+        settings = AUDIO_PROFILES[profile]
+        ydl_opts['postprocessors'] = [{
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': settings['download_codec'],
+        }]
+        ydl_opts['postprocessor_args'] = {'extractaudio': settings['codec_args']}
+    if cancel is not None:
+        def check_cancel(progress):
+            if cancel.is_set():
+                raise yt_dlp.utils.DownloadCancelled("下载已取消")
+        ydl_opts['progress_hooks'] = [check_cancel]
     
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        with metrics.span('download', transcode=transcode) as span, yt_dlp.YoutubeDL(ydl_opts) as ydl:
             print("正在下载音频...")
-            info = ydl.extract_info(youtube_url, download=True)
+            if info is not None:
+                # yt-dlp 会修改传入的字典，复制一份以免影响调用方
+                info = ydl.process_ie_result(copy.deepcopy(info), download=True)
+            else:
+                info = ydl.extract_info(youtube_url, download=True)
             
-            # 获取下载后的文件路径
+            # 获取下载后的文件路径（转码后为转码后的文件）
             filename = ydl.prepare_filename(info)
-            # 替换扩展名为mp3
-            audio_path = os.path.splitext(filename)[0] + '.mp3'
+            if transcode:
+                filename = os.path.splitext(filename)[0] + '.' + AUDIO_PROFILES[profile]['download_codec']
+            downloads = info.get('requested_downloads') or []
+            audio_path = downloads[0].get('filepath', filename) if downloads else filename
             
             if os.path.exists(audio_path):
+                if span.active:
+                    span.set(bytes_out=os.path.getsize(audio_path), audio_seconds=info.get('duration') or 0)
                 print(f"音频已下载到: {audio_path}")
                 return audio_path
             else:
+                span.set(status='error')
                 print("音频下载失败")
                 return None
                 
     except Exception as e:
-        print(f"下载音频失败: {str(e)}")
+        if cancel is not None and cancel.is_set():
+            print("音频下载已取消")
+        else:
+            print(f"下载音频失败: {str(e)}")
         return None
 
 
@@ -155,9 +236,11 @@ def split_audio(audio_path: str, segment_minutes: int = 50) -> List[str]:
         segment_path = f"{base_name}_part{i+1}.mp3"
         
         # 构建ffmpeg命令
+        # -ss 放在 -i 之前，直接定位到开始位置，避免每段都从头读取输入
         cmd = [
-            'ffmpeg', '-i', audio_path,
+            'ffmpeg',
             '-ss', str(start_seconds),  # 开始时间
+            '-i', audio_path,
             '-t', str(segment_seconds),  # 持续时间
             '-c', 'copy',  # 直接复制，不重新编码
             '-y',  # 覆盖输出文件
@@ -181,6 +264,235 @@ def split_audio(audio_path: str, segment_minutes: int = 50) -> List[str]:
     return segments
 
 
+def _segment_command(input_path: str, speed: float, segment_minutes: int, segment_pattern: str,
+                     segment_list: str, input_args: Optional[List[str]] = None,
+                     keep: Optional[str] = None,
+                     profile: str = DEFAULT_AUDIO_PROFILE,
+                     filter_script: Optional[str] = None) -> List[str]:
+    """构建一次完成解码、裁剪静音、加速、编码和分段的ffmpeg命令
+    
+    keep 为 aselect 表达式，只保留表达式为真的音频（见 silence.RemapTable）；
+    长录音的表达式可能超过单个命令行参数的长度限制，提供 filter_script 时把滤镜写入该文件，
+    通过 -filter_script:a 传给 ffmpeg。profile 为编码配置（AUDIO_PROFILES 的键）。
+    """
+    settings = AUDIO_PROFILES[profile]
+    cmd = ['ffmpeg'] + (input_args or []) + ['-i', input_path, '-vn']
+    filters = []
+    if keep:
+        # 丢弃静音后重新生成连续的时间戳
+        filters += [f"aselect='{keep}'", 'asetpts=N/SR/TB']
+    if speed != 1:
+        # 使用ffmpeg加速音频，保持音调
+        filters.append(f'atempo={speed}')
+    if filters and keep and filter_script:
+        with open(filter_script, 'w', encoding='utf-8') as f:
+            f.write(','.join(filters))
+        cmd += ['-filter_script:a', filter_script]
+    elif filters:
+        cmd += ['-filter:a', ','.join(filters)]
+    cmd += settings['codec_args'] + [
+        '-f', 'segment',
+        '-segment_time', str(segment_minutes * 60),
+        '-segment_format', settings['format'],
+        '-segment_list', segment_list,
+        '-segment_list_type', 'flat',
+        '-reset_timestamps', '1',
+        '-y',  # 覆盖输出文件
+        segment_pattern
+    ]
+    return cmd
+
+
+def _segment_paths(base_name: str, speed: float, profile: str = DEFAULT_AUDIO_PROFILE):
+    """返回 segment muxer 的文件名模板和分段列表文件路径"""
+    # 文件名中的 % 会被 segment muxer 当作模板占位符，需要转义
+    ext = AUDIO_PROFILES[profile]['ext']
+    segment_pattern = f"{base_name.replace('%', '%%')}_speed{speed}x_part%03d.{ext}"
+    segment_list = f"{base_name}_segments.txt"
+    return segment_pattern, segment_list
+
+
+def prepare_audio_segments(audio_path: str, speed: float = 2.0, segment_minutes: int = 50,
+                           output_dir: str = None, keep: Optional[str] = None,
+                           profile: str = DEFAULT_AUDIO_PROFILE) -> List[str]:
+    """一次性完成音频加速和分段
+    
+    用一个ffmpeg进程完成解码、atempo加速、编码和分段（segment muxer），
+    原始音频只解码一次、加速后的音频只编码一次，不产生中间文件。
+    
+    Args:
+        audio_path: 下载的原始音频文件路径（任意ffmpeg可解码的格式）
+        speed: 加速倍数，默认2倍速；为1时不加速
+        segment_minutes: 每段时长（分钟，按加速后的时长计算）
+        output_dir: 输出目录，默认与原始音频相同
+        keep: 只保留这些区域的 aselect 表达式（裁剪静音），在加速之前应用
+        profile: 分段的编码配置（AUDIO_PROFILES 的键）
+    
+    Returns:
+        按顺序排列的分段文件路径列表；加速后不超过一段时长时只有一个文件
+    """
+    if output_dir is None:
+        output_dir = os.path.dirname(audio_path) or '.'
+    
+    base_name = os.path.join(output_dir, os.path.splitext(os.path.basename(audio_path))[0])
+    segment_pattern, segment_list = _segment_paths(base_name, speed, profile)
+    filter_script = f"{base_name}_filter.txt"
+    cmd = _segment_command(audio_path, speed, segment_minutes, segment_pattern, segment_list,
+                           keep=keep, profile=profile, filter_script=filter_script)
+    
+    print(f"正在处理音频（{speed}x 加速，每段 {segment_minutes} 分钟，编码: {profile}）...")
+    with metrics.span('segment_audio', profile=profile, speed=speed) as span:
+        if span.active:
+            span.set(bytes_in=os.path.getsize(audio_path))
+        try:
+            subprocess.run(cmd, capture_output=True, check=True)
+        except subprocess.CalledProcessError as e:
+            print(f"音频处理失败: {e.stderr.decode()}")
+            raise
+        finally:
+            if os.path.exists(filter_script):
+                os.remove(filter_script)
+        
+        segments = _read_segment_list(segment_list, output_dir)
+        os.remove(segment_list)
+        if span.active:
+            span.set(segments=len(segments), bytes_out=sum(os.path.getsize(p) for p in segments))
+    
+    for i, segment_path in enumerate(segments):
+        print(f"  第 {i+1} 段已保存: {segment_path}")
+    
+    return segments
+
+
+def _read_segment_list(segment_list: str, output_dir: str) -> List[str]:
+    """读取 segment muxer 写出的分段列表，只返回已完整写入的行"""
+    if not os.path.exists(segment_list):
+        return []
+    with open(segment_list, 'r', encoding='utf-8') as f:
+        content = f.read()
+    lines = content.split('\n')[:-1]  # 最后一项是未写完（或为空）的行
+    return [os.path.join(output_dir, line.strip()) for line in lines if line.strip()]
+
+
+def iter_audio_segments(input_path: str, speed: float = 2.0, segment_minutes: int = 50,
+                        output_dir: str = None, input_args: Optional[List[str]] = None,
+                        poll_interval: float = 1.0,
+                        profile: str = DEFAULT_AUDIO_PROFILE) -> Iterator[str]:
+    """边读取边加速分段，每完成一段立即返回
+    
+    与 prepare_audio_segments 使用同一条ffmpeg处理链，但不等待整个输入处理完：
+    segment muxer 每写完一段就会追加到分段列表，这里轮询列表并依次返回新完成的分段，
+    调用方可以在后续分段仍在下载/编码时开始上传和转录。
+    
+    Args:
+        input_path: 输入文件路径或URL
+        speed: 加速倍数
+        segment_minutes: 每段时长（分钟，按加速后的时长计算）
+        output_dir: 输出目录，默认使用临时目录
+        input_args: 放在 -i 之前的额外ffmpeg参数（如HTTP请求头）
+        poll_interval: 轮询分段列表的间隔（秒）
+        profile: 分段的编码配置（AUDIO_PROFILES 的键）
+    
+    Yields:
+        按顺序完成的分段文件路径
+    """
+    if output_dir is None:
+        output_dir = tempfile.mkdtemp(prefix="yt_audio_")
+    
+    segment_pattern, segment_list = _segment_paths(os.path.join(output_dir, 'audio'), speed, profile)
+    cmd = _segment_command(input_path, speed, segment_minutes, segment_pattern, segment_list,
+                           input_args=['-loglevel', 'error'] + (input_args or []), profile=profile)
+    
+    print(f"正在边下载边处理音频（{speed}x 加速，每段 {segment_minutes} 分钟，编码: {profile}）...")
+    with metrics.span('stream_segments', profile=profile, speed=speed) as span, \
+            tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                   stderr=stderr)
+        emitted = 0
+        try:
+            while True:
+                finished = process.poll() is not None
+                segments = _read_segment_list(segment_list, output_dir)
+                for segment_path in segments[emitted:]:
+                    emitted += 1
+                    if span.active:
+                        span.set(segments=emitted)
+                        span.add('bytes_out', os.path.getsize(segment_path))
+                    print(f"  第 {emitted} 段已就绪: {segment_path}")
+                    yield segment_path
+                if finished:
+                    break
+                time.sleep(poll_interval)
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+        
+        if process.returncode != 0:
+            stderr.seek(0)
+            message = stderr.read().decode(errors='replace')
+            print(f"音频处理失败: {message}")
+            raise subprocess.CalledProcessError(process.returncode, cmd, stderr=message)
+    
+    if os.path.exists(segment_list):
+        os.remove(segment_list)
+
+
+def resolve_audio_stream(youtube_url: str, info: Optional[dict] = None) -> Optional[dict]:
+    """解析YouTube视频最佳音频流的直链和请求头（不下载）
+    
+    提供 get_video_info 返回的 info 时直接使用其中已选好的音频格式。
+    """
+    if info is not None and info.get('url'):
+        return {'url': info['url'], 'http_headers': info.get('http_headers') or {}}
+    
+    import yt_dlp
+    
+    ydl_opts = {
+        'format': 'bestaudio/best',
+        'quiet': True,
+        'no_warnings': True,
+    }
+    try:
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(youtube_url, download=False)
+    except Exception as e:
+        print(f"解析音频流失败: {str(e)}")
+        return None
+    
+    if not info.get('url'):
+        print("未找到可用的音频流")
+        return None
+    return {'url': info['url'], 'http_headers': info.get('http_headers') or {}}
+
+
+def stream_audio_segments(youtube_url: str, speed: float = 2.0, segment_minutes: int = 50,
+                          output_dir: str = None, info: Optional[dict] = None,
+                          profile: str = DEFAULT_AUDIO_PROFILE) -> Iterator[str]:
+    """边下载边加速分段YouTube视频音频
+    
+    ffmpeg直接读取音频流，下载、解码、加速、编码和分段同时进行，
+    每完成一段立即返回，第一段无需等待整个音频下载完成。
+    
+    Yields:
+        按顺序完成的分段文件路径
+    """
+    if not check_ffmpeg():
+        raise RuntimeError("未安装 ffmpeg")
+    
+    stream = resolve_audio_stream(youtube_url, info)
+    if not stream:
+        raise RuntimeError("无法获取音频流")
+    
+    headers = ''.join(f"{key}: {value}\r\n" for key, value in stream['http_headers'].items())
+    input_args = ['-reconnect', '1', '-reconnect_streamed', '1', '-reconnect_delay_max', '5']
+    if headers:
+        input_args += ['-headers', headers]
+    
+    yield from iter_audio_segments(stream['url'], speed, segment_minutes, output_dir,
+                                   input_args=input_args, profile=profile)
+
+
 def format_time_seconds(seconds: float) -> str:
     """将秒数格式化为时间字符串"""
     hours = int(seconds // 3600)
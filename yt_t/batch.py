@@ -0,0 +1,237 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Iterable, List, Optional, Tuple
+from . import metrics
+from .youtube import extract_video_id
+from .cache import TranscriptCache
+from .archive import TranscriptArchive
+from .audio_utils import DEFAULT_AUDIO_PROFILE
+from .pipeline import (
+    get_cached_transcript, fetch_native_transcript, stream_gemini_transcript, resolve_video_info,
+    open_writer, write_transcript
+)
+
+
+# 保护进行中任务的结果字典：工作线程更新字段的同时，yt-t serve 的请求线程会读取
+_result_lock = threading.Lock()
+
+
+def update_result(result: Dict, drop: Iterable[str] = (), **changes):
+    """更新结果字典的字段，drop 中的字段删除"""
+    with _result_lock:
+        result.update(changes)
+        for key in drop:
+            result.pop(key, None)
+
+
+def snapshot(result: Dict) -> Dict:
+    """结果字典的副本，可以在任务进行中安全地遍历"""
+    with _result_lock:
+        return dict(result)
+
+
+def read_urls(lines: Iterable[str]) -> List[str]:
+    """从文件或标准输入读取 URL 列表
+
+    忽略空行和以 # 开头的注释行；指向同一视频的 URL（如 youtu.be/ID 和 watch?v=ID）只保留第一次出现，
+    避免同一视频被两个线程同时处理。
+    """
+    urls = []
+    seen = set()
+    for line in lines:
+        url = line.strip()
+        if not url or url.startswith('#'):
+            continue
+        key = extract_video_id(url) or url
+        if key in seen:
+            continue
+        seen.add(key)
+        urls.append(url)
+    return urls
+
+
+class BatchRunner:
+    """批量转录
+
+    原生字幕查询和 Gemini 转录使用两个独立的线程池，分别限制并发数：
+    原生字幕查询很轻，可以开得较大；Gemini 调用耗时长、受配额限制，单独控制。
+    没有原生字幕的 URL 会从字幕线程池转交给 Gemini 线程池。
+
+    run() 处理一批 URL 后关闭线程池；常驻进程（yt-t serve）使用 submit() 逐个提交，
+    结束时调用 shutdown()。process() 不经过线程池，在调用线程中依次完成两个阶段（yt-t worker）。
+    """
+
+    def __init__(self, output_dir: Optional[str] = None, caption_workers: int = 8,
+                 gemini_workers: int = 2, segment_workers: int = 4, streaming: bool = False,
+                 resume: bool = False, language: str = 'zh-CN', output_format: Optional[str] = None,
+                 remove_silence: bool = False, audio_profile: str = DEFAULT_AUDIO_PROFILE,
+                 cache: Optional[TranscriptCache] = None, read_cache: bool = True,
+                 archive: Optional[TranscriptArchive] = None):
+        self.output_dir = output_dir
+        self.archive = archive
+        self.segment_workers = segment_workers
+        self.streaming = streaming
+        self.resume = resume
+        self.language = language
+        self.output_format = output_format
+        self.remove_silence = remove_silence
+        self.audio_profile = audio_profile
+        self.cache = cache
+        self.read_cache = read_cache
+        self.caption_pool = ThreadPoolExecutor(max_workers=caption_workers,
+                                               thread_name_prefix='yt-t-caption')
+        self.gemini_pool = ThreadPoolExecutor(max_workers=gemini_workers,
+                                              thread_name_prefix='yt-t-gemini')
+        self._lock = threading.Lock()
+        self._done = 0
+        self._total = 0
+
+    def run(self, urls: List[str]) -> List[Dict]:
+        """处理所有 URL，按输入顺序返回每个 URL 的处理结果"""
+        try:
+            futures = [self.submit(url)[1] for url in urls]
+            return [future.result() for future in futures]
+        finally:
+            self.shutdown()
+
+    def submit(self, url: str) -> Tuple[Dict, Future]:
+        """提交一个 URL
+
+        Returns:
+            (结果字典, Future)；结果字典在处理过程中原地更新（stage、partial_path 等），
+            其他线程读取时使用 snapshot()；Future 在处理结束时得到同一个字典
+        """
+        result = self._new_result(url)
+        done = Future()
+
+        def chain(future: Future):
+            try:
+                value = future.result()
+            except BaseException as e:
+                done.set_exception(e)
+                return
+            # 需要 Gemini 的任务返回的是 Gemini 线程池中的 Future
+            if isinstance(value, Future):
+                value.add_done_callback(chain)
+            else:
+                done.set_result(value)
+
+        with self._lock:
+            self._total += 1
+        self.caption_pool.submit(self._caption_stage, result).add_done_callback(chain)
+        return result, done
+
+    def process(self, url: str) -> Dict:
+        """在调用线程中处理一个 URL，返回结果字典"""
+        with self._lock:
+            self._total += 1
+        return self._caption_stage(self._new_result(url), inline=True)
+
+    @staticmethod
+    def _new_result(url: str) -> Dict:
+        return {
+            'url': url,
+            'video_id': None,
+            'status': 'failed',
+            'stage': 'queued',
+            'source': None,
+            'path': None,
+            'error': None,
+            'elapsed': 0.0,
+        }
+
+    def shutdown(self, cancel_pending: bool = False):
+        """等待进行中的任务结束并关闭线程池；cancel_pending 时取消尚未开始的任务"""
+        self.caption_pool.shutdown(wait=True, cancel_futures=cancel_pending)
+        self.gemini_pool.shutdown(wait=True, cancel_futures=cancel_pending)
+
+    def _caption_stage(self, result: Dict, inline: bool = False):
+        started = time.monotonic()
+        url = result['url']
+        update_result(result, stage='captions')
+        try:
+            video_id = extract_video_id(url)
+            if not video_id:
+                update_result(result, error='无法从URL中提取视频ID')
+                return self._finish(result, started)
+            update_result(result, video_id=video_id)
+
+            source, transcript = get_cached_transcript(
+                self.cache if self.read_cache else None, video_id, self.language
+            )
+            if not transcript:
+                source = 'native'
+                transcript = fetch_native_transcript(video_id, self.language, self.cache)
+            if not transcript:
+                if inline:
+                    return self._gemini_stage(result, started)
+                return self.gemini_pool.submit(self._gemini_stage, result, started)
+
+            path = write_transcript(transcript, video_id, url, output_dir=self.output_dir,
+                                    output_format=self.output_format, source=source,
+                                    archive=self.archive)
+            update_result(result, source=source, path=path, status='ok')
+        except Exception as e:
+            update_result(result, error=str(e))
+        return self._finish(result, started)
+
+    def _gemini_stage(self, result: Dict, started: float) -> Dict:
+        update_result(result, source='gemini', stage='gemini')
+        try:
+            if not os.environ.get("GEMINI_API_KEY"):
+                update_result(result, error='未设置 GEMINI_API_KEY 环境变量')
+                return self._finish(result, started)
+
+            video_info = resolve_video_info(result['url'])
+            writer = open_writer(result['video_id'], result['url'], output_dir=self.output_dir,
+                                 video_info=video_info, output_format=self.output_format,
+                                 archive=self.archive)
+            # 正在写入的临时文件，供 yt-t serve 返回部分字幕
+            update_result(result, partial_path=writer.temp_path)
+            filepath = stream_gemini_transcript(result['url'], result['video_id'], self.language,
+                                                writer, self.cache,
+                                                output_format=self.output_format,
+                                                segment_workers=self.segment_workers,
+                                                streaming=self.streaming, resume=self.resume,
+                                                remove_silence=self.remove_silence,
+                                                audio_profile=self.audio_profile,
+                                                video_info=video_info)
+            if not filepath:
+                update_result(result, error='无法获取视频字幕')
+                return self._finish(result, started)
+
+            update_result(result, path=filepath, status='ok')
+        except Exception as e:
+            update_result(result, error=str(e))
+        return self._finish(result, started)
+
+    def _finish(self, result: Dict, started: float) -> Dict:
+        update_result(result, drop=('partial_path',), elapsed=round(time.monotonic() - started, 3),
+                      stage='done')
+        metrics.record('job', result['elapsed'], 'ok' if result['status'] == 'ok' else 'error',
+                       url=result['url'], video_id=result['video_id'], source=result['source'])
+        with self._lock:
+            self._done += 1
+            mark = '成功' if result['status'] == 'ok' else '失败'
+            print(f"[{self._done}/{self._total}] {mark}: {result['url']}")
+        return result
+
+
+def summarize(results: List[Dict]) -> str:
+    """生成批量处理结果摘要"""
+    succeeded = [r for r in results if r['status'] == 'ok']
+    failed = [r for r in results if r['status'] != 'ok']
+    native = sum(1 for r in succeeded if r['source'] == 'native')
+
+    lines = [
+        "=" * 50,
+        f"共 {len(results)} 个 URL，成功 {len(succeeded)} 个"
+        f"（原生字幕 {native} 个，Gemini {len(succeeded) - native} 个），失败 {len(failed)} 个",
+    ]
+    for r in succeeded:
+        lines.append(f"  成功 [{r['source']}] {r['url']} -> {r['path']}")
+    for r in failed:
+        lines.append(f"  失败 {r['url']}: {r['error']}")
+    return "\n".join(lines)
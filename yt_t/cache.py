@@ -0,0 +1,172 @@
+import os
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from typing import Optional
+
+# 字幕来源
+SOURCE_NATIVE = 'native'
+SOURCE_GEMINI = 'gemini'
+
+# 不同来源的缓存有效期（秒）：原生字幕可能被作者更新，Gemini 结果只随提示词/模型变化
+DEFAULT_TTLS = {
+    SOURCE_NATIVE: 7 * 24 * 3600,
+    SOURCE_GEMINI: 90 * 24 * 3600,
+}
+
+# 缓存总大小上限（压缩后字节数），超出时按最近访问时间淘汰
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# 命中缓存时，距上次记录的访问时间超过该值（秒）才更新访问时间，避免每次读取都写数据库
+ACCESS_UPDATE_INTERVAL = 3600
+
+
+def get_cache_dir() -> str:
+    """获取缓存目录，可通过 YT_T_CACHE_DIR 环境变量覆盖"""
+    cache_dir = os.environ.get("YT_T_CACHE_DIR")
+    if not cache_dir:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        cache_dir = os.path.join(base, "yt-t")
+    return cache_dir
+
+
+class TranscriptCache:
+    """基于 SQLite 的本地字幕缓存
+
+    以 (视频ID, 语言, 来源, 版本) 为键保存字幕，内容使用 zlib 压缩。
+    读取时检查有效期，写入后按最近访问时间（LRU）淘汰，使总大小不超过上限。
+    总大小由触发器在同一事务中累计到 cache_meta 表，写入时不需要扫描整个表。
+    """
+
+    def __init__(self, path: Optional[str] = None, max_bytes: Optional[int] = None,
+                 ttls: Optional[dict] = None):
+        if path is None:
+            path = os.path.join(get_cache_dir(), "transcripts.sqlite")
+        if max_bytes is None:
+            max_mb = os.environ.get("YT_T_CACHE_MAX_MB")
+            max_bytes = int(float(max_mb) * 1024 * 1024) if max_mb else DEFAULT_MAX_BYTES
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """BEGIN IMMEDIATE;
+            CREATE TABLE IF NOT EXISTS transcripts (
+                key TEXT PRIMARY KEY,
+                video_id TEXT NOT NULL,
+                language TEXT NOT NULL,
+                source TEXT NOT NULL,
+                version TEXT NOT NULL,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_transcripts_accessed ON transcripts (accessed_at);
+            CREATE TABLE IF NOT EXISTS cache_meta (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO cache_meta (name, value)
+                SELECT 'total_bytes', COALESCE(SUM(size), 0) FROM transcripts;
+            CREATE TRIGGER IF NOT EXISTS transcripts_size_insert AFTER INSERT ON transcripts BEGIN
+                UPDATE cache_meta SET value = value + NEW.size WHERE name = 'total_bytes';
+            END;
+            CREATE TRIGGER IF NOT EXISTS transcripts_size_delete AFTER DELETE ON transcripts BEGIN
+                UPDATE cache_meta SET value = value - OLD.size WHERE name = 'total_bytes';
+            END;
+            CREATE TRIGGER IF NOT EXISTS transcripts_size_update AFTER UPDATE OF size ON transcripts BEGIN
+                UPDATE cache_meta SET value = value + NEW.size - OLD.size WHERE name = 'total_bytes';
+            END;
+            COMMIT;"""
+        )
+
+    @staticmethod
+    def make_key(video_id: str, language: str, source: str, version: str) -> str:
+        """生成缓存键"""
+        raw = "\x1f".join([video_id, language or '', source, version])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, video_id: str, language: str, source: str, version: str) -> Optional[str]:
+        """读取缓存，不存在或已过期时返回 None"""
+        key = self.make_key(video_id, language, source, version)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, created_at, accessed_at FROM transcripts WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            data, created_at, accessed_at = row
+            ttl = self.ttls.get(source)
+            if ttl is not None and now - created_at > ttl:
+                self._conn.execute("DELETE FROM transcripts WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+
+            # LRU 只需要粗略的访问时间：最近记录过时不再写入
+            if now - accessed_at >= ACCESS_UPDATE_INTERVAL:
+                self._conn.execute("UPDATE transcripts SET accessed_at = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+
+        return zlib.decompress(data).decode('utf-8')
+
+    def put(self, video_id: str, language: str, source: str, version: str, transcript: str):
+        """写入缓存，并在超过大小上限时淘汰最久未访问的条目"""
+        key = self.make_key(video_id, language, source, version)
+        data = zlib.compress(transcript.encode('utf-8'))
+        now = time.time()
+        with self._lock:
+            # 使用 UPSERT 而不是 INSERT OR REPLACE：REPLACE 删除旧行时不触发删除触发器
+            self._conn.execute(
+                """INSERT INTO transcripts
+                   (key, video_id, language, source, version, data, size, created_at, accessed_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (key) DO UPDATE SET data = excluded.data, size = excluded.size,
+                       created_at = excluded.created_at, accessed_at = excluded.accessed_at""",
+                (key, video_id, language or '', source, version, data, len(data), now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def total_bytes(self) -> int:
+        """缓存中字幕的总大小（压缩后字节数）"""
+        with self._lock:
+            return self._total_bytes()
+
+    def _total_bytes(self) -> int:
+        return self._conn.execute("SELECT value FROM cache_meta WHERE name = 'total_bytes'").fetchone()[0]
+
+    def _evict(self):
+        total = self._total_bytes()
+        if total <= self.max_bytes:
+            return
+
+        # 按访问时间顺序读取，只读到足够淘汰的条目为止
+        expired = []
+        cursor = self._conn.execute("SELECT key, size FROM transcripts ORDER BY accessed_at")
+        for key, size in cursor:
+            if total <= self.max_bytes:
+                break
+            expired.append((key,))
+            total -= size
+        cursor.close()
+        self._conn.executemany("DELETE FROM transcripts WHERE key = ?", expired)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute("DELETE FROM transcripts")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -2,64 +2,666 @@
 import click
 import sys
 import os
+import json
+import contextlib
 from dotenv import load_dotenv
-from .youtube import extract_video_id, get_native_subtitles
-from .gemini import transcribe_with_gemini
-from .utils import save_transcript
+from . import metrics
+from .youtube import extract_video_id
+from .silence import check_numpy
+from .audio_utils import AUDIO_PROFILES, DEFAULT_AUDIO_PROFILE
+from .cues import FORMATS
+from .archive import TranscriptArchive
+from .pipeline import (
+    get_cached_transcript, fetch_native_transcript, stream_gemini_transcript, open_cache,
+    open_writer, resolve_video_info, write_transcript
+)
 
 # 加载 .env 文件
 load_dotenv()
 
 
-@click.command()
+class DefaultCommandGroup(click.Group):
+    """支持默认子命令的命令组
+
+    跳过命令组自身的选项后，第一个参数不是已知子命令时，交给默认子命令处理，
+    保持 `yt-t URL` 和 `yt-t --metrics m.jsonl URL` 的用法不变。
+    """
+
+    def __init__(self, *args, default_command: str = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.default_command = default_command
+
+    def parse_args(self, ctx, args):
+        args = list(args)
+        takes_value = {opt for p in self.params if isinstance(p, click.Option) and not p.is_flag
+                       for opt in p.opts}
+        group_options = {opt for p in self.params for opt in p.opts}
+        i = 0
+        while i < len(args) and args[i].split('=', 1)[0] in group_options:
+            i += 2 if args[i] in takes_value else 1
+        if i < len(args) and args[i] not in self.commands and args[i] not in ('--help', '-h'):
+            args.insert(i, self.default_command)
+        return super().parse_args(ctx, args)
+
+
+@click.group(cls=DefaultCommandGroup, default_command='transcribe')
+@click.option('--metrics', 'metrics_path', envvar='YT_T_METRICS', metavar='PATH',
+              help='记录各阶段的耗时和数据量（.prom 为 Prometheus textfile，否则为 JSON lines；'
+                   '也可通过 YT_T_METRICS 环境变量设置）')
+def main(metrics_path: str = None):
+    """YouTube Transcription CLI - 从YouTube视频提取字幕
+
+    直接传入 URL 时等同于 `yt-t transcribe URL`。
+    """
+    if metrics_path:
+        metrics.configure(metrics_path)
+
+
+@main.command()
 @click.argument('url')
-@click.option('--output', '-o', help='输出文件路径')
+@click.option('--output', '-o', help='输出文件路径（- 表示输出到标准输出）')
 @click.option('--output-dir', '-d', help='输出目录（默认: transcripts）')
 @click.option('--language', '-l', default='zh-CN', help='字幕语言代码（默认: zh-CN）')
-def main(url: str, output: str = None, output_dir: str = None, language: str = 'zh-CN'):
-    """YouTube Transcription CLI - 从YouTube视频提取字幕"""
-    
+@click.option('--format', '-f', 'output_format', type=click.Choice(FORMATS),
+              help='输出格式（默认: 原生字幕为 txt，Gemini 转录为 srt）')
+@click.option('--segment-workers', default=4, show_default=True, help='长视频分段同时转录的数量')
+@click.option('--streaming', is_flag=True, help='长视频边下载边分段，每完成一段立即上传转录')
+@click.option('--resume', is_flag=True, help='继续之前中断的长视频任务，只处理未完成的部分')
+@click.option('--remove-silence', is_flag=True, help='长视频上传前裁掉较长的静音（需要 numpy）')
+@click.option('--audio-profile', type=click.Choice(list(AUDIO_PROFILES)), default=DEFAULT_AUDIO_PROFILE,
+              show_default=True, help='长视频分段上传时的音频编码')
+@click.option('--no-cache', is_flag=True, help='不读取也不写入本地字幕缓存')
+@click.option('--refresh-cache', is_flag=True, help='忽略已有缓存，重新获取并更新缓存')
+@click.option('--speculative', is_flag=True,
+              help='查询原生字幕的同时获取视频信息、下载长视频的音频，获取到原生字幕时取消')
+def transcribe(url: str, output: str = None, output_dir: str = None, language: str = 'zh-CN',
+               output_format: str = None, segment_workers: int = 4, streaming: bool = False,
+               resume: bool = False, remove_silence: bool = False,
+               audio_profile: str = DEFAULT_AUDIO_PROFILE, no_cache: bool = False,
+               refresh_cache: bool = False, speculative: bool = False):
+    """从单个YouTube视频提取字幕（默认命令）"""
+
+    if remove_silence and not check_numpy():
+        sys.exit(1)
+
+    with metrics.span('job', url=url):
+        if output == '-':
+            # 字幕写到标准输出，进度信息改为输出到标准错误
+            stdout = sys.stdout
+            with contextlib.redirect_stdout(sys.stderr):
+                _transcribe(url, output, output_dir, language, output_format, segment_workers,
+                            streaming, resume, remove_silence, audio_profile, no_cache,
+                            refresh_cache, speculative, stream=stdout)
+        else:
+            _transcribe(url, output, output_dir, language, output_format, segment_workers,
+                        streaming, resume, remove_silence, audio_profile, no_cache, refresh_cache,
+                        speculative)
+
+
+def _transcribe(url: str, output: str, output_dir: str, language: str, output_format: str,
+                segment_workers: int, streaming: bool, resume: bool, remove_silence: bool,
+                audio_profile: str, no_cache: bool, refresh_cache: bool, speculative: bool = False,
+                stream=None):
     print(f"正在处理视频: {url}")
-    
+
     video_id = extract_video_id(url)
     if not video_id:
         click.echo("错误: 无法从URL中提取视频ID", err=True)
         sys.exit(1)
-    
+
     print(f"视频ID: {video_id}")
-    
-    print("尝试获取原生字幕...")
-    transcript = get_native_subtitles(video_id)
-    
+
+    # 视频信息（标题、时长、yt-dlp 信息字典）只在需要时获取一次，并在各阶段之间共享
+    video_info = None
+
+    cache, read_cache = open_cache(no_cache, refresh_cache)
+    source, transcript = get_cached_transcript(cache if read_cache else None, video_id, language)
+
+    speculation = None
     if transcript:
-        print("成功获取原生字幕！")
+        print(f"使用缓存的字幕（来源: {source}）")
     else:
+        if speculative and os.environ.get("GEMINI_API_KEY"):
+            from .speculative import Speculation
+            speculation = Speculation(url, video_id, streaming=streaming, resume=resume,
+                                      remove_silence=remove_silence, audio_profile=audio_profile,
+                                      segment_workers=segment_workers).start()
+        print("尝试获取原生字幕...")
+        source = 'native'
+        transcript = fetch_native_transcript(video_id, language, cache)
+        if transcript:
+            print("成功获取原生字幕！")
+            if speculation:
+                speculation.cancel()
+
+    if not transcript:
         print("未找到原生字幕，尝试使用 Gemini API...")
-        
+
         if not os.environ.get("GEMINI_API_KEY"):
             click.echo("错误: 未设置 GEMINI_API_KEY 环境变量", err=True)
             click.echo("请设置环境变量: export GEMINI_API_KEY='your-api-key'", err=True)
             sys.exit(1)
-        
-        transcript = transcribe_with_gemini(url)
-        
-        if not transcript:
+
+        if speculation:
+            video_info, prefetched = speculation.result()
+            # 音频已提前下载到任务目录，以续传方式打开任务
+            resume = resume or prefetched
+        else:
+            video_info = resolve_video_info(url)
+        # 边生成边写入输出文件，不在内存中拼接完整字幕
+        writer = open_writer(video_id, url, output, output_dir, video_info, stream, output_format)
+        filepath = stream_gemini_transcript(url, video_id, language, writer, cache,
+                                            output_format=output_format,
+                                            segment_workers=segment_workers, streaming=streaming,
+                                            video_info=video_info, resume=resume,
+                                            remove_silence=remove_silence,
+                                            audio_profile=audio_profile)
+
+        if not filepath:
             click.echo("错误: 无法获取视频字幕", err=True)
             sys.exit(1)
-    
-    if output:
-        # 如果指定了具体输出文件路径，直接使用
-        filepath = output
-        os.makedirs(os.path.dirname(filepath), exist_ok=True) if os.path.dirname(filepath) else None
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(transcript)
     else:
-        # 使用默认保存逻辑，支持自定义输出目录
-        filepath = save_transcript(transcript, video_id, url, output_dir)
-    
+        filepath = write_transcript(transcript, video_id, url, output, output_dir,
+                                    video_info=video_info, stream=stream,
+                                    output_format=output_format, source=source)
+        if speculation:
+            # 等待已取消的提前下载结束，删除下载的文件
+            speculation.close()
+
+    if filepath == '-':
+        return
     print(f"\n字幕已保存到: {filepath}")
     print(f"文件大小: {os.path.getsize(filepath) / 1024:.1f} KB")
 
 
+@main.command()
+@click.argument('target')
+@click.option('--output', '-o', help='输出文件路径')
+@click.option('--output-dir', '-d', help='输出目录（默认: transcripts）')
+@click.option('--format', '-f', 'output_format', type=click.Choice(FORMATS),
+              help='输出格式（默认: srt）')
+@click.option('--segment-workers', default=4, show_default=True, help='长视频分段同时转录的数量')
+@click.pass_context
+def resume(ctx, target: str, output: str = None, output_dir: str = None,
+           output_format: str = None, segment_workers: int = 4):
+    """继续中断的长视频任务，只重新转录缺失的分段（TARGET 为视频URL或视频ID）"""
+    from .jobs import list_jobs
+
+    video_id = extract_video_id(target) or target
+    job = next((j for j in list_jobs() if j['video_id'] == video_id), None)
+    if not job:
+        click.echo(f"错误: 没有找到视频 {video_id} 的未完成任务", err=True)
+        sys.exit(1)
+
+    ctx.invoke(transcribe, url=job['url'], output=output, output_dir=output_dir,
+               output_format=output_format, segment_workers=segment_workers, resume=True,
+               remove_silence=job['params'].get('remove_silence', False),
+               audio_profile=job['params'].get('audio_profile', DEFAULT_AUDIO_PROFILE),
+               refresh_cache=True)
+
+
+@main.command()
+def jobs():
+    """列出未完成的长视频任务"""
+    from .jobs import list_jobs, SEGMENT_TRANSCRIBED
+
+    unfinished = list_jobs()
+    if not unfinished:
+        print("没有未完成的任务")
+        return
+
+    for job in unfinished:
+        segments = job['segments']
+        done = sum(1 for s in segments if s['status'] == SEGMENT_TRANSCRIBED)
+        stages = ', '.join(job['stages']) or '无'
+        print(f"{job['video_id']}  已完成阶段: {stages}  已转录分段: {done}/{len(segments)}  {job['url']}")
+
+
+archive_option = click.option('--archive', 'archive_path', metavar='DIR',
+                              help='字幕写入该目录下的压缩归档，而不是每个视频一个文件（见 yt-t archive）')
+
+
+@main.command()
+@click.argument('source', type=click.File('r', encoding='utf-8'), default='-')
+@click.option('--output-dir', '-d', help='输出目录（默认: transcripts）')
+@click.option('--caption-workers', default=8, show_default=True, help='原生字幕查询并发数')
+@click.option('--gemini-workers', default=2, show_default=True, help='Gemini 转录并发数')
+@click.option('--segment-workers', default=4, show_default=True, help='长视频分段同时转录的数量')
+@click.option('--streaming', is_flag=True, help='长视频边下载边分段，每完成一段立即上传转录')
+@click.option('--resume', is_flag=True, help='继续之前中断的长视频任务，只处理未完成的部分')
+@click.option('--remove-silence', is_flag=True, help='长视频上传前裁掉较长的静音（需要 numpy）')
+@click.option('--audio-profile', type=click.Choice(list(AUDIO_PROFILES)), default=DEFAULT_AUDIO_PROFILE,
+              show_default=True, help='长视频分段上传时的音频编码')
+@click.option('--language', '-l', default='zh-CN', help='字幕语言代码（默认: zh-CN）')
+@click.option('--format', '-f', 'output_format', type=click.Choice(FORMATS),
+              help='输出格式（默认: 原生字幕为 txt，Gemini 转录为 srt）')
+@click.option('--no-cache', is_flag=True, help='不读取也不写入本地字幕缓存')
+@click.option('--refresh-cache', is_flag=True, help='忽略已有缓存，重新获取并更新缓存')
+@archive_option
+@click.option('--report', help='将每个 URL 的处理结果写入 JSON 文件')
+def batch(source, output_dir: str = None, caption_workers: int = 8, gemini_workers: int = 2,
+          segment_workers: int = 4, streaming: bool = False, resume: bool = False,
+          language: str = 'zh-CN', output_format: str = None, remove_silence: bool = False,
+          audio_profile: str = DEFAULT_AUDIO_PROFILE, no_cache: bool = False,
+          refresh_cache: bool = False, archive_path: str = None, report: str = None):
+    """批量提取字幕，SOURCE 为每行一个 URL 的文件（默认从标准输入读取）"""
+    from .batch import BatchRunner, read_urls, summarize
+
+    if remove_silence and not check_numpy():
+        sys.exit(1)
+
+    urls = read_urls(source)
+    if not urls:
+        click.echo("错误: 没有读取到任何 URL", err=True)
+        sys.exit(1)
+
+    print(f"共读取 {len(urls)} 个 URL")
+    cache, read_cache = open_cache(no_cache, refresh_cache)
+    archive = TranscriptArchive(archive_path) if archive_path else None
+    runner = BatchRunner(output_dir=output_dir, caption_workers=caption_workers,
+                         gemini_workers=gemini_workers, segment_workers=segment_workers,
+                         streaming=streaming, resume=resume, language=language,
+                         output_format=output_format, remove_silence=remove_silence,
+                         audio_profile=audio_profile, cache=cache, read_cache=read_cache,
+                         archive=archive)
+    try:
+        results = runner.run(urls)
+    finally:
+        if archive:
+            archive.close()
+
+    print(summarize(results))
+    if report:
+        with open(report, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"处理结果已保存到: {report}")
+
+    if any(r['status'] != 'ok' for r in results):
+        sys.exit(1)
+
+
+@main.command()
+@click.argument('urls', nargs=-1, required=True)
+@click.option('--index', 'index_path', envvar='YT_T_SYNC_INDEX', metavar='PATH',
+              help='已转录视频的索引文件（默认在缓存目录下，也可通过 YT_T_SYNC_INDEX 环境变量设置）')
+@click.option('--full', is_flag=True, help='频道也读取全部视频，不在连续遇到同步过的视频时停止翻页')
+@click.option('--retry-failed', is_flag=True, help='重新尝试已达到最大失败次数的视频')
+@click.option('--dry-run', is_flag=True, help='只列出需要处理的视频，不转录')
+@click.option('--output-dir', '-d', help='输出目录（默认: transcripts）')
+@click.option('--caption-workers', default=8, show_default=True, help='原生字幕查询并发数')
+@click.option('--gemini-workers', default=2, show_default=True, help='Gemini 转录并发数')
+@click.option('--segment-workers', default=4, show_default=True, help='长视频分段同时转录的数量')
+@click.option('--streaming', is_flag=True, help='长视频边下载边分段，每完成一段立即上传转录')
+@click.option('--remove-silence', is_flag=True, help='长视频上传前裁掉较长的静音（需要 numpy）')
+@click.option('--audio-profile', type=click.Choice(list(AUDIO_PROFILES)), default=DEFAULT_AUDIO_PROFILE,
+              show_default=True, help='长视频分段上传时的音频编码')
+@click.option('--language', '-l', default='zh-CN', help='字幕语言代码（默认: zh-CN）')
+@click.option('--format', '-f', 'output_format', type=click.Choice(FORMATS),
+              help='输出格式（默认: 原生字幕为 txt，Gemini 转录为 srt）')
+@click.option('--no-cache', is_flag=True, help='不读取也不写入本地字幕缓存')
+@click.option('--refresh-cache', is_flag=True, help='忽略已有缓存，重新获取并更新缓存')
+@archive_option
+@click.option('--report', help='将每个视频的处理结果写入 JSON 文件')
+def sync(urls, index_path: str = None, full: bool = False, retry_failed: bool = False,
+         dry_run: bool = False, output_dir: str = None, caption_workers: int = 8,
+         gemini_workers: int = 2, segment_workers: int = 4, streaming: bool = False,
+         remove_silence: bool = False, audio_profile: str = DEFAULT_AUDIO_PROFILE,
+         language: str = 'zh-CN', output_format: str = None, no_cache: bool = False,
+         refresh_cache: bool = False, archive_path: str = None, report: str = None):
+    """同步播放列表或频道，只转录之前没有成功转录的视频"""
+    from .batch import BatchRunner, summarize
+    from .sync import SyncIndex, sync_sources
+
+    if remove_silence and not check_numpy():
+        sys.exit(1)
+
+    index = SyncIndex(index_path)
+    cache, read_cache = open_cache(no_cache, refresh_cache)
+    archive = TranscriptArchive(archive_path) if archive_path else None
+    # 上次同步中断的长视频从保存的进度继续
+    runner = BatchRunner(output_dir=output_dir, caption_workers=caption_workers,
+                         gemini_workers=gemini_workers, segment_workers=segment_workers,
+                         streaming=streaming, resume=True, language=language,
+                         output_format=output_format, remove_silence=remove_silence,
+                         audio_profile=audio_profile, cache=cache, read_cache=read_cache,
+                         archive=archive)
+    try:
+        reports = sync_sources(list(urls), runner, index, full=full, retry_failed=retry_failed,
+                               dry_run=dry_run)
+    finally:
+        runner.shutdown()
+        index.close()
+        if archive:
+            archive.close()
+
+    if dry_run:
+        for entry in (entry for r in reports for entry in r['new']):
+            print(f"{entry['url']}  {entry['title']}")
+    results = [result for r in reports for result in r['results']]
+    if results:
+        print(summarize(results))
+    if report:
+        with open(report, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"处理结果已保存到: {report}")
+
+    if any(r['error'] for r in reports) or any(r['status'] != 'ok' for r in results):
+        sys.exit(1)
+
+
+search_index_option = click.option(
+    '--index', 'index_path', envvar='YT_T_SEARCH_INDEX', metavar='PATH',
+    help='搜索索引文件（默认在缓存目录下，也可通过 YT_T_SEARCH_INDEX 环境变量设置）'
+)
+
+
+@main.command('index')
+@click.argument('directory', default='transcripts')
+@search_index_option
+@click.option('--no-prune', is_flag=True, help='保留已删除文件的索引')
+def index_command(directory: str = 'transcripts', index_path: str = None, no_prune: bool = False):
+    """增量索引 DIRECTORY（默认 transcripts）中保存的字幕，供 search 使用"""
+    import time
+    from .search import SearchIndex
+
+    if not os.path.isdir(directory):
+        click.echo(f"错误: 目录不存在: {directory}", err=True)
+        sys.exit(1)
+
+    started = time.monotonic()
+    search_index = SearchIndex(index_path)
+    try:
+        with metrics.span('index', directory=directory) as span:
+            stats = search_index.update(directory, prune=not no_prune)
+            span.set(**stats)
+        total = search_index.stats()
+    finally:
+        search_index.close()
+    print(f"扫描 {stats['scanned']} 个文件：新增 {stats['added']}，更新 {stats['updated']}，"
+          f"未变化 {stats['unchanged']}，删除 {stats['removed']}，跳过 {stats['skipped']}，"
+          f"失败 {stats['failed']}"
+          f"（{time.monotonic() - started:.1f} 秒）")
+    print(f"索引中共 {total['files']} 个文件，{total['cues']} 条字幕")
+
+
+@main.command()
+@click.argument('query')
+@search_index_option
+@click.option('--video', 'video_id', help='只搜索该视频（视频ID或URL）')
+@click.option('--limit', '-n', default=20, show_default=True, help='最多返回的结果数')
+@click.option('--json', 'as_json', is_flag=True, help='以 JSON 输出结果')
+def search(query: str, index_path: str = None, video_id: str = None, limit: int = 20,
+           as_json: bool = False):
+    """在已索引的字幕中搜索短语，输出视频、时间和跳转链接"""
+    from .search import SearchIndex
+
+    if video_id:
+        video_id = extract_video_id(video_id) or video_id
+    search_index = SearchIndex(index_path)
+    try:
+        results = search_index.search(query, limit=limit, video_id=video_id)
+    finally:
+        search_index.close()
+
+    if as_json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+    if not results:
+        print("没有找到匹配的字幕（新保存的字幕需要先运行 yt-t index）")
+        sys.exit(1)
+    for r in results:
+        print(f"[{r['timestamp']}] {r['title'] or r['video_id'] or r['path']}")
+        print(f"    {r['text']}")
+        print(f"    {r['link'] or r['path']}")
+
+
+@main.group('archive')
+def archive_group():
+    """管理压缩字幕归档（batch / sync 的 --archive 输出）"""
+
+
+@archive_group.command('pack')
+@click.argument('archive_path', metavar='ARCHIVE')
+@click.argument('directory', default='transcripts')
+def archive_pack(archive_path: str, directory: str = 'transcripts'):
+    """把 DIRECTORY（默认 transcripts）中保存的字幕文件导入归档 ARCHIVE"""
+    from datetime import datetime
+    from .search import detect_format, iter_transcript_files, parse_header, parse_transcript_file
+
+    if not os.path.isdir(directory):
+        click.echo(f"错误: 目录不存在: {directory}", err=True)
+        sys.exit(1)
+
+    # 同一视频有多个文件时，按修改时间导入，最新的文件生效
+    entries = sorted(iter_transcript_files(directory), key=lambda e: e.stat().st_mtime)
+    packed = skipped = 0
+    with TranscriptArchive(archive_path) as archive:
+        for entry in entries:
+            try:
+                with open(entry.path, 'r', encoding='utf-8') as f:
+                    text = f.read()
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"读取失败: {entry.path}: {str(e)}")
+                skipped += 1
+                continue
+            fields, body = parse_header(text)
+            info = parse_transcript_file(entry.path, text) if not fields.get('video_id') else fields
+            if not info.get('video_id'):
+                print(f"跳过（没有视频ID）: {entry.path}")
+                skipped += 1
+                continue
+            try:
+                generated_at = datetime.strptime(fields['generated_at'], '%Y-%m-%d %H:%M:%S').timestamp()
+            except (KeyError, ValueError):
+                generated_at = entry.stat().st_mtime
+            # 默认保存的 Gemini 转录是内容为 SRT 的 .txt 文件，格式按内容判断
+            body = body.lstrip('\n')
+            archive.put(info['video_id'], body, url=info.get('url') or '', title=info.get('title'),
+                        fmt=detect_format(body, os.path.splitext(entry.name)[1].lstrip('.').lower()),
+                        generated_at=generated_at)
+            packed += 1
+        stats = archive.stats()
+    print(f"已导入 {packed} 个文件，跳过 {skipped} 个；归档中共 {stats['records']} 个视频，"
+          f"{stats['shards']} 个分片，{stats['bytes'] / 1024 / 1024:.1f} MB")
+
+
+@archive_group.command('get')
+@click.argument('archive_path', metavar='ARCHIVE')
+@click.argument('video')
+@click.option('--output', '-o', help='输出文件路径（默认输出到标准输出）')
+@click.option('--json', 'as_json', is_flag=True, help='输出包括元数据的 JSON')
+def archive_get(archive_path: str, video: str, output: str = None, as_json: bool = False):
+    """读取归档中某个视频（视频ID或URL）的字幕"""
+    video_id = extract_video_id(video) or video
+    with TranscriptArchive(archive_path) as archive:
+        record = archive.get(video_id)
+    if record is None:
+        click.echo(f"错误: 归档中没有视频 {video_id}", err=True)
+        sys.exit(1)
+
+    text = json.dumps(record, ensure_ascii=False, indent=2) + "\n" if as_json else record['text']
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+
+
+@archive_group.command('export')
+@click.argument('archive_path', metavar='ARCHIVE')
+def archive_export(archive_path: str):
+    """按写入顺序输出归档中所有视频的最新字幕（每行一个 JSON，包括元数据）"""
+    with TranscriptArchive(archive_path) as archive:
+        for record in archive.iter_records():
+            sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+@archive_group.command('compact')
+@click.argument('archive_path', metavar='ARCHIVE')
+def archive_compact(archive_path: str):
+    """整理归档：清除被覆盖的旧记录，重写分片和索引"""
+    with TranscriptArchive(archive_path) as archive:
+        stats = archive.compact()
+    print(f"归档中共 {stats['records']} 个视频，{stats['shards']} 个分片；"
+          f"大小 {stats['bytes_before'] / 1024 / 1024:.1f} MB -> {stats['bytes'] / 1024 / 1024:.1f} MB")
+
+
+@main.command()
+@click.option('--host', default='127.0.0.1', show_default=True, help='监听地址')
+@click.option('--port', default=8765, show_default=True, help='监听端口')
+@click.option('--output-dir', '-d', help='输出目录（默认: transcripts）')
+@click.option('--caption-workers', default=8, show_default=True, help='原生字幕查询并发数')
+@click.option('--gemini-workers', default=2, show_default=True, help='Gemini 转录并发数')
+@click.option('--segment-workers', default=4, show_default=True, help='长视频分段同时转录的数量')
+@click.option('--streaming', is_flag=True, help='长视频边下载边分段，每完成一段立即上传转录')
+@click.option('--resume', is_flag=True, help='继续之前中断的长视频任务，只处理未完成的部分')
+@click.option('--remove-silence', is_flag=True, help='长视频上传前裁掉较长的静音（需要 numpy）')
+@click.option('--audio-profile', type=click.Choice(list(AUDIO_PROFILES)), default=DEFAULT_AUDIO_PROFILE,
+              show_default=True, help='长视频分段上传时的音频编码')
+@click.option('--language', '-l', default='zh-CN', help='字幕语言代码（默认: zh-CN）')
+@click.option('--format', '-f', 'output_format', type=click.Choice(FORMATS),
+              help='输出格式（默认: 原生字幕为 txt，Gemini 转录为 srt）')
+@click.option('--no-cache', is_flag=True, help='不读取也不写入本地字幕缓存')
+@click.option('--refresh-cache', is_flag=True, help='忽略已有缓存，重新获取并更新缓存')
+def serve(host: str = '127.0.0.1', port: int = 8765, output_dir: str = None,
+          caption_workers: int = 8, gemini_workers: int = 2, segment_workers: int = 4,
+          streaming: bool = False, resume: bool = False, remove_silence: bool = False,
+          audio_profile: str = DEFAULT_AUDIO_PROFILE, language: str = 'zh-CN',
+          output_format: str = None, no_cache: bool = False, refresh_cache: bool = False):
+    """以常驻进程运行，通过本地 HTTP API 提交任务、查询状态和获取字幕"""
+    from .batch import BatchRunner
+    from .server import serve as run_server
+
+    if remove_silence and not check_numpy():
+        sys.exit(1)
+
+    cache, read_cache = open_cache(no_cache, refresh_cache)
+    runner = BatchRunner(output_dir=output_dir, caption_workers=caption_workers,
+                         gemini_workers=gemini_workers, segment_workers=segment_workers,
+                         streaming=streaming, resume=resume, language=language,
+                         output_format=output_format, remove_silence=remove_silence,
+                         audio_profile=audio_profile, cache=cache, read_cache=read_cache)
+    run_server(runner, host=host, port=port)
+
+
+queue_option = click.option('--queue', 'queue_path', envvar='YT_T_QUEUE', metavar='PATH',
+                            help='队列文件（默认在缓存目录下，也可通过 YT_T_QUEUE 环境变量设置）')
+
+
+@main.group()
+def queue():
+    """管理共享任务队列（SQLite 文件，可放在多台机器共享的存储上）"""
+
+
+@queue.command('add')
+@click.argument('source', type=click.File('r', encoding='utf-8'), default='-')
+@queue_option
+@click.option('--max-attempts', default=3, show_default=True, help='每个任务最多尝试的次数')
+@click.option('--force', is_flag=True, help='已完成的视频也重新加入队列')
+def queue_add(source, queue_path: str = None, max_attempts: int = 3, force: bool = False):
+    """添加任务，SOURCE 为每行一个 URL 的文件（默认从标准输入读取）"""
+    from .batch import read_urls
+    from .jobqueue import JobQueue
+
+    urls = read_urls(source)
+    added, skipped = JobQueue(queue_path).enqueue(urls, max_attempts=max_attempts, force=force)
+    print(f"已加入 {len(added)} 个任务，跳过 {len(skipped)} 个（无效 URL 或已在队列中）")
+
+
+@queue.command('status')
+@queue_option
+@click.option('--status', 'status', type=click.Choice(['pending', 'leased', 'done', 'dead']),
+              help='列出该状态的任务')
+@click.option('--limit', default=20, show_default=True, help='最多列出的任务数')
+@click.option('--events', 'job_id', type=int, help='显示指定任务的阶段记录')
+def queue_status(queue_path: str = None, status: str = None, limit: int = 20, job_id: int = None):
+    """显示队列中各状态的任务数，以及任务列表或阶段记录"""
+    import time
+    from .jobqueue import JobQueue
+
+    job_queue = JobQueue(queue_path)
+    if job_id is not None:
+        for event in job_queue.events(job_id):
+            ts = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(event['ts']))
+            detail = f"  {event['detail']}" if event['detail'] else ''
+            print(f"{ts}  {event['stage']:<18} {event['status']:<8} {event['worker'] or ''}{detail}")
+        return
+
+    counts = job_queue.counts()
+    print('  '.join(f"{name}: {count}" for name, count in counts.items()))
+    if status:
+        for job in job_queue.list(status, limit):
+            extra = job['error'] if status == 'dead' else job['stage']
+            print(f"#{job['id']:<6} {job['attempts']}/{job['max_attempts']}  {job['worker'] or '':<24} "
+                  f"{job['url']}  {extra or ''}")
+
+
+@queue.command('retry')
+@click.argument('job_ids', type=int, nargs=-1)
+@queue_option
+def queue_retry(job_ids, queue_path: str = None):
+    """把 dead 任务重新加入队列（未指定 JOB_IDS 时为全部 dead 任务）"""
+    from .jobqueue import JobQueue
+
+    count = JobQueue(queue_path).retry(job_ids or None)
+    print(f"已重新加入 {count} 个任务")
+
+
+@queue.command('purge')
+@queue_option
+@click.option('--dead', 'include_dead', is_flag=True, help='同时删除 dead 任务')
+def queue_purge(queue_path: str = None, include_dead: bool = False):
+    """删除已完成的任务记录"""
+    from .jobqueue import JobQueue, DONE, DEAD
+
+    count = JobQueue(queue_path).purge((DONE, DEAD) if include_dead else (DONE,))
+    print(f"已删除 {count} 个任务")
+
+
+@main.command()
+@queue_option
+@click.option('--concurrency', '-c', default=1, show_default=True, help='同时处理的任务数')
+@click.option('--lease', 'lease_seconds', default=300, show_default=True,
+              help='租约时长（秒），worker 失联超过该时间后任务重新排队')
+@click.option('--poll', 'poll_interval', default=5.0, show_default=True, help='队列为空时的检查间隔（秒）')
+@click.option('--exit-when-idle', is_flag=True, help='队列中没有可处理的任务时退出')
+@click.option('--max-jobs', type=int, help='处理完该数量的任务后退出')
+@click.option('--output-dir', '-d', help='输出目录（默认: transcripts）')
+@click.option('--segment-workers', default=4, show_default=True, help='长视频分段同时转录的数量')
+@click.option('--streaming', is_flag=True, help='长视频边下载边分段，每完成一段立即上传转录')
+@click.option('--remove-silence', is_flag=True, help='长视频上传前裁掉较长的静音（需要 numpy）')
+@click.option('--audio-profile', type=click.Choice(list(AUDIO_PROFILES)), default=DEFAULT_AUDIO_PROFILE,
+              show_default=True, help='长视频分段上传时的音频编码')
+@click.option('--language', '-l', default='zh-CN', help='字幕语言代码（默认: zh-CN）')
+@click.option('--format', '-f', 'output_format', type=click.Choice(FORMATS),
+              help='输出格式（默认: 原生字幕为 txt，Gemini 转录为 srt）')
+@click.option('--no-cache', is_flag=True, help='不读取也不写入本地字幕缓存')
+@click.option('--refresh-cache', is_flag=True, help='忽略已有缓存，重新获取并更新缓存')
+def worker(queue_path: str = None, concurrency: int = 1, lease_seconds: int = 300,
+           poll_interval: float = 5.0, exit_when_idle: bool = False, max_jobs: int = None,
+           output_dir: str = None, segment_workers: int = 4, streaming: bool = False,
+           remove_silence: bool = False, audio_profile: str = DEFAULT_AUDIO_PROFILE,
+           language: str = 'zh-CN', output_format: str = None, no_cache: bool = False,
+           refresh_cache: bool = False):
+    """从共享队列领取并处理任务（可在多台机器上同时运行）"""
+    from .batch import BatchRunner
+    from .jobqueue import JobQueue
+    from .worker import QueueWorker
+
+    if remove_silence and not check_numpy():
+        sys.exit(1)
+
+    cache, read_cache = open_cache(no_cache, refresh_cache)
+    # 重试的任务从上一次尝试保存的长视频进度继续
+    runner = BatchRunner(output_dir=output_dir, segment_workers=segment_workers,
+                         streaming=streaming, resume=True, language=language,
+                         output_format=output_format, remove_silence=remove_silence,
+                         audio_profile=audio_profile, cache=cache, read_cache=read_cache)
+    processed = QueueWorker(JobQueue(queue_path), runner, lease_seconds=lease_seconds,
+                            poll_interval=poll_interval).run(concurrency, exit_when_idle, max_jobs)
+    runner.shutdown()
+    print(f"worker 已退出，共处理 {processed} 个任务")
+
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
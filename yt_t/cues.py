@@ -0,0 +1,268 @@
+import io
+import json
+import re
+from array import array
+from typing import Iterable, Iterator, List, Optional, TextIO, Tuple
+
+# 输出格式
+FORMATS = ('txt', 'srt', 'vtt', 'json')
+
+# CueList 序列化（缓存）格式的版本，结构变化时需要修改，使旧缓存失效
+CUES_VERSION = 'cues-v1'
+
+# 时间行，如 00:00:07,037 --> 00:00:11,107；兼容省略小时、使用 . 分隔毫秒（WebVTT）的写法
+_TIMING_LINE = re.compile(
+    r'\s*(?:(\d+):)?(\d{1,2}):(\d{1,2})(?:[,.](\d{1,3}))?\s*-->\s*'
+    r'(?:(\d+):)?(\d{1,2}):(\d{1,2})(?:[,.](\d{1,3}))?'
+)
+
+
+def _seconds(hours: Optional[str], minutes: str, seconds: str, millis: Optional[str]) -> float:
+    total = int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds)
+    if millis:
+        total += int(millis.ljust(3, '0')) / 1000.0
+    return total
+
+
+class CueList:
+    """紧凑的字幕列表
+
+    开始、结束时间（秒）分别保存在两个 array('d') 中，文本保存在列表中，
+    平移、缩放和合并直接处理整列数组，不为每条字幕创建对象。
+    """
+
+    __slots__ = ('starts', 'ends', 'texts')
+
+    def __init__(self, starts: Iterable[float] = (), ends: Iterable[float] = (),
+                 texts: Iterable[str] = ()):
+        self.starts = array('d', starts)
+        self.ends = array('d', ends)
+        self.texts = list(texts)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __iter__(self) -> Iterator[Tuple[float, float, str]]:
+        return zip(self.starts, self.ends, self.texts)
+
+    def append(self, start: float, end: float, text: str):
+        self.starts.append(start)
+        self.ends.append(end)
+        self.texts.append(text)
+
+    def extend(self, other: 'CueList', offset: float = 0.0, scale: float = 1.0):
+        """追加另一个列表，其时间先乘以 scale 再加上 offset"""
+        if offset == 0.0 and scale == 1.0:
+            self.starts.extend(other.starts)
+            self.ends.extend(other.ends)
+        else:
+            self.starts.extend(s * scale + offset for s in other.starts)
+            self.ends.extend(e * scale + offset for e in other.ends)
+        self.texts.extend(other.texts)
+
+    def to_json(self) -> str:
+        """紧凑的 JSON 表示（用于缓存），与 from_json 对应"""
+        return json.dumps({'starts': self.starts.tolist(), 'ends': self.ends.tolist(),
+                           'texts': self.texts}, ensure_ascii=False, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, data: str) -> 'CueList':
+        obj = json.loads(data)
+        return cls(obj['starts'], obj['ends'], obj['texts'])
+
+
+class SrtParser:
+    """增量解析 SRT（也接受 WebVTT）文本
+
+    不依赖序号行和空行：每个时间行开始一条字幕，之后到空行或下一个时间行之前的内容为字幕文本，
+    其他内容（序号、WEBVTT 文件头、代码块标记等）忽略。feed() 返回已经完整的字幕，
+    因此可以直接处理流式返回的文本块。
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._start = None
+        self._end = 0.0
+        self._lines: List[str] = []
+        # 当前字幕的序号，以及时间行之前单独出现的序号行
+        self._index = 0
+        self._pending_index: Optional[int] = None
+
+    def feed(self, text: str) -> CueList:
+        cues = CueList()
+        self._buffer += text
+        lines = self._buffer.split('\n')
+        self._buffer = lines.pop()
+        for line in lines:
+            self._line(line, cues)
+        return cues
+
+    def close(self) -> CueList:
+        cues = CueList()
+        if self._buffer:
+            self._line(self._buffer, cues)
+            self._buffer = ""
+        self._flush(cues)
+        return cues
+
+    def _line(self, line: str, cues: CueList):
+        match = _TIMING_LINE.match(line)
+        if match:
+            # 缺少空行时，上一条字幕末尾的序号行属于下一条字幕；
+            # 只有等于下一个序号时才视为序号，否则是字幕文本（如 "2024"）
+            if self._lines and self._lines[-1].isdigit() and int(self._lines[-1]) == self._index + 1:
+                index = int(self._lines.pop())
+            elif self._pending_index is not None:
+                index = self._pending_index
+            else:
+                index = self._index + 1
+            self._flush(cues)
+            self._index = index
+            self._pending_index = None
+            g = match.groups()
+            self._start = _seconds(*g[0:4])
+            self._end = _seconds(*g[4:8])
+            return
+
+        line = line.strip()
+        if line.startswith('```'):
+            # 模型输出的代码块标记，紧跟在最后一条字幕之后时也不属于字幕文本
+            self._flush(cues)
+            return
+        if self._start is None:
+            if line.isdigit():
+                self._pending_index = int(line)
+            return
+        if line:
+            self._lines.append(line)
+        else:
+            self._flush(cues)
+
+    def _flush(self, cues: CueList):
+        if self._start is not None and self._lines:
+            cues.append(self._start, self._end, "\n".join(self._lines))
+        self._start = None
+        self._lines = []
+
+
+def parse_srt(text: str) -> CueList:
+    """解析完整的 SRT（或 WebVTT）文本"""
+    parser = SrtParser()
+    cues = parser.feed(text)
+    cues.extend(parser.close())
+    return cues
+
+
+def from_native_entries(entries: Iterable) -> CueList:
+    """从 youtube-transcript-api 返回的字幕条目（对象或字典）创建字幕列表"""
+    cues = CueList()
+    for entry in entries:
+        if isinstance(entry, dict):
+            start, duration, text = entry['start'], entry.get('duration', 0.0), entry['text']
+        else:
+            start, duration, text = entry.start, entry.duration, entry.text
+        cues.append(start, start + (duration or 0.0), text.replace('\n', ' '))
+    return cues
+
+
+def merge_segments(segments: List[CueList], segment_seconds: float, speed: float = 1.0) -> CueList:
+    """把加速、分段转录的字幕合并到原始视频的时间轴上
+
+    每个分段的时间从 0 开始且处于加速后的时间轴上：先乘以 speed 还原为原始时间，
+    再加上该分段在原始视频中的起点（i * segment_seconds * speed）。
+
+    Args:
+        segments: 按顺序排列的各分段字幕
+        segment_seconds: 每个分段（加速后）的时长
+        speed: 加速倍数
+    """
+    merged = CueList()
+    for i, cues in enumerate(segments):
+        merged.extend(cues, offset=i * segment_seconds * speed, scale=speed)
+    return merged
+
+
+def format_timestamp(seconds: float, separator: str = ',') -> str:
+    """格式化为 hh:mm:ss,mmm（WebVTT 使用 . 分隔毫秒）"""
+    millis = int(round(max(seconds, 0.0) * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{millis:03d}"
+
+
+class CueWriter:
+    """按指定格式把字幕写入文件对象，可以分多次写入（如长视频逐段写出）
+
+    txt 为 `[mm:ss] 文本` 的逐行格式，srt / vtt 为标准字幕文件，
+    json 为 [{"start", "end", "text"}, ...] 数组，时间单位为秒。
+    """
+
+    def __init__(self, out: TextIO, fmt: str = 'srt'):
+        if fmt not in FORMATS:
+            raise ValueError(f"不支持的字幕格式: {fmt}")
+        self.out = out
+        self.fmt = fmt
+        self.count = 0
+        self._opened = False
+
+    def write(self, cues: CueList):
+        parts = []
+        if not self._opened:
+            parts.append(self._header())
+            self._opened = True
+
+        fmt = self.fmt
+        for start, end, text in cues:
+            self.count += 1
+            if fmt == 'txt':
+                seconds = int(start)
+                line = text.replace('\n', ' ')
+                piece = f"[{seconds // 60:02d}:{seconds % 60:02d}] {line}"
+            elif fmt == 'srt':
+                piece = f"{self.count}\n{format_timestamp(start)} --> {format_timestamp(end)}\n{text}"
+            elif fmt == 'vtt':
+                piece = f"{format_timestamp(start, '.')} --> {format_timestamp(end, '.')}\n{text}"
+            else:
+                piece = json.dumps({'start': round(start, 3), 'end': round(end, 3), 'text': text},
+                                   ensure_ascii=False)
+            if self.count > 1:
+                parts.append(self._separator())
+            parts.append(piece)
+
+        if parts:
+            self.out.write("".join(parts))
+
+    def close(self):
+        """写出文件尾（不关闭文件对象）"""
+        tail = "" if self._opened else self._header()
+        self._opened = True
+        if self.fmt == 'json':
+            tail += "\n]\n" if self.count else "]\n"
+        elif self.fmt in ('srt', 'vtt') and self.count:
+            tail += "\n"
+        if tail:
+            self.out.write(tail)
+
+    def _header(self) -> str:
+        if self.fmt == 'vtt':
+            return "WEBVTT\n\n"
+        if self.fmt == 'json':
+            return "[\n"
+        return ""
+
+    def _separator(self) -> str:
+        if self.fmt == 'txt':
+            return "\n"
+        if self.fmt == 'json':
+            return ",\n"
+        return "\n\n"
+
+
+def serialize(cues: CueList, fmt: str = 'srt') -> str:
+    """把字幕列表序列化为指定格式的文本"""
+    buffer = io.StringIO()
+    writer = CueWriter(buffer, fmt)
+    writer.write(cues)
+    writer.close()
+    return buffer.getvalue()
@@ -1,47 +1,210 @@
 import os
-from typing import Optional, List
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import math
+from typing import TYPE_CHECKING, Callable, Optional, List, Dict, Iterable
 from google import genai
 from google.genai import types
+from . import metrics
+from .prompts import SRT_PROMPT_TEMPLATE, GEMINI_MODEL, transcript_version  # noqa: F401
 from .video_utils import get_video_info, should_split_video
-from .audio_utils import download_audio, speed_up_audio, get_audio_duration, split_audio, cleanup_temp_files
+from .uploads import file_sha256, get_upload_registry
+from .scheduler import get_scheduler
+from .audio_utils import (
+    download_audio, prepare_audio_segments, stream_audio_segments, audio_mime_type,
+    get_audio_duration, DEFAULT_AUDIO_PROFILE
+)
+from .jobs import Job, JobLockedError, SEGMENT_UPLOADED, SEGMENT_FAILED
+from .planner import available_workers, plan_long_video, record_attempt
+from .silence import RemapTable, detect_speech_regions
+from .youtube import extract_video_id
+from .cues import CueList, CueWriter, SrtParser, parse_srt, merge_segments, serialize
 
-# SRT 格式提示词
-# source: https://x.com/Gorden_Sun/status/1947196262320844990
-SRT_PROMPT_TEMPLATE = """识别我上传的音频/视频里的文字，并提供可快速复制的srt格式的字幕文本，每句字幕必须使用 hh:mm:ss,xxx --> hh:mm:ss,xxx 的时间标记，尤其是每句字幕的截止时间也务必遵循格式。中文必须使用简体中文，不能出现繁体字{segment_info}。
-以下是一段示例字幕，用作格式参考：
-1
-00:00:00,347 --> 00:00:07,037
-有一个问题其实就是，以后现在和过去哪个其实是最重要的，
+if TYPE_CHECKING:
+    from .utils import TranscriptWriter
 
-2
-00:00:07,037 --> 00:00:11,107
-那我觉得是过去创造了现在，现在来决定未来，
+# 长视频分段的默认转录并发数
+DEFAULT_SEGMENT_WORKERS = 4
 
-3
-00:00:11,107 --> 00:00:17,217
-那我觉得说我们能够把握的其实只有现在。"""
+# 每个分段最多尝试的次数
+SEGMENT_MAX_ATTEMPTS = 3
 
+_clients: Dict[str, genai.Client] = {}
+_clients_lock = threading.Lock()
 
-def transcribe_audio_file(client: genai.Client, audio_path: str, segment_info: str = "") -> Optional[str]:
+
+def get_client(api_key: Optional[str] = None) -> genai.Client:
+    """获取 Gemini API 客户端
+
+    同一进程内按 API Key 复用客户端，批量处理时避免重复初始化和建立连接。
+    设置 YT_T_GEMINI_BASE_URL 时请求发往该地址（如本地的模拟服务）。
+    """
+    if api_key is None:
+        api_key = os.environ.get("GEMINI_API_KEY")
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY 环境变量未设置")
+
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            base_url = os.environ.get("YT_T_GEMINI_BASE_URL")
+            http_options = types.HttpOptions(base_url=base_url) if base_url else None
+            client = genai.Client(api_key=api_key, http_options=http_options)
+            _clients[api_key] = client
+        return client
+
+
+def generate_transcript(client: genai.Client, contents: List[types.Content],
+                        config: types.GenerateContentConfig,
+                        writer: Optional['TranscriptWriter'] = None,
+                        output_format: str = 'srt', duration: float = 0.0):
+    """流式生成字幕文本
+    
+    请求经过共享的调度器：限流和临时错误（包括流式响应中途断开）会退避后整体重试。
+    提供 writer 时边接收边解析，每条字幕按 output_format 写入 writer
+    （重试前丢弃上一次写入的内容），返回解析得到的 CueList 而不是字幕文本。
+    返回的内容不是 SRT、解析不出字幕时，把原文作为一条覆盖 0 到 duration 秒的字幕写出，不丢弃。
+    """
+    span = metrics.span('generate')
+    if writer is None:
+        def run() -> str:
+            chunks = []
+            for chunk in client.models.generate_content_stream(
+                model=GEMINI_MODEL,
+                contents=contents,
+                config=config,
+            ):
+                if chunk.text:
+                    span.first_token()
+                    chunks.append(chunk.text)
+            return "".join(chunks).strip()
+        
+        with span:
+            text = get_scheduler('generate').call(run, description="Gemini 生成")
+            if span.active:
+                span.set(bytes_out=len(text.encode('utf-8')))
+            return text
+    
+    mark = writer.tell()
+    
+    def run_to_writer() -> CueList:
+        writer.rewind(mark)
+        # 边接收边解析，每得到一条完整的字幕就按输出格式写出
+        parser = SrtParser()
+        sink = CueWriter(writer, output_format)
+        cues = CueList()
+        chunks = []
+        for chunk in client.models.generate_content_stream(
+            model=GEMINI_MODEL,
+            contents=contents,
+            config=config,
+        ):
+            if chunk.text:
+                span.first_token()
+                chunks.append(chunk.text)
+                batch = parser.feed(chunk.text)
+                sink.write(batch)
+                cues.extend(batch)
+        batch = parser.close()
+        cues.extend(batch)
+        text = "".join(chunks).strip()
+        if not len(cues) and text:
+            print("警告: 转录结果中没有可识别的 SRT 字幕，按原文保存")
+            batch = CueList([0.0], [float(duration or 0.0)], [text])
+            cues.extend(batch)
+        sink.write(batch)
+        sink.close()
+        return cues
+    
+    with span:
+        cues = get_scheduler('generate').call(run_to_writer, description="Gemini 生成")
+        span.set(bytes_out=writer.tell() - mark, cues=len(cues))
+        return cues
+
+
+def upload_audio_file(client: genai.Client, audio_path: str, mime_type: str = "audio/mpeg") -> Dict:
+    """上传音频文件
+    
+    按内容哈希查询上传登记表，内容相同且未过期的文件直接复用，不重复上传。
+    
+    Returns:
+        包含 name、uri、mime_type 和 reused（是否复用）的字典
+    """
+    registry = get_upload_registry()
+    digest = file_sha256(audio_path) if registry else None
+    
+    if registry:
+        entry = registry.lookup(digest)
+        if entry:
+            print(f"复用已上传的音频文件: {entry['name']}")
+            metrics.record('upload', 0.0, reused=True)
+            return {'name': entry['name'], 'uri': entry['uri'], 'mime_type': mime_type, 'reused': True}
+    
+    # 直接使用文件路径上传
+    size = os.path.getsize(audio_path)
+    with metrics.span('upload', bytes_in=size, mime_type=mime_type, reused=False):
+        audio_file = get_scheduler('upload').call(client.files.upload, file=audio_path,
+                                                  description="上传音频")
+    print(f"音频文件已上传: {audio_file.name}")
+    
+    if registry:
+        expiration = getattr(audio_file, 'expiration_time', None)
+        registry.record(digest, audio_file.name, audio_file.uri, mime_type, size=size,
+                        expires_at=expiration.timestamp() if expiration else None)
+    return {'name': audio_file.name, 'uri': audio_file.uri, 'mime_type': mime_type, 'reused': False}
+
+
+def delete_uploaded_files(client: genai.Client, names: Iterable[str]):
+    """批量删除已上传的远程文件，并从上传登记表中移除"""
+    names = sorted(set(names))
+    if not names:
+        return
+    
+    def delete(name: str):
+        try:
+            client.files.delete(name=name)
+            return True
+        except Exception as e:
+            print(f"删除远程文件失败 {name}: {str(e)}")
+            return False
+    
+    with ThreadPoolExecutor(max_workers=min(8, len(names))) as pool:
+        deleted = [name for name, ok in zip(names, pool.map(delete, names)) if ok]
+    
+    registry = get_upload_registry()
+    if registry:
+        registry.forget(names)
+    print(f"已删除 {len(deleted)} 个远程文件")
+
+
+def transcribe_audio_file(client: genai.Client, audio_path: str, segment_info: str = "",
+                          uploads: Optional[List[str]] = None,
+                          on_upload: Optional[Callable[[Dict], None]] = None,
+                          mime_type: Optional[str] = None) -> Optional[str]:
     """转录音频文件
     
     Args:
         client: Gemini API 客户端
         audio_path: 音频文件路径
         segment_info: 段落信息（用于提示）
+        uploads: 记录本次任务用到的远程文件名，任务结束后统一删除
+        on_upload: 上传完成（或复用已上传文件）后的回调，参数为 upload_audio_file 的返回值
+        mime_type: 音频的 MIME 类型，默认按扩展名判断
     
     Returns:
         转录的字幕内容
     """
-    model = "gemini-2.5-flash"
-    
     prompt = SRT_PROMPT_TEMPLATE.format(segment_info=segment_info)
 
     # 上传音频文件
+    audio_file = None
     try:
-        # 直接使用文件路径上传
-        audio_file = client.files.upload(file=audio_path)
-        print(f"音频文件已上传: {audio_file.name}")
+        audio_file = upload_audio_file(client, audio_path, mime_type or audio_mime_type(audio_path))
+        if uploads is not None:
+            uploads.append(audio_file['name'])
+        if on_upload:
+            on_upload(audio_file)
         
         contents = [
             types.Content(
@@ -49,8 +212,8 @@ def transcribe_audio_file(client: genai.Client, audio_path: str, segment_info: s
                 parts=[
                     types.Part(
                         file_data=types.FileData(
-                            file_uri=audio_file.uri,
-                            mime_type="audio/mpeg",
+                            file_uri=audio_file['uri'],
+                            mime_type=audio_file['mime_type'],
                         )
                     ),
                     types.Part.from_text(text=prompt),
@@ -62,37 +225,157 @@ def transcribe_audio_file(client: genai.Client, audio_path: str, segment_info: s
             response_mime_type="text/plain",
         )
         
-        transcript = ""
-        for chunk in client.models.generate_content_stream(
-            model=model,
-            contents=contents,
-            config=generate_content_config,
-        ):
-            if chunk.text:
-                transcript += chunk.text
-        
-        return transcript.strip()
+        return generate_transcript(client, contents, generate_content_config)
         
     except Exception as e:
         print(f"转录音频失败: {str(e)}")
+        if audio_file and audio_file['reused']:
+            # 复用的远程文件可能已失效，下次重试时重新上传
+            registry = get_upload_registry()
+            if registry:
+                registry.forget([audio_file['name']])
         return None
 
 
-def transcribe_with_gemini(youtube_url: str) -> Optional[str]:
+def transcribe_segments(client: genai.Client, audio_segments: Iterable[str],
+                        max_workers: int = DEFAULT_SEGMENT_WORKERS,
+                        total: Optional[int] = None,
+                        uploads: Optional[List[str]] = None,
+                        job: Optional[Job] = None,
+                        max_attempts: int = SEGMENT_MAX_ATTEMPTS,
+                        on_result: Optional[Callable[[int, Optional[str]], None]] = None,
+                        on_attempt: Optional[Callable[[int, str, float, bool], None]] = None
+                        ) -> List[Optional[str]]:
+    """并发转录多个音频分段
+    
+    audio_segments 可以是列表，也可以是边生成边返回分段的迭代器（流式处理）：
+    每拿到一个分段就立即提交上传和转录，不等待后续分段生成。
+    失败的分段会重试，提供 job 时已完成的分段直接读取保存的结果，新结果也会写入任务目录。
+    
+    Args:
+        client: Gemini API 客户端
+        audio_segments: 按顺序排列的音频分段路径
+        max_workers: 同时上传/转录的分段数
+        total: 分段总数（用于提示词），默认取 audio_segments 的长度
+        uploads: 记录本次任务用到的远程文件名
+        job: 断点续传任务
+        max_attempts: 每个分段最多尝试的次数
+        on_result: 每个分段得到结果（包括已完成和失败的分段）后在调用线程中执行的回调，
+            参数为分段序号和转录结果
+        on_attempt: 每次转录尝试结束后在工作线程中执行的回调，参数为分段序号、分段路径、
+            耗时（秒）和是否成功，用于记录转录统计
+    
+    Returns:
+        与 audio_segments 顺序一致的转录结果列表，失败的分段为 None
+    """
+    if total is None:
+        audio_segments = list(audio_segments)
+        total = len(audio_segments)
+    max_workers = max(1, min(max_workers, total))
+    print(f"\n正在转录 {total} 段音频（并发数: {max_workers}）...")
+    
+    def transcribe_segment(i: int, segment_path: str, segment_info: str) -> Optional[str]:
+        on_upload = None
+        if job:
+            def on_upload(audio_file):
+                job.update_segment(i, SEGMENT_UPLOADED, remote_name=audio_file['name'])
+        
+        unparsed = None
+        with metrics.span('segment', index=i) as span:
+            for attempt in range(1, max_attempts + 1):
+                started = time.monotonic()
+                transcript = transcribe_audio_file(client, segment_path, segment_info, uploads,
+                                                   on_upload)
+                # 不是 SRT 的结果（解析不出字幕）合并时会被丢弃，按失败处理并重试
+                ok = bool(transcript) and len(parse_srt(transcript)) > 0
+                if transcript and not ok:
+                    print(f"第 {i+1} 段的转录结果中没有可识别的字幕")
+                    unparsed = transcript
+                if on_attempt:
+                    on_attempt(i, segment_path, time.monotonic() - started, ok)
+                if job:
+                    job.update_segment(i, attempts=attempt)
+                if ok:
+                    if job:
+                        job.save_segment_transcript(i, transcript)
+                    span.set(retries=attempt - 1)
+                    return transcript
+                if attempt < max_attempts:
+                    print(f"第 {i+1} 段转录失败，正在重试（{attempt}/{max_attempts}）...")
+            
+            span.set(retries=max_attempts - 1, status='error')
+            if job and unparsed:
+                # 保留最后一次无法解析的结果，便于检查
+                job.save_segment_unparsed(i, unparsed)
+            elif job:
+                job.update_segment(i, SEGMENT_FAILED, error="转录失败")
+            return None
+    
+    results: Dict[int, Optional[str]] = {}
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='yt-t-segment') as pool:
+        futures = {}
+        for i, segment_path in enumerate(audio_segments):
+            if job and job.segment_done(i):
+                print(f"第 {i+1} 段已完成，跳过")
+                results[i] = job.load_segment_transcript(i)
+                if on_result:
+                    on_result(i, results[i])
+                continue
+            segment_info = f"（第 {i+1} 段，共 {max(total, i+1)} 段）" if total > 1 else ""
+            future = pool.submit(metrics.bind(transcribe_segment), i, segment_path, segment_info)
+            futures[future] = i
+        
+        for future in as_completed(futures):
+            i = futures[future]
+            results[i] = future.result()
+            if results[i]:
+                print(f"第 {i+1} 段转录完成")
+            else:
+                print(f"第 {i+1} 段转录失败")
+            if on_result:
+                on_result(i, results[i])
+    
+    return [results[i] for i in range(len(results))]
+
+
+def transcribe_with_gemini(youtube_url: str,
+                           segment_workers: int = DEFAULT_SEGMENT_WORKERS,
+                           streaming: bool = False,
+                           video_info: Optional[Dict] = None,
+                           resume: bool = False,
+                           writer: Optional['TranscriptWriter'] = None,
+                           output_format: str = 'srt',
+                           remove_silence: bool = False,
+                           audio_profile: str = DEFAULT_AUDIO_PROFILE):
     """Transcribe YouTube video using Google Gemini API
     
-    对于超过50分钟的视频，会下载音频并分段处理
+    对于超过50分钟的视频，会下载音频并分段处理，各分段并发转录
+    
+    Args:
+        youtube_url: YouTube视频URL
+        segment_workers: 同时上传/转录的分段数
+        streaming: 边下载边分段，每完成一段立即上传转录
+        video_info: 已获取的视频信息（get_video_info 的返回值），未提供时在此获取
+        resume: 继续之前中断的任务，只处理未完成的阶段和分段
+        writer: 边生成边写入字幕；提供时返回字幕的 CueList，而不是字幕文本
+        output_format: 写入 writer 的字幕格式
+        remove_silence: 长视频下载后裁掉较长的静音再分段上传（需要 numpy）
+        audio_profile: 长视频分段的编码配置（audio_utils.AUDIO_PROFILES 的键）
+    
+    Returns:
+        字幕文本（SRT），提供 writer 时为 CueList，失败时返回 None
     """
     api_key = os.environ.get("GEMINI_API_KEY")
     if not api_key:
         raise ValueError("GEMINI_API_KEY 环境变量未设置")
     
     # 获取视频信息
-    print("正在获取视频信息...")
-    video_info = get_video_info(youtube_url)
+    if video_info is None:
+        print("正在获取视频信息...")
+        video_info = get_video_info(youtube_url)
     if not video_info:
         print("无法获取视频信息，尝试直接转录...")
-        return transcribe_youtube_direct(youtube_url)
+        return transcribe_youtube_direct(youtube_url, writer, output_format)
     
     duration = video_info['duration']
     title = video_info['title']
@@ -102,83 +385,182 @@ def transcribe_with_gemini(youtube_url: str) -> Optional[str]:
     # 检查是否需要下载和分割
     if not should_split_video(duration):
         print("视频时长小于50分钟，直接转录...")
-        return transcribe_youtube_direct(youtube_url)
+        return transcribe_youtube_direct(youtube_url, writer, output_format, duration)
     
     # 需要下载音频并处理
     print("\n视频超过50分钟，需要下载音频并处理...")
+    return transcribe_long_video(youtube_url, api_key, video_info, segment_workers,
+                                 streaming=streaming, resume=resume, writer=writer,
+                                 output_format=output_format, remove_silence=remove_silence,
+                                 audio_profile=audio_profile)
+
+
+def transcribe_long_video(youtube_url: str, api_key: str, video_info: Dict,
+                          segment_workers: int = DEFAULT_SEGMENT_WORKERS,
+                          streaming: bool = False, resume: bool = False,
+                          writer: Optional['TranscriptWriter'] = None,
+                          output_format: str = 'srt', remove_silence: bool = False,
+                          audio_profile: str = DEFAULT_AUDIO_PROFILE):
+    """下载、加速分段并转录长视频
+    
+    各阶段的进度记录在任务目录的 manifest 中：音频下载、加速分段、每个分段的上传和转录。
+    失败时保留任务目录，使用 resume 重新运行时从第一个未完成的单元继续，只转录缺失的分段；
+    全部完成后才删除任务目录和远程文件。
+    
+    streaming 为 True 时，ffmpeg 直接读取音频流并按段输出，每完成一段立即提交转录，
+    第 N 段上传时第 N-1 段已在转录，后续分段仍在下载和编码。
     
-    temp_files = []  # 记录所有临时文件
+    各分段的时间轴从 0 开始且是加速后的时间，合并时换算回原始视频的时间轴。
+    
+    remove_silence 为 True 时，下载后先检测并裁掉较长的静音，保留区域记录在任务中，
+    合并字幕时按记录把时间换算回原始视频（不适用于 streaming）。
+    提供 writer 时，前面的分段全部完成后立即按顺序写出，不等待整个视频转录结束。
+    """
+    duration = video_info['duration']
+    video_id = video_info.get('video_id') or extract_video_id(youtube_url)
+    params = plan_long_video(video_id, duration, available_workers(segment_workers), audio_profile,
+                             remove_silence, resume=resume)
+    speed = params['speed']
+    segment_minutes = params['segment_minutes']
+    segment_seconds = segment_minutes * 60
+    expected_segments = max(1, math.ceil(duration / speed / (segment_minutes * 60)))
+    print(f"\n加速后音频时长: {format_time(int(duration / speed))}，预计 {expected_segments} 段")
     
     try:
-        # 1. 下载音频
-        audio_path = download_audio(youtube_url)
-        if not audio_path:
-            print("音频下载失败，尝试直接转录...")
-            return transcribe_youtube_direct(youtube_url)
-        temp_files.append(audio_path)
-        
-        # 2. 加速音频到2倍速
-        speeded_audio_path = speed_up_audio(audio_path, speed=2.0)
-        temp_files.append(speeded_audio_path)
-        
-        # 3. 检查加速后的音频时长
-        speeded_duration = get_audio_duration(speeded_audio_path)
-        print(f"\n加速后音频时长: {format_time(int(speeded_duration))}")
-        
-        # 4. 根据加速后的时长决定是否分割
-        client = genai.Client(api_key=api_key)
-        
-        if speeded_duration <= 50 * 60:  # 50分钟
-            print("加速后音频小于50分钟，直接转录...")
-            transcript = transcribe_audio_file(client, speeded_audio_path)
-            cleanup_temp_files(temp_files)
-            return transcript
+        job = Job.open(video_id, youtube_url, params=params, resume=resume)
+    except JobLockedError as e:
+        print(f"无法开始长视频任务: {str(e)}")
+        return None
+    if remove_silence and streaming:
+        print("静音裁剪需要先下载完整音频，流式处理时不裁剪静音")
+    uploaded_files = []  # 记录本次任务用到的远程文件，全部成功后统一删除
+    
+    try:
+        silence_stage = job.stage('silence')
+        remap = RemapTable(silence_stage['regions']) if silence_stage and silence_stage['regions'] else None
+        
+        segments_stage = job.stage('segments')
+        if segments_stage and all(os.path.exists(p) for p in job.segment_paths()):
+            # 分段已全部完成
+            audio_segments = job.segment_paths()
+            expected_segments = len(audio_segments)
+        elif streaming:
+            audio_segments = job.track_segments(
+                stream_audio_segments(youtube_url, speed=speed, segment_minutes=segment_minutes,
+                                      output_dir=job.dir, info=video_info.get('info'),
+                                      profile=audio_profile)
+            )
         else:
-            # 需要分割音频
-            print("加速后音频仍超过50分钟，需要分割...")
-            audio_segments = split_audio(speeded_audio_path, segment_minutes=50)
-            temp_files.extend(audio_segments)
+            # 1. 下载原始音频流（不转码）
+            audio_stage = job.stage('audio')
+            if audio_stage and os.path.exists(audio_stage['path']):
+                audio_path = audio_stage['path']
+                print(f"使用已下载的音频: {audio_path}")
+            else:
+                audio_path = download_audio(youtube_url, output_dir=job.dir, transcode=False,
+                                            info=video_info.get('info'))
+                if not audio_path:
+                    print("音频下载失败，尝试直接转录...")
+                    job.cleanup()
+                    return transcribe_youtube_direct(youtube_url, writer, output_format, duration)
+                job.complete_stage('audio', path=audio_path)
             
-            # 转录每个分段
-            all_transcripts = []
-            for i, segment_path in enumerate(audio_segments):
-                print(f"\n正在转录第 {i+1}/{len(audio_segments)} 段...")
-                segment_info = f"（第 {i+1} 段，共 {len(audio_segments)} 段）"
-                segment_transcript = transcribe_audio_file(client, segment_path, segment_info)
-                
-                if segment_transcript:
-                    all_transcripts.append(segment_transcript)
-                    print(f"第 {i+1} 段转录完成")
-                else:
-                    print(f"第 {i+1} 段转录失败，跳过")
+            # 可选：检测需要保留的区域，裁掉较长的静音
+            if remove_silence and silence_stage is None:
+                print("正在检测静音...")
+                remap = detect_speech_regions(audio_path)
+                job.complete_stage('silence', regions=remap.to_list() if remap else [])
             
+            # 2. 一次性完成（裁剪静音、）加速和分段
+            audio_segments = list(job.track_segments(
+                prepare_audio_segments(audio_path, speed=speed, segment_minutes=segment_minutes,
+                                       output_dir=job.dir,
+                                       keep=remap.filter_expression() if remap else None,
+                                       profile=audio_profile)
+            ))
+            expected_segments = len(audio_segments)
+        
+        on_result = None
+        if writer is not None:
+            # 按顺序写出已完成的连续分段
+            sink = CueWriter(writer, output_format)
+            merged = CueList()
+            finished = {}
+            next_index = 0
+            
+            def on_result(i: int, transcript: Optional[str]):
+                nonlocal next_index
+                finished[i] = transcript
+                while finished.get(next_index):
+                    cues = CueList()
+                    cues.extend(parse_segment(next_index, finished.pop(next_index)),
+                                offset=next_index * segment_seconds * speed, scale=speed)
+                    if remap:
+                        cues = remap.apply(cues)
+                    sink.write(cues)
+                    merged.extend(cues)
+                    next_index += 1
+        
+        def on_attempt(i: int, segment_path: str, seconds: float, ok: bool):
+            # 最后一段通常较短，按文件的实际时长记录
+            try:
+                audio_minutes = get_audio_duration(segment_path) / 60
+            except Exception:
+                audio_minutes = min(segment_minutes, duration / speed / 60 - i * segment_minutes)
+            record_attempt(speed, audio_minutes, seconds, ok)
+        
+        client = get_client(api_key)
+        segment_transcripts = transcribe_segments(client, audio_segments, segment_workers,
+                                                  total=expected_segments, uploads=uploaded_files,
+                                                  job=job, on_result=on_result,
+                                                  on_attempt=on_attempt)
+        
+        failed = [i + 1 for i, t in enumerate(segment_transcripts) if not t]
+        if failed:
+            print(f"\n第 {', '.join(map(str, failed))} 段转录失败，任务进度已保存到: {job.dir}")
+            print("可使用 --resume 重新运行，只转录未完成的分段")
+            return None
+        
+        if writer is not None:
+            sink.close()
+            transcript = merged
+        else:
             # 合并所有段落
-            if all_transcripts:
-                print("\n正在合并所有转录结果...")
-                transcript = merge_transcripts(all_transcripts)
-                cleanup_temp_files(temp_files)
-                return transcript
-            else:
-                print("所有段落转录失败")
-                cleanup_temp_files(temp_files)
-                return None
-                
+            print("\n正在合并所有转录结果...")
+            merged = merge_transcripts(segment_transcripts, segment_seconds, speed)
+            if remap:
+                merged = remap.apply(merged)
+            transcript = serialize(merged)
+        
+        # 包括之前运行中已完成分段用到的远程文件
+        uploaded_files += [s['remote_name'] for s in job.segments() if s.get('remote_name')]
+        delete_uploaded_files(client, uploaded_files)
+        job.cleanup()
+        return transcript
+    
     except Exception as e:
         print(f"处理失败: {str(e)}")
-        cleanup_temp_files(temp_files)
+        print(f"任务进度已保存到: {job.dir}，可使用 --resume 继续")
         return None
+    finally:
+        job.release()
 
 
-def transcribe_youtube_direct(youtube_url: str) -> Optional[str]:
-    """直接转录YouTube视频（不下载）"""
+def transcribe_youtube_direct(youtube_url: str,
+                              writer: Optional['TranscriptWriter'] = None,
+                              output_format: str = 'srt', duration: float = 0.0):
+    """直接转录YouTube视频（不下载）
+    
+    提供 writer 时边生成边按 output_format 写入，返回字幕的 CueList。
+    duration 为视频时长（秒），结果无法解析为 SRT 时原文作为一条覆盖整个视频的字幕保存。
+    """
     api_key = os.environ.get("GEMINI_API_KEY")
     if not api_key:
         raise ValueError("GEMINI_API_KEY 环境变量未设置")
     
     try:
-        client = genai.Client(api_key=api_key)
+        client = get_client(api_key)
         
-        model = "gemini-2.5-flash"
         contents = [
             types.Content(
                 role="user",
@@ -204,39 +586,35 @@ def transcribe_youtube_direct(youtube_url: str) -> Optional[str]:
         )
         
         print("正在使用 Gemini API 生成字幕...")
-        transcript = ""
-        for chunk in client.models.generate_content_stream(
-            model=model,
-            contents=contents,
-            config=generate_content_config,
-        ):
-            if chunk.text:
-                transcript += chunk.text
-        
-        return transcript.strip()
+        return generate_transcript(client, contents, generate_content_config, writer, output_format,
+                                   duration)
         
     except Exception as e:
         print(f"Gemini API 调用失败: {str(e)}")
         return None
 
 
-def merge_transcripts(transcripts: List[str]) -> str:
+def parse_segment(index: int, transcript: str) -> CueList:
+    """解析分段的 SRT 转录结果"""
+    cues = parse_srt(transcript)
+    if not cues:
+        print(f"警告: 第 {index+1} 段的转录结果中没有可识别的字幕")
+    return cues
+
+
+def merge_transcripts(transcripts: List[str], segment_seconds: float, speed: float = 1.0) -> CueList:
     """合并多个转录片段
     
     Args:
-        transcripts: 转录片段列表
+        transcripts: 按顺序排列的各分段 SRT 转录结果
+        segment_seconds: 每个分段（加速后）的时长
+        speed: 加速倍数
     
     Returns:
-        合并后的完整转录文本
+        时间轴换算到原始视频后的完整字幕
     """
-    # 合并时添加分段标记
-    merged = []
-    for i, transcript in enumerate(transcripts):
-        if i > 0:
-            merged.append(f"\n\n--- 第 {i+1} 段 ---\n")
-        merged.append(transcript)
-    
-    return "\n".join(merged)
+    return merge_segments([parse_segment(i, t) for i, t in enumerate(transcripts)],
+                          segment_seconds, speed)
 
 
 def format_time(seconds: int) -> str:
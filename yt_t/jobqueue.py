@@ -0,0 +1,316 @@
+import os
+import time
+import sqlite3
+import secrets
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+from .cache import get_cache_dir
+from .youtube import extract_video_id
+
+# 队列任务状态
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+DEAD = 'dead'
+STATUSES = (PENDING, LEASED, DONE, DEAD)
+
+# 租约时长（秒）：领取任务的 worker 需要在到期前续约，否则任务重新回到队列
+DEFAULT_LEASE_SECONDS = 300
+
+# 每个任务最多尝试的次数，超过后转入死信（dead）状态
+DEFAULT_MAX_ATTEMPTS = 3
+
+# 失败后重新排队的等待时间：RETRY_BASE_DELAY * 2^(尝试次数-1)，不超过 RETRY_MAX_DELAY
+RETRY_BASE_DELAY = 60.0
+RETRY_MAX_DELAY = 3600.0
+
+_COLUMNS = ('id', 'url', 'video_id', 'status', 'stage', 'attempts', 'max_attempts', 'worker',
+            'lease_expires', 'available_at', 'source', 'path', 'error', 'created_at', 'updated_at')
+
+
+def get_queue_path() -> str:
+    """队列文件路径，可通过 YT_T_QUEUE 环境变量设置（如多台机器共享的存储上的文件）"""
+    return os.environ.get("YT_T_QUEUE") or os.path.join(get_cache_dir(), "queue.sqlite")
+
+
+class JobQueue:
+    """基于 SQLite 的持久任务队列
+
+    多个 worker 进程（可以在不同机器上，共享同一个队列文件）从队列领取任务：
+    领取时在一个写事务中把任务标记为 leased 并设置租约到期时间和令牌，同一任务不会被两个 worker 同时领取；
+    worker 定期续约，进程退出或失联导致租约过期后，任务重新排队（计为一次尝试）。
+    失败的任务按指数退避重新排队，尝试次数用完后转入 dead，可以手动 retry。
+    每个任务的阶段变化记录在 queue_events 表中：record_stage 先记在任务字典中，
+    随下一次续约或完成/失败在同一个事务中写入，每个任务只需要很少的写事务。
+
+    队列文件可能放在网络文件系统上，因此不使用 WAL（需要共享内存），使用默认的回滚日志。
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        if path is None:
+            path = get_queue_path()
+        self.path = path
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.executescript(
+            """CREATE TABLE IF NOT EXISTS queue (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL,
+                video_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                stage TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                worker TEXT,
+                token TEXT,
+                lease_expires REAL,
+                available_at REAL NOT NULL,
+                source TEXT,
+                path TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_queue_ready ON queue (status, available_at);
+            CREATE INDEX IF NOT EXISTS idx_queue_video ON queue (video_id);
+            CREATE TABLE IF NOT EXISTS queue_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id INTEGER NOT NULL,
+                ts REAL NOT NULL,
+                worker TEXT,
+                stage TEXT NOT NULL,
+                status TEXT NOT NULL,
+                detail TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_queue_events_job ON queue_events (job_id);"""
+        )
+
+    @contextmanager
+    def _transaction(self):
+        """写事务：BEGIN IMMEDIATE 在开始时就取得写锁，多个进程同时领取任务时依次执行"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    @staticmethod
+    def _event(conn, job_id: int, stage: str, status: str, worker: Optional[str] = None,
+               detail: Optional[str] = None, now: Optional[float] = None):
+        conn.execute(
+            "INSERT INTO queue_events (job_id, ts, worker, stage, status, detail) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, now or time.time(), worker, stage, status, detail),
+        )
+
+    def enqueue(self, urls: Iterable[str], max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                force: bool = False) -> Tuple[List[int], List[str]]:
+        """添加任务
+
+        同一视频已在队列中（等待或处理中）时跳过；已完成的视频也跳过，除非 force。
+
+        Returns:
+            (新任务的 ID 列表, 跳过的 URL 列表)
+        """
+        added, skipped = [], []
+        now = time.time()
+        with self._transaction() as conn:
+            for url in urls:
+                video_id = extract_video_id(url)
+                if not video_id:
+                    skipped.append(url)
+                    continue
+                active = (PENDING, LEASED) if force else (PENDING, LEASED, DONE)
+                exists = conn.execute(
+                    f"SELECT 1 FROM queue WHERE video_id = ? AND status IN ({','.join('?' * len(active))})",
+                    (video_id,) + active,
+                ).fetchone()
+                if exists:
+                    skipped.append(url)
+                    continue
+                cursor = conn.execute(
+                    """INSERT INTO queue (url, video_id, status, max_attempts, available_at,
+                                          created_at, updated_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                    (url, video_id, PENDING, max_attempts, now, now, now),
+                )
+                self._event(conn, cursor.lastrowid, 'queue', PENDING, now=now)
+                added.append(cursor.lastrowid)
+        return added, skipped
+
+    def lease(self, worker: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> Optional[Dict]:
+        """领取一个可以处理的任务
+
+        先回收租约已过期的任务（重新排队，或在尝试次数用完时转入 dead），再按入队顺序领取。
+
+        Returns:
+            任务字典（包含续约和提交结果时需要的 token），没有可处理的任务时返回 None
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            expired = conn.execute(
+                "SELECT id, attempts, max_attempts, worker FROM queue WHERE status = ? AND lease_expires < ?",
+                (LEASED, now),
+            ).fetchall()
+            for job_id, attempts, max_attempts, previous in expired:
+                status = DEAD if attempts >= max_attempts else PENDING
+                conn.execute(
+                    """UPDATE queue SET status = ?, token = NULL, lease_expires = NULL, available_at = ?,
+                              error = ?, updated_at = ? WHERE id = ?""",
+                    (status, now, f"租约过期（{previous}）", now, job_id),
+                )
+                self._event(conn, job_id, 'lease', 'expired', previous, now=now)
+
+            row = conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM queue WHERE status = ? AND available_at <= ? "
+                "ORDER BY id LIMIT 1",
+                (PENDING, now),
+            ).fetchone()
+            if row is None:
+                return None
+
+            job = dict(zip(_COLUMNS, row))
+            job['events'] = deque()
+            job['token'] = secrets.token_hex(8)
+            job['attempts'] += 1
+            job['worker'] = worker
+            job['status'] = LEASED
+            conn.execute(
+                """UPDATE queue SET status = ?, attempts = ?, worker = ?, token = ?, lease_expires = ?,
+                          stage = NULL, updated_at = ? WHERE id = ?""",
+                (LEASED, job['attempts'], worker, job['token'], now + lease_seconds, now, job['id']),
+            )
+            self._event(conn, job['id'], 'lease', LEASED, worker, f"attempt {job['attempts']}", now=now)
+        return job
+
+    def heartbeat(self, job: Dict, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> bool:
+        """续约并写入之后记录的阶段变化；返回 False 表示租约已失效（已过期并被回收）"""
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE queue SET lease_expires = ?, updated_at = ? WHERE id = ? AND token = ? AND status = ?",
+                (now + lease_seconds, now, job['id'], job['token'], LEASED),
+            )
+            if cursor.rowcount != 1:
+                return False
+            self._flush_events(conn, job)
+        return True
+
+    @staticmethod
+    def record_stage(job: Dict, stage: str, status: str, detail: Optional[str] = None):
+        """记录任务的阶段变化（在下一次续约或完成/失败时写入队列）"""
+        job['events'].append((time.time(), stage, status, detail))
+
+    def _flush_events(self, conn, job: Dict):
+        events = job.get('events')
+        stage = None
+        while events:
+            ts, stage, status, detail = events.popleft()
+            self._event(conn, job['id'], stage, status, job['worker'], detail, now=ts)
+        if stage is not None:
+            conn.execute("UPDATE queue SET stage = ? WHERE id = ?", (stage, job['id']))
+
+    def complete(self, job: Dict, source: Optional[str] = None, path: Optional[str] = None) -> bool:
+        """标记任务完成；返回 False 表示租约已失效，结果没有记录"""
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                """UPDATE queue SET status = ?, token = NULL, lease_expires = NULL, source = ?, path = ?,
+                          error = NULL, updated_at = ? WHERE id = ? AND token = ?""",
+                (DONE, source, path, now, job['id'], job['token']),
+            )
+            if cursor.rowcount != 1:
+                return False
+            self._flush_events(conn, job)
+            self._event(conn, job['id'], 'job', DONE, job['worker'], path, now=now)
+        return True
+
+    def fail(self, job: Dict, error: str) -> Optional[str]:
+        """标记任务失败：尝试次数未用完时按退避时间重新排队，否则转入 dead
+
+        Returns:
+            任务的新状态，租约已失效时返回 None
+        """
+        now = time.time()
+        status = DEAD if job['attempts'] >= job['max_attempts'] else PENDING
+        delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (job['attempts'] - 1))
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                """UPDATE queue SET status = ?, token = NULL, lease_expires = NULL, available_at = ?,
+                          error = ?, updated_at = ? WHERE id = ? AND token = ?""",
+                (status, now + delay, error, now, job['id'], job['token']),
+            )
+            if cursor.rowcount != 1:
+                return None
+            self._flush_events(conn, job)
+            self._event(conn, job['id'], 'job', status, job['worker'], error, now=now)
+        return status
+
+    def retry(self, job_ids: Optional[Iterable[int]] = None) -> int:
+        """把 dead 任务（或指定的 dead 任务）重新排队并重置尝试次数"""
+        query, args = "SELECT id FROM queue WHERE status = ?", (DEAD,)
+        if job_ids is not None:
+            job_ids = tuple(job_ids)
+            if not job_ids:
+                return 0
+            query += f" AND id IN ({','.join('?' * len(job_ids))})"
+            args += job_ids
+
+        now = time.time()
+        with self._transaction() as conn:
+            ids = [row[0] for row in conn.execute(query, args).fetchall()]
+            for job_id in ids:
+                conn.execute(
+                    "UPDATE queue SET status = ?, attempts = 0, available_at = ?, updated_at = ? WHERE id = ?",
+                    (PENDING, now, now, job_id),
+                )
+                self._event(conn, job_id, 'queue', PENDING, detail='retry', now=now)
+        return len(ids)
+
+    def purge(self, statuses: Iterable[str] = (DONE,)) -> int:
+        """删除指定状态的任务及其事件"""
+        statuses = tuple(statuses)
+        placeholders = ','.join('?' * len(statuses))
+        with self._transaction() as conn:
+            conn.execute(
+                f"DELETE FROM queue_events WHERE job_id IN (SELECT id FROM queue WHERE status IN ({placeholders}))",
+                statuses,
+            )
+            return conn.execute(f"DELETE FROM queue WHERE status IN ({placeholders})", statuses).rowcount
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM queue GROUP BY status").fetchall()
+        counts = dict.fromkeys(STATUSES, 0)
+        counts.update(dict(rows))
+        return counts
+
+    def list(self, status: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        query = f"SELECT {', '.join(_COLUMNS)} FROM queue"
+        args: tuple = ()
+        if status:
+            query += " WHERE status = ?"
+            args = (status,)
+        query += " ORDER BY id DESC LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(query, args + (limit,)).fetchall()
+        return [dict(zip(_COLUMNS, row)) for row in rows]
+
+    def events(self, job_id: int) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT ts, worker, stage, status, detail FROM queue_events WHERE job_id = ? ORDER BY id",
+                (job_id,),
+            ).fetchall()
+        return [dict(zip(('ts', 'worker', 'stage', 'status', 'detail'), row)) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,283 @@
+import os
+import json
+import time
+import shutil
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional
+from .cache import get_cache_dir
+
+try:
+    import fcntl
+except ImportError:  # Windows：只在进程内加锁
+    fcntl = None
+
+# 分段状态
+SEGMENT_SPLIT = 'split'
+SEGMENT_UPLOADED = 'uploaded'
+SEGMENT_TRANSCRIBED = 'transcribed'
+SEGMENT_FAILED = 'failed'
+
+# 长视频的默认处理参数：加速倍数和每段（加速后）的时长；通常由 planner 按统计数据选择
+LONG_VIDEO_SPEED = 2.0
+LONG_VIDEO_SEGMENT_MINUTES = 50
+
+
+# 任务锁文件所在的子目录（任务目录会被整个删除，锁文件不能放在其中）
+LOCKS_DIR = ".locks"
+
+_held_locks = set()
+_held_locks_lock = threading.Lock()
+
+
+class JobLockedError(RuntimeError):
+    """任务正在被其他进程或线程处理"""
+
+
+def get_jobs_dir() -> str:
+    """长视频任务目录的根目录"""
+    return os.path.join(get_cache_dir(), "jobs")
+
+
+def long_video_params(audio_profile: str, remove_silence: bool = False,
+                      speed: float = LONG_VIDEO_SPEED,
+                      segment_minutes: int = LONG_VIDEO_SEGMENT_MINUTES) -> Dict:
+    """长视频任务的处理参数（记录在 manifest 中，不一致时任务重新开始）"""
+    params = {'speed': speed, 'segment_minutes': segment_minutes, 'audio_profile': audio_profile}
+    if remove_silence:
+        params['remove_silence'] = True
+    return params
+
+
+class Job:
+    """可断点续传的长视频转录任务
+
+    每个视频对应一个任务目录，其中的 manifest.json 记录各阶段的完成情况：
+    音频下载、加速分段，以及每个分段的 split / uploaded / transcribed 状态。
+    已完成分段的转录结果单独保存为文件，进程中断后可以从第一个未完成的单元继续。
+    """
+
+    MANIFEST = "manifest.json"
+
+    def __init__(self, job_dir: str, manifest: Dict):
+        self.dir = job_dir
+        self.manifest = manifest
+        self._lock = threading.RLock()
+        self._lock_file = None
+        self._lock_path = None
+
+    @classmethod
+    def open(cls, video_id: str, url: str, params: Optional[Dict] = None, resume: bool = False,
+             jobs_dir: Optional[str] = None) -> 'Job':
+        """打开视频对应的任务
+
+        Args:
+            video_id: 视频ID
+            url: 视频地址
+            params: 影响中间产物的处理参数（如加速倍数、分段时长），与已有任务不一致时重新开始
+            resume: 是否继续已有任务；为 False 时清空旧的任务目录
+            jobs_dir: 任务根目录，默认在缓存目录下
+
+        打开时获取任务的排他锁（同一视频同时只能有一个任务，避免互相删除任务目录），
+        已被占用时抛出 JobLockedError；处理结束后调用 release()（cleanup() 也会释放）。
+        """
+        jobs_dir = jobs_dir or get_jobs_dir()
+        job_dir = os.path.join(jobs_dir, video_id)
+        params = params or {}
+        lock_path = os.path.join(jobs_dir, LOCKS_DIR, f"{video_id}.lock")
+        lock_file = cls._acquire(lock_path)
+        try:
+            job = cls._open(job_dir, video_id, url, params, resume)
+        except BaseException:
+            cls._release(lock_path, lock_file)
+            raise
+        job._lock_path, job._lock_file = lock_path, lock_file
+        return job
+
+    @classmethod
+    def _open(cls, job_dir: str, video_id: str, url: str, params: Dict, resume: bool) -> 'Job':
+        manifest = None
+        if resume:
+            manifest = cls._load(job_dir)
+            if manifest and manifest.get('params') != params:
+                print("处理参数与已有任务不一致，重新开始任务")
+                manifest = None
+            elif manifest:
+                print(f"继续已有任务: {job_dir}")
+
+        if manifest is None:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            now = time.time()
+            manifest = {
+                'video_id': video_id,
+                'url': url,
+                'params': params,
+                'created_at': now,
+                'updated_at': now,
+                'stages': {},
+                'segments': [],
+            }
+
+        os.makedirs(job_dir, exist_ok=True)
+        job = cls(job_dir, manifest)
+        job.save()
+        return job
+
+    @staticmethod
+    def _acquire(lock_path: str):
+        os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+        with _held_locks_lock:
+            if lock_path in _held_locks:
+                raise JobLockedError(f"任务正在处理中: {lock_path}")
+            lock_file = open(lock_path, 'a')
+            if fcntl:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    lock_file.close()
+                    raise JobLockedError(f"任务正在被其他进程处理: {lock_path}")
+            _held_locks.add(lock_path)
+            return lock_file
+
+    @staticmethod
+    def _release(lock_path: str, lock_file):
+        with _held_locks_lock:
+            _held_locks.discard(lock_path)
+            # 关闭文件即释放 flock；不删除锁文件，避免等待中的进程锁住已删除的文件
+            lock_file.close()
+
+    def acquire(self):
+        """重新获取已释放的任务锁，已被占用时抛出 JobLockedError"""
+        if self._lock_file is None and self._lock_path:
+            self._lock_file = self._acquire(self._lock_path)
+
+    def release(self):
+        """释放任务锁（可重复调用）"""
+        if self._lock_file is not None:
+            self._release(self._lock_path, self._lock_file)
+            self._lock_file = None
+
+    @classmethod
+    def saved_params(cls, video_id: str, jobs_dir: Optional[str] = None) -> Optional[Dict]:
+        """已有任务的处理参数，没有任务时返回 None"""
+        manifest = cls._load(os.path.join(jobs_dir or get_jobs_dir(), video_id))
+        return manifest.get('params') if manifest else None
+
+    @classmethod
+    def _load(cls, job_dir: str) -> Optional[Dict]:
+        try:
+            with open(os.path.join(job_dir, cls.MANIFEST), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self):
+        """原子地写入 manifest（先写临时文件再重命名）"""
+        with self._lock:
+            self.manifest['updated_at'] = time.time()
+            path = os.path.join(self.dir, self.MANIFEST)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, path)
+
+    # 阶段
+
+    def stage(self, name: str) -> Optional[Dict]:
+        """返回已完成阶段的记录，未完成时返回 None"""
+        return self.manifest['stages'].get(name)
+
+    def complete_stage(self, name: str, **fields):
+        with self._lock:
+            self.manifest['stages'][name] = dict(fields, completed_at=time.time())
+            self.save()
+
+    # 分段
+
+    def segments(self) -> List[Dict]:
+        return self.manifest['segments']
+
+    def segment_paths(self) -> List[str]:
+        return [s['path'] for s in self.manifest['segments']]
+
+    def add_segment(self, index: int, path: str):
+        """登记一个已切分的分段（续传时已存在的分段保留原有状态）"""
+        with self._lock:
+            segments = self.manifest['segments']
+            while len(segments) <= index:
+                segments.append({'index': len(segments), 'path': None, 'status': None, 'attempts': 0})
+            segment = segments[index]
+            segment['path'] = path
+            if segment['status'] is None:
+                segment['status'] = SEGMENT_SPLIT
+            self.save()
+
+    def track_segments(self, audio_segments: Iterable[str], stage: str = 'segments') -> Iterator[str]:
+        """登记边生成边返回的分段，全部生成后标记分段阶段完成"""
+        count = 0
+        for i, path in enumerate(audio_segments):
+            self.add_segment(i, path)
+            count += 1
+            yield path
+        with self._lock:
+            del self.manifest['segments'][count:]
+            self.complete_stage(stage, count=count)
+
+    def update_segment(self, index: int, status: Optional[str] = None, **fields):
+        """更新分段状态和其他字段，status 为 None 时保持原状态"""
+        with self._lock:
+            segment = self.manifest['segments'][index]
+            if status is not None:
+                segment['status'] = status
+            segment.update(fields)
+            self.save()
+
+    def segment_done(self, index: int) -> bool:
+        segments = self.manifest['segments']
+        return (index < len(segments)
+                and segments[index]['status'] == SEGMENT_TRANSCRIBED
+                and os.path.exists(self._transcript_path(index)))
+
+    def _transcript_path(self, index: int) -> str:
+        return os.path.join(self.dir, f"segment_{index:03d}.srt")
+
+    def save_segment_transcript(self, index: int, transcript: str):
+        """保存分段转录结果并标记为已完成"""
+        path = self._transcript_path(index)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(transcript)
+        os.replace(tmp_path, path)
+        self.update_segment(index, SEGMENT_TRANSCRIBED, transcript_path=path, error=None)
+
+    def save_segment_unparsed(self, index: int, transcript: str):
+        """保存无法解析为字幕的转录结果，并标记分段失败（不视为已完成）"""
+        path = os.path.join(self.dir, f"segment_{index:03d}.unparsed.txt")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(transcript)
+        self.update_segment(index, SEGMENT_FAILED, error="转录结果中没有可识别的字幕", unparsed_path=path)
+
+    def load_segment_transcript(self, index: int) -> str:
+        with open(self._transcript_path(index), 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def pending_segments(self) -> List[int]:
+        return [s['index'] for s in self.manifest['segments'] if not self.segment_done(s['index'])]
+
+    def cleanup(self):
+        """任务完成后删除任务目录并释放任务锁"""
+        shutil.rmtree(self.dir, ignore_errors=True)
+        self.release()
+
+
+def list_jobs(jobs_dir: Optional[str] = None) -> List[Dict]:
+    """列出未完成的任务"""
+    jobs_dir = jobs_dir or get_jobs_dir()
+    if not os.path.isdir(jobs_dir):
+        return []
+
+    jobs = []
+    for name in sorted(os.listdir(jobs_dir)):
+        manifest = Job._load(os.path.join(jobs_dir, name))
+        if manifest:
+            jobs.append(manifest)
+    return jobs
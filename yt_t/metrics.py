@@ -0,0 +1,270 @@
+import os
+import json
+import time
+import atexit
+import threading
+import contextvars
+from typing import Callable, Dict, Optional, Tuple
+
+# 记录到每个阶段上的数值字段，Prometheus 输出中按阶段累加
+COUNTERS = ('bytes_in', 'bytes_out', 'audio_seconds', 'retries')
+
+# Prometheus textfile 最短的重写间隔（秒），进程退出时总会写一次
+PROMETHEUS_FLUSH_INTERVAL = 5.0
+
+
+class _NoopSpan:
+    """未启用指标时使用的空 span，所有操作都不做任何事"""
+
+    active = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **fields):
+        pass
+
+    def add(self, key: str, value: float = 1):
+        pass
+
+    def first_token(self):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """一个阶段的耗时和数据量
+
+    作为上下文管理器使用，退出时记录耗时（duration_s）和状态（ok / error）。
+    其他字段通过 set() / add() 记录，first_token() 记录首个输出的时间（ttft_s）；
+    没有抛出异常但阶段失败时可用 set(status='error') 标记。
+    """
+
+    active = True
+
+    def __init__(self, recorder: Optional['MetricsRecorder'], stage: str, fields: Dict):
+        self.recorder = recorder
+        self.stage = stage
+        self.fields = fields
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.monotonic()
+        _stack().append(self)
+        _notify(self.stage, 'started', self.fields)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.monotonic() - self.started
+        stack = _stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        elif self in stack:
+            # 生成器中的 span 可能不按嵌套顺序退出
+            stack.remove(self)
+        record = {
+            'ts': round(time.time(), 3),
+            'stage': self.stage,
+            'status': 'error' if exc_type else 'ok',
+            'duration_s': round(duration, 6),
+        }
+        record.update(self.fields)
+        if exc_type:
+            record['error'] = f"{exc_type.__name__}: {exc}"[:200]
+        if self.recorder is not None:
+            self.recorder.record(record)
+        _notify(self.stage, record['status'], record)
+        return False
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def add(self, key: str, value: float = 1):
+        self.fields[key] = self.fields.get(key, 0) + value
+
+    def first_token(self):
+        if 'ttft_s' not in self.fields:
+            self.fields['ttft_s'] = round(time.monotonic() - self.started, 6)
+
+
+class MetricsRecorder:
+    """把 span 写入 JSON lines 文件，或汇总为 Prometheus textfile
+
+    JSON lines 每个 span 一行；Prometheus 格式按 (阶段, 状态) 累加次数、耗时和各计数字段，
+    定期原子地重写整个文件，可以交给 node_exporter 的 textfile collector 采集。
+    """
+
+    def __init__(self, path: str, fmt: Optional[str] = None):
+        if fmt is None:
+            fmt = 'prometheus' if path.endswith('.prom') else 'jsonl'
+        if fmt not in ('jsonl', 'prometheus'):
+            raise ValueError(f"不支持的指标格式: {fmt}")
+        self.path = path
+        self.fmt = fmt
+        self._lock = threading.Lock()
+        self._totals: Dict[Tuple[str, str], Dict[str, float]] = {}
+        self._last_flush = 0.0
+        self._file = None
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        if fmt == 'jsonl':
+            self._file = open(path, 'a', encoding='utf-8')
+
+    def record(self, record: Dict):
+        with self._lock:
+            if self._file is not None:
+                self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                self._file.flush()
+                return
+
+            totals = self._totals.setdefault((record['stage'], record['status']), {})
+            totals['count'] = totals.get('count', 0) + 1
+            totals['duration_s'] = totals.get('duration_s', 0.0) + record['duration_s']
+            for key in COUNTERS:
+                if record.get(key):
+                    totals[key] = totals.get(key, 0) + record[key]
+            if 'ttft_s' in record:
+                totals['ttft_s'] = totals.get('ttft_s', 0.0) + record['ttft_s']
+                totals['ttft_count'] = totals.get('ttft_count', 0) + 1
+
+            if time.monotonic() - self._last_flush >= PROMETHEUS_FLUSH_INTERVAL:
+                self._write_prometheus()
+
+    def _write_prometheus(self):
+        metrics = [
+            ('yt_t_stage_runs_total', 'count', 'counter', '阶段执行次数'),
+            ('yt_t_stage_duration_seconds_total', 'duration_s', 'counter', '阶段累计耗时'),
+            ('yt_t_stage_bytes_in_total', 'bytes_in', 'counter', '阶段读取/上传的字节数'),
+            ('yt_t_stage_bytes_out_total', 'bytes_out', 'counter', '阶段输出的字节数'),
+            ('yt_t_stage_audio_seconds_total', 'audio_seconds', 'counter', '阶段处理的音频时长'),
+            ('yt_t_stage_retries_total', 'retries', 'counter', '阶段内的重试次数'),
+            ('yt_t_stage_first_token_seconds_sum', 'ttft_s', 'counter', '首个输出的累计等待时间'),
+            ('yt_t_stage_first_token_seconds_count', 'ttft_count', 'counter', '记录了首个输出时间的次数'),
+        ]
+        lines = []
+        for name, key, kind, help_text in metrics:
+            samples = [(stage, status, totals[key])
+                       for (stage, status), totals in sorted(self._totals.items()) if key in totals]
+            if not samples:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for stage, status, value in samples:
+                lines.append(f'{name}{{stage="{stage}",status="{status}"}} {value}')
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.path)
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            elif self._totals:
+                self._write_prometheus()
+
+
+_recorder: Optional[MetricsRecorder] = None
+_listeners: Tuple[Callable[[str, str, Dict], None], ...] = ()
+_local = threading.local()
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def configure(path: Optional[str], fmt: Optional[str] = None) -> Optional[MetricsRecorder]:
+    """启用指标输出；path 为空时关闭
+
+    扩展名为 .prom 时输出 Prometheus textfile，否则输出 JSON lines。
+    """
+    global _recorder
+    if _recorder is not None:
+        _recorder.close()
+        _recorder = None
+    if path:
+        _recorder = MetricsRecorder(path, fmt)
+        atexit.register(_recorder.close)
+    return _recorder
+
+
+def enabled() -> bool:
+    return _recorder is not None or bool(_listeners)
+
+
+def add_listener(callback: Callable[[str, str, Dict], None]):
+    """注册阶段事件回调 callback(stage, status, fields)，status 为 started / ok / error
+
+    回调在执行该阶段的线程中调用；在线程池中执行的阶段通过 bind() 保留提交时的上下文。
+    注册后即使没有启用指标输出也会创建 span（只通知回调）。
+    """
+    global _listeners
+    _listeners = _listeners + (callback,)
+
+
+def remove_listener(callback: Callable[[str, str, Dict], None]):
+    global _listeners
+    _listeners = tuple(cb for cb in _listeners if cb is not callback)
+
+
+def _notify(stage: str, status: str, fields: Dict):
+    for callback in _listeners:
+        try:
+            callback(stage, status, fields)
+        except Exception as e:
+            print(f"阶段事件回调失败: {str(e)}")
+
+
+def span(stage: str, **fields):
+    """记录一个阶段：with span('upload', bytes_in=size) as s: ...
+
+    未启用指标（且没有事件回调）时返回共享的空 span，不计时也不分配对象。
+    """
+    if _recorder is None and not _listeners:
+        return NOOP_SPAN
+    return Span(_recorder, stage, fields)
+
+
+def record(stage: str, duration: float, status: str = 'ok', **fields):
+    """直接记录一个已经计时的阶段（如批量任务中跨线程的整体耗时）"""
+    if _recorder is None and not _listeners:
+        return
+    entry = {'ts': round(time.time(), 3), 'stage': stage, 'status': status,
+             'duration_s': round(duration, 6)}
+    entry.update(fields)
+    if _recorder is not None:
+        _recorder.record(entry)
+    _notify(stage, status, entry)
+
+
+def bind(fn: Callable) -> Callable:
+    """在当前上下文（contextvars）的副本中执行 fn 的包装函数
+
+    提交到线程池或新线程的工作用它包装，阶段事件回调可以从上下文中识别所属的任务
+    （如 yt-t worker 正在处理的队列任务）。每次提交都要重新调用，一个副本不能同时在多个线程中使用。
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.run(fn, *args, **kwargs)
+    return run
+
+
+def current():
+    """当前线程中最内层的 span，没有时返回空 span（用于在下层记录重试次数等）"""
+    if _recorder is None and not _listeners:
+        return NOOP_SPAN
+    stack = _stack()
+    return stack[-1] if stack else NOOP_SPAN
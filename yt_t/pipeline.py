@@ -0,0 +1,174 @@
+import os
+from typing import Dict, Optional, TextIO, Tuple
+from . import metrics
+from .youtube import get_native_cues, NATIVE_FORMAT_VERSION
+from .cache import TranscriptCache, SOURCE_NATIVE, SOURCE_GEMINI
+from .cues import CueList, CueWriter, CUES_VERSION
+from .prompts import transcript_version
+from .archive import ArchiveWriter, TranscriptArchive
+from .utils import TranscriptWriter, open_transcript_writer
+
+# 未指定输出格式时各来源的默认格式（与之前的输出一致）
+DEFAULT_FORMATS = {
+    SOURCE_NATIVE: 'txt',
+    SOURCE_GEMINI: 'srt',
+}
+
+
+def gemini_cache_version() -> str:
+    """Gemini 转录结果的缓存版本（模型 + 提示词 + 字幕序列化格式）"""
+    return f"{transcript_version()}:{CUES_VERSION}"
+
+
+def get_cached_transcript(cache: Optional[TranscriptCache], video_id: str,
+                          language: str) -> Tuple[Optional[str], Optional[CueList]]:
+    """查询缓存中的字幕，依次检查原生字幕和 Gemini 转录结果
+
+    Returns:
+        (来源, 字幕)，未命中时为 (None, None)
+    """
+    if cache is None:
+        return None, None
+
+    data = cache.get(video_id, language, SOURCE_NATIVE, NATIVE_FORMAT_VERSION)
+    if data:
+        return SOURCE_NATIVE, CueList.from_json(data)
+
+    data = cache.get(video_id, language, SOURCE_GEMINI, gemini_cache_version())
+    if data:
+        return SOURCE_GEMINI, CueList.from_json(data)
+
+    return None, None
+
+
+def fetch_native_transcript(video_id: str, language: str,
+                            cache: Optional[TranscriptCache] = None) -> Optional[CueList]:
+    """获取原生字幕，成功时写入缓存"""
+    with metrics.span('native_subtitles', video_id=video_id) as span:
+        cues = get_native_cues(video_id, language)
+        span.set(cues=len(cues) if cues else 0)
+    if cues and cache is not None:
+        cache.put(video_id, language, SOURCE_NATIVE, NATIVE_FORMAT_VERSION, cues.to_json())
+    return cues
+
+
+def stream_gemini_transcript(url: str, video_id: str, language: str, writer: TranscriptWriter,
+                             cache: Optional[TranscriptCache] = None,
+                             output_format: Optional[str] = None, **kwargs) -> Optional[str]:
+    """使用 Gemini 转录，边生成边按 output_format 写入 writer，成功时写入缓存
+
+    其余关键字参数（如 video_info、segment_workers）原样传给 transcribe_with_gemini。
+    失败时保留已写出的部分内容（<文件名>.partial）。
+
+    Returns:
+        保存的文件路径，失败时返回 None
+    """
+    from .gemini import transcribe_with_gemini
+    video_info = kwargs.get('video_info') or {}
+    with metrics.span('gemini', video_id=video_id,
+                      audio_seconds=video_info.get('duration') or 0) as span:
+        try:
+            cues = transcribe_with_gemini(url, writer=writer,
+                                          output_format=output_format or DEFAULT_FORMATS[SOURCE_GEMINI],
+                                          **kwargs)
+        except BaseException:
+            writer.abort()
+            raise
+        span.set(bytes_out=writer.tell(), cues=len(cues) if cues else 0)
+        if not cues:
+            span.set(status='error')
+            partial_path = writer.abort()
+            if partial_path:
+                print(f"已生成的部分字幕保存在: {partial_path}")
+            return None
+
+        filepath = writer.commit()
+    if cache is not None:
+        cache.put(video_id, language, SOURCE_GEMINI, gemini_cache_version(), cues.to_json())
+    return filepath
+
+
+def resolve_video_info(url: str) -> Dict:
+    """获取视频信息，每个任务只调用一次，结果在各阶段之间共享
+
+    获取失败时返回空字典（而不是 None），后续阶段据此直接跳过，不会再次尝试解析。
+    """
+    from .video_utils import get_video_info
+    print("正在获取视频信息...")
+    with metrics.span('video_info') as span:
+        info = get_video_info(url) or {}
+        span.set(video_id=info.get('video_id'), audio_seconds=info.get('duration') or 0)
+    return info
+
+
+def open_cache(no_cache: bool = False, refresh_cache: bool = False) -> Tuple[Optional[TranscriptCache], bool]:
+    """根据命令行参数打开缓存
+
+    Returns:
+        (缓存对象, 是否读取缓存)；no_cache 时缓存对象为 None，refresh_cache 时只写不读
+    """
+    if no_cache:
+        return None, False
+    try:
+        return TranscriptCache(), not refresh_cache
+    except Exception as e:
+        print(f"无法打开字幕缓存，本次不使用缓存: {str(e)}")
+        return None, False
+
+
+def open_writer(video_id: str, url: str, output: Optional[str] = None,
+                output_dir: Optional[str] = None, video_info: Optional[Dict] = None,
+                stream: Optional[TextIO] = None,
+                output_format: Optional[str] = None,
+                archive: Optional[TranscriptArchive] = None,
+                source: str = SOURCE_GEMINI) -> TranscriptWriter:
+    """打开字幕输出
+
+    Args:
+        video_id: 视频ID
+        url: 原始视频地址
+        output: 输出文件路径（指定时直接写入该文件，不加文件头；为 - 时写到 stream）
+        output_dir: 输出目录（未指定 output 时使用）
+        video_info: 已获取的视频信息，提供时直接使用其中的标题
+        stream: output 为 - 时的输出流，默认标准输出
+        output_format: 明确指定的输出格式；srt / vtt / json 文件使用对应的扩展名且不加文件头
+        archive: 写入字幕归档而不是单独的文件（地址、标题等记录为归档的元数据，不加文件头）
+        source: 字幕来源，写入归档时记录来源和默认格式
+    """
+    if archive is not None:
+        return ArchiveWriter(archive, video_id, url, title=video_info.get('title') if video_info else None,
+                             fmt=output_format or DEFAULT_FORMATS[source], source=source)
+
+    if output:
+        # 如果指定了具体输出文件路径，直接使用
+        return TranscriptWriter(output, stream=stream)
+
+    # 使用默认保存逻辑，支持自定义输出目录
+    title = video_info.get('title') if video_info else None
+    return open_transcript_writer(video_id, url, output_dir, title=title,
+                                  extension=output_format or 'txt',
+                                  header=output_format in (None, 'txt'))
+
+
+def write_transcript(cues: CueList, video_id: str, url: str, output: Optional[str] = None,
+                     output_dir: Optional[str] = None, video_info: Optional[Dict] = None,
+                     stream: Optional[TextIO] = None, output_format: Optional[str] = None,
+                     source: str = SOURCE_NATIVE,
+                     archive: Optional[TranscriptArchive] = None) -> str:
+    """保存字幕
+
+    cues 按 output_format 写出，未指定时使用来源（source）的默认格式。其余参数同 open_writer。
+
+    Returns:
+        保存的文件路径（写入归档时为 归档目录#视频ID）
+    """
+    fmt = output_format or DEFAULT_FORMATS[source]
+    with metrics.span('save', video_id=video_id, format=fmt) as span:
+        writer = open_writer(video_id, url, output, output_dir, video_info, stream, output_format,
+                             archive=archive, source=source)
+        with writer:
+            sink = CueWriter(writer, fmt)
+            sink.write(cues)
+            sink.close()
+            span.set(bytes_out=writer.tell(), cues=len(cues))
+    return output or os.path.abspath(writer.path)
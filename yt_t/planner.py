@@ -0,0 +1,256 @@
+import os
+import math
+import time
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+from .cache import get_cache_dir
+from .jobs import Job, long_video_params
+from .scheduler import get_scheduler
+
+# 可选的加速倍数（atempo），从快到慢；统计数据相同时优先选择更快的倍数
+SPEEDS = (2.0, 1.5, 1.25, 1.0)
+
+# 每段（加速后）时长的范围（分钟）：上限受单次请求的输出长度限制，下限避免每段的固定开销占比过大
+MAX_SEGMENT_MINUTES = 50
+MIN_SEGMENT_MINUTES = 5
+
+# 没有足够统计数据时使用的延迟模型：每段固定开销（上传、排队、首个输出）和每分钟音频的生成耗时（秒）
+DEFAULT_OVERHEAD_SECONDS = 30.0
+DEFAULT_SECONDS_PER_MINUTE = 4.0
+DEFAULT_FAILURE_RATE = 0.05
+
+# 失败率的先验权重（相当于多少次默认失败率的尝试）；样本少时估计值接近默认失败率
+FAILURE_PRIOR_WEIGHT = 10
+
+# 拟合延迟模型至少需要的成功样本数，以及使用的最近样本数
+MIN_SAMPLES = 5
+MAX_SAMPLES = 200
+
+# 编码器填充和时间戳取整会让加速后的音频略长于计算值，估计分段数时留出的余量
+LENGTH_MARGIN = 1.01
+
+# 统计库最多保留的记录数
+MAX_ROWS = 5000
+
+
+def get_stats_path() -> str:
+    """统计库的路径，可通过 YT_T_STATS 环境变量覆盖"""
+    return os.environ.get("YT_T_STATS") or os.path.join(get_cache_dir(), "stats.sqlite")
+
+
+def fit_latency(samples: List[Tuple[float, float]]) -> Optional[Tuple[float, float]]:
+    """用最小二乘拟合 耗时 ≈ 固定开销 + 每分钟耗时 × 音频分钟数
+
+    Args:
+        samples: (音频分钟数, 耗时秒数) 列表
+
+    Returns:
+        (固定开销, 每分钟耗时)；样本不足时返回 None
+    """
+    if len(samples) < MIN_SAMPLES:
+        return None
+    n = len(samples)
+    mean_x = sum(x for x, _ in samples) / n
+    mean_y = sum(y for _, y in samples) / n
+    var_x = sum((x - mean_x) ** 2 for x, _ in samples)
+    if var_x < 1e-6:
+        # 分段时长都相同时无法区分固定开销和每分钟耗时，固定开销取默认值
+        overhead = min(DEFAULT_OVERHEAD_SECONDS, mean_y)
+        return overhead, max(0.1, (mean_y - overhead) / max(mean_x, 1e-6))
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in samples) / var_x
+    slope = max(0.1, slope)
+    return max(0.0, mean_y - slope * mean_x), slope
+
+
+class StatsStore:
+    """基于 SQLite 的 Gemini 分段转录统计
+
+    每次分段转录尝试记录一行：加速倍数、（加速后的）音频时长、耗时和是否成功。
+    分段计划根据最近的记录估计延迟模型和各加速倍数的失败率。
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        if path is None:
+            path = get_stats_path()
+        self.path = path
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS segment_stats (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                speed REAL NOT NULL,
+                audio_minutes REAL NOT NULL,
+                seconds REAL NOT NULL,
+                ok INTEGER NOT NULL,
+                recorded_at REAL NOT NULL
+            )"""
+        )
+        self._conn.commit()
+
+    def record(self, speed: float, audio_minutes: float, seconds: float, ok: bool):
+        """记录一次分段转录尝试"""
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO segment_stats (speed, audio_minutes, seconds, ok, recorded_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (speed, audio_minutes, seconds, int(ok), time.time())
+            )
+            self._conn.execute("DELETE FROM segment_stats WHERE id <= ?", (cur.lastrowid - MAX_ROWS,))
+            self._conn.commit()
+
+    def model(self) -> Dict:
+        """根据最近的记录估计延迟模型和失败率
+
+        Returns:
+            包含 latency（各加速倍数的 (固定开销, 每分钟耗时)）、failure（各加速倍数的失败率）
+            和 samples（各加速倍数的尝试次数）的字典
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT speed, audio_minutes, seconds, ok FROM segment_stats ORDER BY id DESC LIMIT ?",
+                (MAX_SAMPLES * len(SPEEDS),)
+            ).fetchall()
+
+        overall = fit_latency([(m, s) for _, m, s, ok in rows if ok][:MAX_SAMPLES])
+        latency, failure, samples = {}, {}, {}
+        for speed in SPEEDS:
+            attempts = [(m, s, ok) for sp, m, s, ok in rows if sp == speed][:MAX_SAMPLES]
+            failures = sum(1 for _, _, ok in attempts if not ok)
+            # 输出的字幕长度取决于原始时长，不同加速倍数下每分钟的耗时不同，样本足够时分别拟合
+            latency[speed] = (fit_latency([(m, s) for m, s, ok in attempts if ok]) or overall
+                              or (DEFAULT_OVERHEAD_SECONDS, DEFAULT_SECONDS_PER_MINUTE))
+            failure[speed] = ((failures + DEFAULT_FAILURE_RATE * FAILURE_PRIOR_WEIGHT)
+                              / (len(attempts) + FAILURE_PRIOR_WEIGHT))
+            samples[speed] = len(attempts)
+        return {'latency': latency, 'failure': failure, 'samples': samples}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_store: Optional[StatsStore] = None
+_store_lock = threading.Lock()
+
+
+def get_stats_store() -> Optional[StatsStore]:
+    """获取进程内共享的统计库，无法打开时返回 None（使用默认模型）"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            try:
+                _store = StatsStore()
+            except (OSError, sqlite3.Error) as e:
+                print(f"无法打开统计库，使用默认的分段参数模型: {str(e)}")
+                return None
+        return _store
+
+
+def record_attempt(speed: float, audio_minutes: float, seconds: float, ok: bool):
+    """记录一次分段转录尝试；写入失败不影响转录"""
+    store = get_stats_store()
+    if store is None:
+        return
+    try:
+        store.record(speed, audio_minutes, seconds, ok)
+    except sqlite3.Error as e:
+        print(f"记录转录统计失败: {str(e)}")
+
+
+def default_model() -> Dict:
+    """没有统计数据时的模型"""
+    return {
+        'latency': {s: (DEFAULT_OVERHEAD_SECONDS, DEFAULT_SECONDS_PER_MINUTE) for s in SPEEDS},
+        'failure': {s: DEFAULT_FAILURE_RATE for s in SPEEDS},
+        'samples': {s: 0 for s in SPEEDS},
+    }
+
+
+def count_segments(total_minutes: float, segment_minutes: int) -> int:
+    """按 segment_minutes 分段得到的段数（包括末尾可能多出的很短的一段）"""
+    return max(1, math.ceil(total_minutes * LENGTH_MARGIN / segment_minutes))
+
+
+def expected_seconds(total_minutes: float, segment_minutes: int, workers: int,
+                     latency: Tuple[float, float], failure_rate: float) -> float:
+    """估计按 segment_minutes 分段、workers 路并发时的转录总耗时（秒）
+
+    分段按 workers 个一批（一轮）并发转录，每轮的耗时是一段的耗时；
+    一轮中任何一段失败都要重试一次，这一轮的耗时加倍。分段越少每段越长，
+    分段越多轮数越多，失败重试的影响也随每段耗时和每轮的段数变化。
+    """
+    segments = count_segments(total_minutes, segment_minutes)
+    overhead, per_minute = latency
+    seconds = overhead + per_minute * min(segment_minutes, total_minutes)
+    batch = min(segments, workers)
+    retry = 1 - (1 - failure_rate) ** batch
+    return math.ceil(segments / workers) * seconds * (1 + retry)
+
+
+def available_workers(segment_workers: int) -> int:
+    """实际可用的并发数：分段并发数和当前 Gemini 生成请求的并发上限中较小的一个"""
+    return max(1, min(segment_workers, get_scheduler('generate').limiter.limit))
+
+
+def plan_segments(duration: float, workers: int, model: Optional[Dict] = None) -> Dict:
+    """选择预计总耗时最短的加速倍数和分段时长
+
+    Args:
+        duration: 视频时长（秒）
+        workers: 可用的并发数
+        model: StatsStore.model() 的返回值，默认读取统计库
+
+    Returns:
+        包含 speed、segment_minutes、segments 和 expected_seconds 的字典
+    """
+    if model is None:
+        store = get_stats_store()
+        try:
+            model = store.model() if store else default_model()
+        except sqlite3.Error as e:
+            print(f"读取转录统计失败: {str(e)}")
+            model = default_model()
+    workers = max(1, workers)
+
+    best = None
+    for speed in SPEEDS:
+        total_minutes = duration / speed / 60
+        lowest = max(1, min(MIN_SEGMENT_MINUTES, math.ceil(total_minutes)))
+        # 从长到短，预计耗时相差不到 1% 时保留更长的分段（请求更少）
+        for segment_minutes in range(MAX_SEGMENT_MINUTES, lowest - 1, -1):
+            seconds = expected_seconds(total_minutes, segment_minutes, workers,
+                                       model['latency'][speed], model['failure'][speed])
+            if best is None or seconds < best['expected_seconds'] * 0.99:
+                best = {
+                    'speed': speed,
+                    'segment_minutes': segment_minutes,
+                    'segments': count_segments(total_minutes, segment_minutes),
+                    'expected_seconds': seconds,
+                    'samples': model['samples'][speed],
+                }
+    return best
+
+
+def plan_long_video(video_id: str, duration: float, workers: int, audio_profile: str,
+                    remove_silence: bool = False, resume: bool = False) -> Dict:
+    """长视频任务的处理参数
+
+    继续已有任务时沿用任务记录的加速倍数和分段时长（已完成的分段仍然有效），
+    否则按当前的统计数据重新计划。
+    """
+    if resume:
+        saved = Job.saved_params(video_id)
+        if saved and saved == long_video_params(audio_profile, remove_silence, saved.get('speed'),
+                                                saved.get('segment_minutes')):
+            return saved
+
+    plan = plan_segments(duration, workers)
+    basis = f"依据 {plan['samples']} 次记录" if plan['samples'] else "尚无统计数据，使用默认模型"
+    print(f"分段计划: {plan['speed']}x 加速，每段 {plan['segment_minutes']} 分钟，共 {plan['segments']} 段，"
+          f"预计转录耗时 {plan['expected_seconds']:.0f} 秒（{basis}）")
+    return long_video_params(audio_profile, remove_silence, plan['speed'], plan['segment_minutes'])
@@ -0,0 +1,25 @@
+import hashlib
+
+GEMINI_MODEL = "gemini-2.5-flash"
+
+# SRT 格式提示词
+# source: https://x.com/Gorden_Sun/status/1947196262320844990
+SRT_PROMPT_TEMPLATE = """识别我上传的音频/视频里的文字，并提供可快速复制的srt格式的字幕文本，每句字幕必须使用 hh:mm:ss,xxx --> hh:mm:ss,xxx 的时间标记，尤其是每句字幕的截止时间也务必遵循格式。中文必须使用简体中文，不能出现繁体字{segment_info}。
+以下是一段示例字幕，用作格式参考：
+1
+00:00:00,347 --> 00:00:07,037
+有一个问题其实就是，以后现在和过去哪个其实是最重要的，
+
+2
+00:00:07,037 --> 00:00:11,107
+那我觉得是过去创造了现在，现在来决定未来，
+
+3
+00:00:11,107 --> 00:00:17,217
+那我觉得说我们能够把握的其实只有现在。"""
+
+
+def transcript_version() -> str:
+    """Gemini 转录结果的版本标识（模型 + 提示词），用于缓存键"""
+    prompt_hash = hashlib.sha256(SRT_PROMPT_TEMPLATE.encode('utf-8')).hexdigest()[:12]
+    return f"{GEMINI_MODEL}:{prompt_hash}"
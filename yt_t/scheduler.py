@@ -0,0 +1,169 @@
+import os
+import re
+import time
+import random
+import threading
+from typing import Any, Callable, Dict, Optional
+from . import metrics
+
+# 错误分类
+RATE_LIMIT = 'rate_limit'
+TRANSIENT = 'transient'
+FATAL = 'fatal'
+
+_TRANSIENT_CODES = {408, 500, 502, 503, 504}
+_RETRY_DELAY_PATTERN = re.compile(r"retry(?:Delay)?['\"]?\s*(?:in|:)?\s*['\"]?(\d+(?:\.\d+)?)\s*s", re.I)
+
+
+def classify_error(exc: BaseException) -> str:
+    """将 Gemini 调用的异常分为限流、临时错误和不可重试错误"""
+    code = getattr(exc, 'code', None)
+    if not isinstance(code, int):
+        code = getattr(getattr(exc, 'response', None), 'status_code', None)
+
+    message = str(exc)
+    if code == 429 or 'RESOURCE_EXHAUSTED' in message:
+        return RATE_LIMIT
+    if code in _TRANSIENT_CODES or 'UNAVAILABLE' in message or 'DEADLINE_EXCEEDED' in message:
+        return TRANSIENT
+    if isinstance(code, int):
+        return FATAL
+
+    # 没有状态码的网络错误（连接中断、超时、流式响应中途断开等）
+    try:
+        import httpx
+        if isinstance(exc, httpx.TransportError):
+            return TRANSIENT
+    except ImportError:
+        pass
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return TRANSIENT
+    return FATAL
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """从异常中读取服务端建议的重试等待时间（秒）"""
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if headers:
+        value = headers.get('retry-after')
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+
+    # google.rpc.RetryInfo，如 {"@type": "...RetryInfo", "retryDelay": "32s"}
+    details = getattr(exc, 'details', None)
+    match = _RETRY_DELAY_PATTERN.search(str(details) if details else str(exc))
+    if match:
+        return float(match.group(1))
+    return None
+
+
+class AIMDLimiter:
+    """AIMD 并发限制
+
+    成功时线性增加并发上限（每个完整窗口约 +1），被限流时按比例减小；
+    同一冷却时间内的多次限流只减小一次，避免并发请求同时失败时上限骤降。
+    """
+
+    def __init__(self, initial: float = 4, minimum: float = 1, maximum: float = 16,
+                 decrease: float = 0.5, cooldown: float = 5.0):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self._limit = float(max(minimum, min(initial, maximum)))
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def acquire(self):
+        with self._cond:
+            while self._in_flight >= int(self._limit):
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self, outcome: Optional[str] = None):
+        """释放一个并发名额，outcome 为 None 表示成功"""
+        with self._cond:
+            self._in_flight -= 1
+            if outcome is None:
+                self._limit = min(self.maximum, self._limit + 1.0 / self._limit)
+            elif outcome == RATE_LIMIT:
+                now = time.monotonic()
+                if now - self._last_decrease >= self.cooldown and self._limit > self.minimum:
+                    self._limit = max(self.minimum, self._limit * self.decrease)
+                    self._last_decrease = now
+                    print(f"Gemini 请求被限流，并发上限降至 {self.limit}")
+            self._cond.notify_all()
+
+
+class RequestScheduler:
+    """Gemini 请求调度
+
+    所有请求经过同一个 AIMD 并发限制；限流和临时错误按指数退避（带随机抖动）重试，
+    服务端给出重试等待时间时以其为下限；不可重试的错误直接抛出。
+    """
+
+    def __init__(self, limiter: Optional[AIMDLimiter] = None, max_attempts: int = 6,
+                 base_delay: float = 1.0, max_delay: float = 60.0):
+        self.limiter = limiter or AIMDLimiter()
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt: int, exc: BaseException) -> float:
+        """第 attempt 次失败后的等待时间"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        hint = retry_after(exc)
+        if hint is not None:
+            delay = max(delay, hint)
+        return delay
+
+    def call(self, fn: Callable[..., Any], *args, description: str = "Gemini 请求", **kwargs) -> Any:
+        """执行请求，失败时按错误类型重试"""
+        attempt = 0
+        while True:
+            attempt += 1
+            self.limiter.acquire()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                kind = classify_error(e)
+                self.limiter.release(kind)
+                if kind == FATAL or attempt >= self.max_attempts:
+                    raise
+                delay = self.backoff(attempt, e)
+                metrics.current().add('retries')
+                print(f"{description}失败（{kind}），{delay:.1f} 秒后重试"
+                      f"（{attempt}/{self.max_attempts}）: {str(e)[:200]}")
+                time.sleep(delay)
+                continue
+            self.limiter.release()
+            return result
+
+
+_schedulers: Dict[str, RequestScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(name: str = 'generate') -> RequestScheduler:
+    """获取进程内共享的请求调度器
+
+    不同类型的请求（如上传和生成）使用各自的并发限制。初始并发和最大并发
+    可通过 YT_T_GEMINI_CONCURRENCY 和 YT_T_GEMINI_MAX_CONCURRENCY 环境变量设置。
+    """
+    with _schedulers_lock:
+        scheduler = _schedulers.get(name)
+        if scheduler is None:
+            initial = float(os.environ.get("YT_T_GEMINI_CONCURRENCY", 4))
+            maximum = float(os.environ.get("YT_T_GEMINI_MAX_CONCURRENCY", 16))
+            scheduler = RequestScheduler(AIMDLimiter(initial=initial, maximum=maximum))
+            _schedulers[name] = scheduler
+        return scheduler
@@ -0,0 +1,367 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+from typing import Dict, Iterator, List, Optional, Tuple
+from .cache import get_cache_dir
+from .cues import CueList, FORMATS, parse_srt
+
+# 文件头（utils.transcript_header）中的字段
+HEADER_FIELDS = {
+    '原始视频地址': 'url',
+    '视频ID': 'video_id',
+    '视频标题': 'title',
+    '生成时间': 'generated_at',
+}
+
+# 每处理这么多个文件提交一次事务
+COMMIT_EVERY = 500
+
+# cues 表的 rowid 为 (文件ID << CUE_ROWID_BITS) + 序号：按文件删除字幕时只需按 rowid 范围删除，
+# 不必扫描整个 FTS 表；每个文件最多索引 2^20 条字幕
+CUE_ROWID_BITS = 20
+
+# txt 格式的字幕行，如 [01:23] 文本；超过一小时时分钟数大于 59
+_CUE_LINE = re.compile(r'^\[(\d+):(\d{2})(?::(\d{2}))?\]\s?(.*)$')
+
+# srt / vtt 的时间行，如 00:01:02,000 --> 00:01:05,000
+_TIMING_LINE = re.compile(r'^\s*\d[\d:.,]*\s*-->\s*\d', re.M)
+
+# json 格式的字幕为对象数组（txt 格式的行也以 [ 开头）
+_JSON_BODY = re.compile(r'^\s*\[\s*(?:\{|\])')
+
+# 未写文件头时，从默认文件名中取视频ID：youtube_transcript_<ID>.srt 或 <标题>_transcript_<ID>_<时间>.srt
+_FILENAME_ID = re.compile(r'_transcript_([0-9A-Za-z_-]{11})(?:_\d{8}_\d{6})?\.')
+
+
+def get_index_path() -> str:
+    """搜索索引的路径，可通过 YT_T_SEARCH_INDEX 环境变量覆盖"""
+    return os.environ.get("YT_T_SEARCH_INDEX") or os.path.join(get_cache_dir(), "search.sqlite")
+
+
+def parse_header(text: str) -> Tuple[Dict, str]:
+    """解析保存字幕时写入的文件头
+
+    Returns:
+        (字段字典, 文件头之后的内容)；没有文件头时字段为空，内容为原文
+    """
+    if not text.startswith('原始视频地址:'):
+        return {}, text
+    fields = {}
+    lines = text.split('\n')
+    for i, line in enumerate(lines):
+        if line.startswith('=' * 10):
+            return fields, '\n'.join(lines[i + 1:])
+        key, sep, value = line.partition(':')
+        if sep and key in HEADER_FIELDS:
+            fields[HEADER_FIELDS[key]] = value.strip()
+    return fields, ''
+
+
+def parse_txt_cues(text: str) -> CueList:
+    """解析 `[mm:ss] 文本` 格式的字幕，不以时间开头的行并入上一条"""
+    cues = CueList()
+    for line in text.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        match = _CUE_LINE.match(line)
+        if match:
+            first, second, third, content = match.groups()
+            if third is None:
+                start = int(first) * 60 + int(second)
+            else:
+                start = int(first) * 3600 + int(second) * 60 + int(third)
+            cues.append(start, start, content)
+        elif len(cues):
+            cues.texts[-1] += ' ' + line
+    return cues
+
+
+def detect_format(body: str, extension: str = '') -> str:
+    """根据内容判断字幕格式
+
+    默认（未指定 --format）时 Gemini 转录的 SRT 内容保存在带文件头的 .txt 文件中，
+    因此有时间行时按 srt / vtt 处理，而不是按扩展名。
+    """
+    if extension == 'json' or _JSON_BODY.match(body):
+        return 'json'
+    if _TIMING_LINE.search(body):
+        return 'vtt' if body.lstrip().startswith('WEBVTT') else 'srt'
+    return 'txt'
+
+
+def parse_json_cues(text: str) -> CueList:
+    cues = CueList()
+    try:
+        for entry in json.loads(text):
+            cues.append(float(entry['start']), float(entry.get('end', entry['start'])), entry['text'])
+    except (ValueError, KeyError, TypeError):
+        return CueList()
+    return cues
+
+
+def parse_body(body: str, extension: str = '') -> CueList:
+    """按内容选择解析器解析字幕正文，解析不出字幕时再尝试其他格式"""
+    parsers = {'json': parse_json_cues, 'srt': parse_srt, 'vtt': parse_srt, 'txt': parse_txt_cues}
+    fmt = detect_format(body, extension)
+    cues = parsers[fmt](body)
+    if not len(cues) and fmt != 'json':
+        cues = parse_txt_cues(body) if fmt in ('srt', 'vtt') else parse_srt(body)
+    return cues
+
+
+def parse_transcript_file(path: str, text: str) -> Dict:
+    """解析保存的字幕文件（txt / srt / vtt / json，可以带文件头）
+
+    Returns:
+        {'url', 'video_id', 'title', 'generated_at', 'cues'}，文件中没有的字段为 None
+    """
+    fields, body = parse_header(text)
+    cues = parse_body(body, os.path.splitext(path)[1].lstrip('.').lower())
+
+    video_id = fields.get('video_id')
+    if not video_id:
+        match = _FILENAME_ID.search(os.path.basename(path))
+        video_id = match.group(1) if match else None
+    return {
+        'url': fields.get('url'),
+        'video_id': video_id,
+        'title': fields.get('title'),
+        'generated_at': fields.get('generated_at'),
+        'cues': cues,
+    }
+
+
+def deep_link(video_id: str, start_ms: int) -> str:
+    """跳转到指定时间的视频链接（YouTube 的 t 参数精确到秒）"""
+    return f"https://www.youtube.com/watch?v={video_id}&t={start_ms // 1000}s"
+
+
+def iter_transcript_files(directory: str) -> Iterator[os.DirEntry]:
+    """递归列出目录中的字幕文件，跳过正在写入的临时文件和 .partial 文件"""
+    extensions = tuple(f'.{fmt}' for fmt in FORMATS)
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        if entry.name.startswith('.'):
+            continue
+        if entry.is_dir(follow_symlinks=False):
+            yield from iter_transcript_files(entry.path)
+        elif entry.is_file() and entry.name.lower().endswith(extensions):
+            yield entry
+
+
+class SearchIndex:
+    """字幕全文索引（SQLite FTS5）
+
+    files 表记录每个已索引文件的修改时间、大小、内容哈希和文件头字段；
+    cues 为 FTS5 表，每条字幕一行，保存文本和开始时间（毫秒），rowid 中包含所属文件的ID。
+    支持 trigram 分词器时使用 trigram（可以搜索中文等不以空格分词的文字中的任意片段），
+    否则使用 unicode61。
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        if path is None:
+            path = get_index_path()
+        self.path = path
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                sha1 TEXT NOT NULL,
+                video_id TEXT,
+                url TEXT,
+                title TEXT,
+                generated_at TEXT,
+                cue_count INTEGER NOT NULL,
+                indexed_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_files_video ON files (video_id)")
+        exists = self._conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'cues'"
+        ).fetchone()
+        if exists:
+            self.tokenizer = 'trigram' if 'trigram' in exists[0] else 'unicode61'
+        else:
+            self.tokenizer = self._create_cues_table()
+        self._conn.commit()
+
+    def _create_cues_table(self) -> str:
+        for tokenizer in ('trigram', 'unicode61'):
+            try:
+                self._conn.execute(
+                    f"""CREATE VIRTUAL TABLE cues USING fts5(
+                        text, start_ms UNINDEXED, tokenize='{tokenizer}'
+                    )"""
+                )
+                return tokenizer
+            except sqlite3.OperationalError:
+                # 旧版 SQLite（< 3.34）没有 trigram 分词器
+                continue
+        raise RuntimeError("SQLite 不支持 FTS5，无法建立搜索索引")
+
+    def update(self, directory: str, prune: bool = True) -> Dict:
+        """增量索引目录中的字幕文件
+
+        修改时间和大小都没变的文件直接跳过，不读取内容；变化的文件比较内容哈希，
+        内容不同时重新解析。prune 时删除已不存在的文件的索引。
+
+        既没有文件头也无法从文件名得到视频ID的文件（如用 -o 指定路径保存的 srt）无法生成
+        跳转链接，不索引，计入 skipped。
+
+        Returns:
+            {'scanned', 'added', 'updated', 'unchanged', 'removed', 'skipped', 'failed'}
+        """
+        known = {
+            row[0]: row[1:]
+            for row in self._conn.execute("SELECT path, id, mtime_ns, size, sha1 FROM files")
+        }
+        stats = {'scanned': 0, 'added': 0, 'updated': 0, 'unchanged': 0, 'removed': 0, 'skipped': 0,
+                 'failed': 0}
+        seen = set()
+        pending = 0
+        for entry in iter_transcript_files(directory):
+            path = os.path.abspath(entry.path)
+            seen.add(path)
+            stats['scanned'] += 1
+            st = entry.stat()
+            previous = known.get(path)
+            if previous and previous[1] == st.st_mtime_ns and previous[2] == st.st_size:
+                stats['unchanged'] += 1
+                continue
+
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            except OSError as e:
+                print(f"读取失败: {path}: {str(e)}")
+                stats['failed'] += 1
+                continue
+            sha1 = hashlib.sha1(data).hexdigest()
+            if previous and previous[3] == sha1:
+                # 内容没变（如被复制或 touch），只更新修改时间
+                self._conn.execute("UPDATE files SET mtime_ns = ?, size = ? WHERE id = ?",
+                                   (st.st_mtime_ns, st.st_size, previous[0]))
+                stats['unchanged'] += 1
+            else:
+                parsed = parse_transcript_file(path, data.decode('utf-8', errors='replace'))
+                if not parsed['video_id']:
+                    if previous:
+                        self._remove(previous[0])
+                    stats['skipped'] += 1
+                    continue
+                self._store(path, previous[0] if previous else None, st, sha1, parsed)
+                stats['updated' if previous else 'added'] += 1
+
+            pending += 1
+            if pending >= COMMIT_EVERY:
+                self._conn.commit()
+                pending = 0
+
+        if prune:
+            root = os.path.abspath(directory) + os.sep
+            for path, row in known.items():
+                if path.startswith(root) and path not in seen:
+                    self._remove(row[0])
+                    stats['removed'] += 1
+        self._conn.commit()
+        return stats
+
+    def _store(self, path: str, file_id: Optional[int], st: os.stat_result, sha1: str, parsed: Dict):
+        cues: CueList = parsed['cues']
+        values = (st.st_mtime_ns, st.st_size, sha1, parsed['video_id'], parsed['url'],
+                  parsed['title'], parsed['generated_at'], len(cues), time.time())
+        if file_id is None:
+            file_id = self._conn.execute(
+                """INSERT INTO files (mtime_ns, size, sha1, video_id, url, title, generated_at,
+                                      cue_count, indexed_at, path)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                values + (path,),
+            ).lastrowid
+        else:
+            self._conn.execute(
+                """UPDATE files SET mtime_ns = ?, size = ?, sha1 = ?, video_id = ?, url = ?, title = ?,
+                                    generated_at = ?, cue_count = ?, indexed_at = ?
+                   WHERE id = ?""",
+                values + (file_id,),
+            )
+            self._delete_cues(file_id)
+        base = file_id << CUE_ROWID_BITS
+        self._conn.executemany(
+            "INSERT INTO cues (rowid, text, start_ms) VALUES (?, ?, ?)",
+            ((base + i, text, int(round(start * 1000)))
+             for i, (start, _, text) in enumerate(cues) if i < 1 << CUE_ROWID_BITS),
+        )
+
+    def _delete_cues(self, file_id: int):
+        self._conn.execute("DELETE FROM cues WHERE rowid >= ? AND rowid < ?",
+                           (file_id << CUE_ROWID_BITS, (file_id + 1) << CUE_ROWID_BITS))
+
+    def _remove(self, file_id: int):
+        self._delete_cues(file_id)
+        self._conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def search(self, query: str, limit: int = 20, video_id: Optional[str] = None) -> List[Dict]:
+        """搜索包含 query（作为整个短语）的字幕
+
+        Returns:
+            按相关度排列的结果 [{'video_id', 'title', 'path', 'start_ms', 'timestamp', 'text', 'link'}, ...]
+        """
+        query = query.strip()
+        if not query:
+            return []
+        if self.tokenizer == 'trigram' and len(query) < 3:
+            # trigram 索引无法匹配少于 3 个字符的查询，退回逐行扫描
+            condition = "cues.text LIKE ? ESCAPE '\\'"
+            param = '%' + re.sub(r'([%_\\])', r'\\\1', query) + '%'
+            order = "cues.rowid"
+        else:
+            condition = "cues MATCH ?"
+            param = '"' + query.replace('"', '""') + '"'
+            order = "cues.rank"
+
+        sql = f"""SELECT files.video_id, files.title, files.path, cues.start_ms, cues.text
+                  FROM cues JOIN files ON files.id = (cues.rowid >> {CUE_ROWID_BITS})
+                  WHERE {condition}"""
+        params = [param]
+        if video_id:
+            sql += " AND files.video_id = ?"
+            params.append(video_id)
+        sql += f" ORDER BY {order} LIMIT ?"
+        params.append(limit)
+
+        results = []
+        for vid, title, path, start_ms, text in self._conn.execute(sql, params):
+            seconds = start_ms // 1000
+            results.append({
+                'video_id': vid,
+                'title': title,
+                'path': path,
+                'start_ms': start_ms,
+                'timestamp': f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}",
+                'text': text,
+                'link': deep_link(vid, start_ms) if vid else None,
+            })
+        return results
+
+    def stats(self) -> Dict:
+        files, cues = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(cue_count), 0) FROM files"
+        ).fetchone()
+        return {'files': files, 'cues': cues, 'tokenizer': self.tokenizer}
+
+    def close(self):
+        self._conn.close()
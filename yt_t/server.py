@@ -0,0 +1,275 @@
+import os
+import json
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import urlparse, parse_qs
+from .youtube import extract_video_id
+from .batch import BatchRunner, snapshot
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# 内存中最多保留的已结束任务数，超出时丢弃最早的
+MAX_FINISHED_JOBS = 1000
+
+# 请求体大小上限
+MAX_BODY_BYTES = 1024 * 1024
+
+# 跟随输出部分字幕时检查文件的间隔（秒）
+FOLLOW_POLL_SECONDS = 0.5
+
+CONTENT_TYPES = {
+    '.txt': 'text/plain; charset=utf-8',
+    '.srt': 'application/x-subrip; charset=utf-8',
+    '.vtt': 'text/vtt; charset=utf-8',
+    '.json': 'application/json; charset=utf-8',
+}
+
+
+def warm_up():
+    """预先导入并初始化耗时的依赖，使第一个任务不必等待"""
+    import yt_dlp  # noqa: F401
+    import youtube_transcript_api  # noqa: F401
+    from .uploads import get_upload_registry
+    get_upload_registry()
+    if os.environ.get("GEMINI_API_KEY"):
+        from .gemini import get_client
+        get_client()
+
+
+class TranscriptionService:
+    """常驻进程中的任务队列
+
+    任务交给共享的 BatchRunner 处理（原生字幕和 Gemini 各自的线程池即为队列），
+    Gemini 客户端、yt-dlp 提取器、缓存和上传登记表在任务之间复用。
+    任务状态只保存在内存中，进程重启后丢失（长视频的分段进度仍在任务目录中，可以 resume）。
+    """
+
+    def __init__(self, runner: BatchRunner, max_finished: int = MAX_FINISHED_JOBS):
+        self.runner = runner
+        self.max_finished = max_finished
+        self._jobs: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, url: str) -> Dict:
+        """提交一个 URL；同一视频已有未结束的任务时返回该任务，不重复处理"""
+        video_id = extract_video_id(url)
+        with self._lock:
+            for job in self._jobs.values():
+                if video_id and job['video_id'] == video_id and not job['future'].done():
+                    return job
+            result, future = self.runner.submit(url)
+            job = {'id': uuid.uuid4().hex[:12], 'submitted_at': time.time(), 'result': result,
+                   'future': future, 'video_id': video_id}
+            self._jobs[job['id']] = job
+            self._evict()
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[Dict]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def _evict(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job['future'].done()]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    def close(self):
+        self.runner.shutdown(cancel_pending=True)
+
+
+def job_state(job: Dict) -> str:
+    """queued / running / done / failed"""
+    future: Future = job['future']
+    if future.done():
+        if not future.cancelled() and future.exception() is None and job['result']['status'] == 'ok':
+            return 'done'
+        return 'failed'
+    return 'queued' if job['result']['stage'] == 'queued' else 'running'
+
+
+def job_view(job: Dict) -> Dict:
+    # 结果字典由工作线程原地更新，先复制再遍历
+    result = snapshot(job['result'])
+    view = {'id': job['id'], 'state': job_state(job), 'submitted_at': round(job['submitted_at'], 3)}
+    view.update({key: value for key, value in result.items() if key not in ('status', 'partial_path')})
+    future: Future = job['future']
+    if future.done() and not future.cancelled() and future.exception() is not None:
+        view['error'] = str(future.exception())
+    view['partial'] = bool(result.get('partial_path'))
+    return view
+
+
+def _read_from(path: str, offset: int):
+    """从 offset 开始读取文件新增的内容
+
+    每次重新打开文件，不长时间占用正在写入的文件（Windows 上会阻止写入完成后的重命名）。
+
+    Returns:
+        (新内容, 新的 offset)；文件变短（生成重试、输出从头开始）时从头读取
+    """
+    try:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < offset:
+                offset = 0
+            f.seek(offset)
+            data = f.read()
+    except FileNotFoundError:
+        return b'', offset
+    return data, offset + len(data)
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """HTTP 接口
+
+    POST /jobs                      提交任务，请求体 {"url": "..."} 或 {"urls": [...]}
+    GET  /jobs                      所有任务的状态
+    GET  /jobs/<id>                 任务状态
+    GET  /jobs/<id>/transcript      字幕内容；任务进行中时返回已生成的部分
+    GET  /jobs/<id>/transcript?follow=1  持续输出字幕，直到任务结束（chunked）
+    GET  /health                    服务状态
+    """
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'yt-t'
+
+    @property
+    def service(self) -> TranscriptionService:
+        return self.server.service
+
+    def log_message(self, format, *args):
+        print(f"{self.address_string()} {format % args}")
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        parts = [p for p in parsed.path.split('/') if p]
+        query = parse_qs(parsed.query)
+
+        if parts == ['health']:
+            states = [job_state(job) for job in self.service.list()]
+            return self._send_json(200, {
+                'status': 'ok',
+                'jobs': {state: states.count(state) for state in ('queued', 'running', 'done', 'failed')},
+            })
+        if parts == ['jobs']:
+            return self._send_json(200, {'jobs': [job_view(job) for job in self.service.list()]})
+        if len(parts) in (2, 3) and parts[0] == 'jobs':
+            job = self.service.get(parts[1])
+            if job is None:
+                return self._send_json(404, {'error': '任务不存在'})
+            if len(parts) == 2:
+                return self._send_json(200, job_view(job))
+            if parts[2] == 'transcript':
+                if query.get('follow', ['0'])[0] not in ('0', 'false', ''):
+                    return self._follow_transcript(job)
+                return self._send_transcript(job)
+        self._send_json(404, {'error': '未知的路径'})
+
+    def do_POST(self):
+        if urlparse(self.path).path.rstrip('/') != '/jobs':
+            return self._send_json(404, {'error': '未知的路径'})
+
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY_BYTES:
+            return self._send_json(413, {'error': '请求体过大'})
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return self._send_json(400, {'error': '请求体不是有效的 JSON'})
+
+        urls = body.get('urls') if isinstance(body, dict) else None
+        single = urls is None
+        if single:
+            urls = [body.get('url')] if isinstance(body, dict) else []
+        if not urls or not all(isinstance(u, str) and extract_video_id(u) for u in urls):
+            return self._send_json(400, {'error': '需要有效的 YouTube 视频 URL（url 或 urls）'})
+
+        jobs = [job_view(self.service.submit(url)) for url in urls]
+        if single:
+            return self._send_json(202, jobs[0], headers={'Location': f"/jobs/{jobs[0]['id']}"})
+        self._send_json(202, {'jobs': jobs})
+
+    def _send_json(self, status: int, obj: Dict, headers: Optional[Dict] = None):
+        data = json.dumps(obj, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_transcript(self, job: Dict):
+        state = job_state(job)
+        result = snapshot(job['result'])
+        path = result['path'] if state == 'done' else result.get('partial_path')
+        data, _ = _read_from(path, 0) if path else (b'', 0)
+        if not data:
+            return self._send_json(409, {'error': '字幕尚未生成', 'state': state})
+
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPES.get(os.path.splitext(result['path'] or path)[1],
+                                                           CONTENT_TYPES['.txt']))
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('X-Job-State', state)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _follow_transcript(self, job: Dict):
+        """边生成边输出字幕：定期读取正在写入的文件的新内容，任务结束后输出剩余部分"""
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPES['.txt'])
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        offset = 0
+        try:
+            while True:
+                finished = job['future'].done()
+                result = snapshot(job['result'])
+                path = result['path'] if finished else result.get('partial_path')
+                if path:
+                    data, offset = _read_from(path, offset)
+                    if data:
+                        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+                        self.wfile.flush()
+                if finished:
+                    break
+                time.sleep(FOLLOW_POLL_SECONDS)
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端已断开
+            self.close_connection = True
+
+
+class TranscriptionServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service: TranscriptionService):
+        super().__init__(address, RequestHandler)
+        self.service = service
+
+
+def serve(runner: BatchRunner, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+    """启动 HTTP 服务，直到收到 Ctrl+C"""
+    print("正在预加载依赖...")
+    warm_up()
+    service = TranscriptionService(runner)
+    server = TranscriptionServer((host, port), service)
+    print(f"yt-t 服务已启动: http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n正在停止服务，等待进行中的任务结束...")
+    finally:
+        server.server_close()
+        service.close()
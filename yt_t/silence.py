@@ -0,0 +1,228 @@
+import os
+import bisect
+import subprocess
+from typing import List, Optional, Sequence, Tuple
+from . import metrics
+from .cues import CueList
+
+# 静音检测参数
+SAMPLE_RATE = 16000          # 解码为 16kHz 单声道 PCM 进行分析
+FRAME_SECONDS = 0.03         # 每帧 30ms
+MIN_SILENCE_SECONDS = 1.0    # 只裁掉不短于该时长的静音
+PADDING_SECONDS = 0.25       # 每段保留区域两侧多保留的时长，避免切掉字词的开头和结尾
+THRESHOLD_MARGIN_DB = 10.0   # 静音阈值：噪声底（第 10 百分位的帧能量）之上的分贝数
+MIN_THRESHOLD_DB = -50.0     # 静音阈值的下限（dBFS），低于该能量的帧总是视为静音
+MAX_THRESHOLD_DB = -25.0     # 静音阈值的上限（dBFS），避免噪声较大的录音被整段判为静音
+MIN_CUT_SECONDS = 1.0        # 保留区域之间短于该时长的间隔不裁剪，两侧区域合并
+MAX_REGIONS = 1000           # 保留区域的数量上限，超过时从最短的间隔开始合并
+
+# 每次从 ffmpeg 读取的帧数
+_READ_FRAMES = 4096
+
+
+def check_numpy() -> bool:
+    """检查是否安装了 numpy（静音裁剪需要）"""
+    try:
+        import numpy  # noqa: F401
+        return True
+    except ImportError:
+        print("错误: 静音裁剪需要 numpy。请先安装:")
+        print("  pip install 'yt-t[silence]'  或  pip install numpy")
+        return False
+
+
+class RemapTable:
+    """裁剪静音后的时间与原始音频时间的对应关系
+
+    记录保留的各个区域 (原始开始时间, 原始结束时间)；裁剪后的音频由这些区域依次拼接而成。
+    """
+
+    def __init__(self, regions: Sequence[Tuple[float, float]]):
+        self.regions = [(float(start), float(end)) for start, end in regions]
+        # 每个保留区域在裁剪后音频中的起点
+        self.offsets = []
+        total = 0.0
+        for start, end in self.regions:
+            self.offsets.append(total)
+            total += end - start
+        self.duration = total
+
+    def to_original(self, t: float) -> float:
+        """裁剪后音频中的时间 -> 原始音频中的时间"""
+        if not self.regions:
+            return t
+        i = max(0, bisect.bisect_right(self.offsets, t) - 1)
+        return self.regions[i][0] + (t - self.offsets[i])
+
+    def apply(self, cues: CueList) -> CueList:
+        """把字幕时间从裁剪后的时间轴换算到原始时间轴
+
+        字幕按时间排序时只需顺序扫描一遍保留区域。
+        """
+        if not self.regions:
+            return cues
+        offsets, regions = self.offsets, self.regions
+        last = len(regions) - 1
+
+        def mapped(times):
+            result = []
+            i = 0
+            previous = None
+            for t in times:
+                if previous is None or t < previous:
+                    i = max(0, bisect.bisect_right(offsets, t) - 1)
+                else:
+                    while i < last and offsets[i + 1] <= t:
+                        i += 1
+                previous = t
+                result.append(regions[i][0] + (t - offsets[i]))
+            return result
+
+        return CueList(mapped(cues.starts), mapped(cues.ends), cues.texts)
+
+    def filter_expression(self) -> str:
+        """保留这些区域的 ffmpeg aselect 表达式
+
+        区域按时间排序，表达式为按开始时间二分的 if(lt(t,x),左,右) 树，
+        每个音频帧只需计算 O(log 区域数) 个比较，而不是逐个区域判断。
+        """
+        def node(lo: int, hi: int) -> str:
+            if hi - lo == 1:
+                start, end = self.regions[lo]
+                return f"between(t,{start:.3f},{end:.3f})"
+            mid = (lo + hi) // 2
+            return f"if(lt(t,{self.regions[mid][0]:.3f}),{node(lo, mid)},{node(mid, hi)})"
+
+        return node(0, len(self.regions)) if self.regions else '1'
+
+    def to_list(self) -> List[List[float]]:
+        return [[start, end] for start, end in self.regions]
+
+
+def merge_regions(regions: Sequence[Tuple[float, float]], min_gap: float = MIN_CUT_SECONDS,
+                  max_regions: int = MAX_REGIONS) -> List[Tuple[float, float]]:
+    """合并间隔较短的保留区域
+
+    间隔短于 min_gap 的相邻区域合并；区域数仍超过 max_regions 时只裁掉最长的 max_regions - 1 个间隔。
+    """
+    if not regions:
+        return []
+    gaps = [(regions[i + 1][0] - regions[i][1], i) for i in range(len(regions) - 1)]
+    cuts = sorted((gap for gap in gaps if gap[0] >= min_gap), reverse=True)[:max(0, max_regions - 1)]
+    cut_after = {i for _, i in cuts}
+
+    merged = []
+    start = regions[0][0]
+    for i, (_, end) in enumerate(regions):
+        if i in cut_after or i == len(regions) - 1:
+            merged.append((start, end))
+            if i + 1 < len(regions):
+                start = regions[i + 1][0]
+    return merged
+
+
+def frame_levels(audio_path: str, sample_rate: int = SAMPLE_RATE,
+                 frame_seconds: float = FRAME_SECONDS):
+    """解码音频并计算每帧的能量（dBFS）
+
+    ffmpeg 输出 16 位单声道 PCM，按块读取并整块计算，不把整段 PCM 保留在内存中。
+
+    Returns:
+        每帧能量的 numpy 数组
+    """
+    import numpy as np
+
+    frame_length = max(1, int(sample_rate * frame_seconds))
+    chunk_bytes = frame_length * 2 * _READ_FRAMES
+    cmd = [
+        'ffmpeg', '-loglevel', 'error', '-i', audio_path, '-vn',
+        '-ac', '1', '-ar', str(sample_rate), '-f', 's16le', '-'
+    ]
+
+    levels = []
+    remainder = b''
+    process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE)
+    try:
+        while True:
+            data = process.stdout.read(chunk_bytes)
+            if not data:
+                break
+            data = remainder + data
+            usable = len(data) - len(data) % (frame_length * 2)
+            remainder = data[usable:]
+            if not usable:
+                continue
+            samples = np.frombuffer(data[:usable], dtype='<i2').astype(np.float32)
+            frames = samples.reshape(-1, frame_length)
+            rms = np.sqrt(np.mean(frames * frames, axis=1))
+            levels.append(20 * np.log10(rms / 32768.0 + 1e-10))
+        stderr = process.stderr.read()
+    finally:
+        process.stdout.close()
+        process.wait()
+
+    if process.returncode != 0:
+        message = stderr.decode(errors='replace')
+        print(f"音频解码失败: {message}")
+        raise subprocess.CalledProcessError(process.returncode, cmd, stderr=message)
+
+    return np.concatenate(levels) if levels else np.zeros(0, dtype=np.float32)
+
+
+def detect_speech_regions(audio_path: str, min_silence: float = MIN_SILENCE_SECONDS,
+                          padding: float = PADDING_SECONDS,
+                          margin_db: float = THRESHOLD_MARGIN_DB) -> Optional[RemapTable]:
+    """检测音频中需要保留的区域（裁掉较长的静音）
+
+    能量低于阈值的帧视为静音，阈值取噪声底之上 margin_db 分贝（限制在
+    MIN_THRESHOLD_DB 到 MAX_THRESHOLD_DB 之间）；连续静音不短于 min_silence
+    时裁掉（两侧各保留 padding）。
+
+    Returns:
+        保留区域的 RemapTable；没有可裁剪的静音时返回 None
+    """
+    import numpy as np
+
+    with metrics.span('detect_silence') as span:
+        levels = frame_levels(audio_path)
+        if span.active:
+            span.set(bytes_in=os.path.getsize(audio_path), audio_seconds=len(levels) * FRAME_SECONDS)
+    if not len(levels):
+        return None
+
+    noise_floor = float(np.percentile(levels, 10))
+    threshold = max(MIN_THRESHOLD_DB, min(noise_floor + margin_db, MAX_THRESHOLD_DB))
+    quiet = levels < threshold
+
+    # 连续静音区间的起止帧
+    edges = np.diff(np.concatenate(([0], quiet.astype(np.int8), [0])))
+    run_starts = np.flatnonzero(edges == 1)
+    run_ends = np.flatnonzero(edges == -1)
+
+    min_frames = int(round(min_silence / FRAME_SECONDS))
+    long_runs = (run_ends - run_starts) >= min_frames
+    cut_starts = run_starts[long_runs] * FRAME_SECONDS + padding
+    cut_ends = run_ends[long_runs] * FRAME_SECONDS - padding
+    # 音频开头和结尾的静音不需要保留两侧的余量
+    total = len(levels) * FRAME_SECONDS
+    cut_starts[cut_starts == padding] = 0.0
+    cut_ends[cut_ends == total - padding] = total
+    valid = cut_ends > cut_starts
+    cut_starts, cut_ends = cut_starts[valid], cut_ends[valid]
+    if not len(cut_starts):
+        return None
+
+    # 保留区域是静音区间的补集
+    keep_starts = np.concatenate(([0.0], cut_ends))
+    keep_ends = np.concatenate((cut_starts, [total]))
+    keep = keep_ends > keep_starts
+    regions = merge_regions(list(zip(keep_starts[keep].tolist(), keep_ends[keep].tolist())))
+    if not regions or (len(regions) == 1 and regions[0] == (0.0, total)):
+        return None
+
+    table = RemapTable(regions)
+    removed = total - table.duration
+    print(f"检测到 {len(cut_starts)} 段静音，裁掉 {removed:.0f} 秒（{removed / total:.0%}），"
+          f"裁剪后保留 {len(regions)} 个区域")
+    return table
@@ -0,0 +1,121 @@
+import os
+import threading
+from typing import Dict, Optional, Tuple
+from . import metrics
+from .audio_utils import DEFAULT_AUDIO_PROFILE
+from .jobs import Job, JobLockedError
+from .planner import available_workers, plan_long_video
+from .pipeline import resolve_video_info
+
+
+class Speculation:
+    """在查询原生字幕的同时，提前获取视频信息并下载长视频的音频
+
+    后台线程先获取视频信息；视频需要分段转录（超过 50 分钟且不是流式处理）时，
+    接着把原始音频下载到长视频任务目录，并登记为任务的 audio 阶段，之后的 Gemini 转录以 resume
+    方式打开任务，直接使用已下载的音频。
+
+    原生字幕获取成功时调用 cancel()：正在进行的下载在下一个数据块中止；close() 等待后台线程结束，
+    删除本次创建的任务目录（续传已有任务时只删除未完成的下载文件）。
+    """
+
+    def __init__(self, url: str, video_id: str, streaming: bool = False, resume: bool = False,
+                 remove_silence: bool = False, audio_profile: str = DEFAULT_AUDIO_PROFILE,
+                 segment_workers: int = 4):
+        self.url = url
+        self.video_id = video_id
+        self.streaming = streaming
+        self.resume = resume
+        self.remove_silence = remove_silence
+        self.audio_profile = audio_profile
+        self.segment_workers = segment_workers
+        self.video_info: Dict = {}
+        self.prefetched = False
+        self._job: Optional[Job] = None
+        self._fresh_job = False
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=metrics.bind(self._run), name='yt-t-speculative',
+                                        daemon=True)
+
+    def start(self) -> 'Speculation':
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            self._prefetch()
+        finally:
+            # 之后的 Gemini 转录会重新打开任务，这里不再持有任务锁
+            if self._job is not None:
+                self._job.release()
+
+    def _prefetch(self):
+        from .audio_utils import check_ffmpeg, download_audio
+        from .video_utils import should_split_video
+
+        with metrics.span('speculative', video_id=self.video_id) as span:
+            self.video_info = resolve_video_info(self.url)
+            duration = self.video_info.get('duration') or 0
+            if (self._cancel.is_set() or self.streaming or not should_split_video(duration)
+                    or not check_ffmpeg()):
+                return
+
+            if not self.resume and Job.saved_params(self.video_id) is not None:
+                # 不续传时打开任务会清空已有的中断任务；原生字幕获取成功时这些进度就白白丢失了，
+                # 因此不提前下载，由之后的 Gemini 转录（如果需要）按原来的方式处理
+                print("已有未完成的长视频任务，不提前下载音频（使用 --resume 继续该任务）")
+                return
+
+            # 按分段计划打开任务，之后的 Gemini 转录以 resume 方式沿用同样的参数
+            params = plan_long_video(self.video_id, duration, available_workers(self.segment_workers),
+                                     self.audio_profile, self.remove_silence, resume=self.resume)
+            try:
+                self._job = Job.open(self.video_id, self.url, params=params, resume=self.resume)
+            except JobLockedError as e:
+                print(f"跳过提前下载: {str(e)}")
+                return
+            self._fresh_job = not self._job.manifest['stages']
+            audio_stage = self._job.stage('audio')
+            if audio_stage and os.path.exists(audio_stage['path']):
+                self.prefetched = True
+                return
+
+            print("提前下载音频（获取到原生字幕时取消）...")
+            audio_path = download_audio(self.url, output_dir=self._job.dir, transcode=False,
+                                        info=self.video_info.get('info'), cancel=self._cancel)
+            span.set(download=True)
+            if audio_path and not self._cancel.is_set():
+                self._job.complete_stage('audio', path=audio_path)
+                self.prefetched = True
+
+    def cancel(self):
+        """不再需要提前获取的结果（原生字幕获取成功）"""
+        self._cancel.set()
+
+    def result(self) -> Tuple[Dict, bool]:
+        """等待后台线程结束
+
+        Returns:
+            (视频信息, 音频是否已下载到任务目录)；获取失败时视频信息为空字典
+        """
+        self._thread.join()
+        return self.video_info, self.prefetched
+
+    def close(self):
+        """等待后台线程结束；已取消时删除提前下载的文件"""
+        self._thread.join()
+        if not self._cancel.is_set() or self._job is None:
+            return
+        try:
+            self._job.acquire()
+        except JobLockedError:
+            # 任务已被其他进程接手，保留任务目录
+            return
+        if self._fresh_job:
+            self._job.cleanup()
+            return
+        # 续传的已有任务保留原有进度，只删除 yt-dlp 未完成的下载文件
+        for name in os.listdir(self._job.dir):
+            if name.endswith(('.part', '.ytdl')):
+                os.remove(os.path.join(self._job.dir, name))
+        self._job.release()
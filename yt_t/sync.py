@@ -0,0 +1,290 @@
+import os
+import re
+import time
+import sqlite3
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+from . import metrics
+from .cache import get_cache_dir
+
+# 频道视频列表按发布时间从新到旧排列：连续遇到这么多个之前同步过的视频后停止翻页
+KNOWN_STREAK = 30
+
+# 转录失败的视频在之后的同步中最多再尝试的总次数，超过后跳过（--retry-failed 重新尝试）
+MAX_SYNC_ATTEMPTS = 3
+
+# 视频在索引中的状态
+DONE = 'done'
+FAILED = 'failed'
+
+_CHANNEL_PATTERN = re.compile(r'youtube\.com/(?:@[^/?#]+|channel/[^/?#]+|c/[^/?#]+|user/[^/?#]+)')
+
+
+def get_index_path() -> str:
+    """同步索引的路径，可通过 YT_T_SYNC_INDEX 环境变量覆盖"""
+    return os.environ.get("YT_T_SYNC_INDEX") or os.path.join(get_cache_dir(), "sync.sqlite")
+
+
+def is_channel_url(url: str) -> bool:
+    """是否为频道地址（而不是播放列表）"""
+    return bool(_CHANNEL_PATTERN.search(url)) and 'list=' not in url
+
+
+def iter_entries(url: str, known: Optional[Callable[[str], bool]] = None,
+                 stopped: Optional[List[str]] = None) -> Iterator[Dict]:
+    """展开播放列表或频道，逐个返回其中的视频
+
+    使用 yt-dlp 的 flat 提取，只读取列表页面（每页约 100 个视频），不解析每个视频的页面；
+    条目按页按需获取，调用方停止迭代后不再请求后续页面。频道首页包含视频、Shorts、直播等多个标签页，
+    依次展开。
+
+    提供 known 时，每个标签页 / 播放列表分别计数：连续遇到 KNOWN_STREAK 个 known 返回 True 的视频后
+    不再读取该列表的后续页面，继续展开下一个标签页；提前停止的列表地址追加到 stopped。
+
+    Yields:
+        {'video_id', 'url', 'title', 'duration'}
+    """
+    import yt_dlp
+
+    ydl_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'extract_flat': True,
+        'lazy_playlist': True,
+    }
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        yield from _walk(ydl, url, set(), known, stopped)
+
+
+def _walk(ydl, url: str, visited: Set[str], known: Optional[Callable[[str], bool]],
+          stopped: Optional[List[str]]) -> Iterator[Dict]:
+    if url in visited:
+        return
+    visited.add(url)
+
+    # process=False 时 entries 为按页获取的生成器
+    info = ydl.extract_info(url, download=False, process=False)
+    if info.get('_type') not in ('playlist', 'multi_video'):
+        if info.get('id'):
+            yield _entry(info)
+        return
+
+    streak = 0
+    for entry in info.get('entries') or []:
+        if not entry:
+            continue
+        # 频道的标签页、播放列表中嵌套的播放列表
+        if entry.get('_type') == 'playlist' or entry.get('ie_key') == 'YoutubeTab':
+            if entry.get('url'):
+                yield from _walk(ydl, entry['url'], visited, known, stopped)
+            continue
+        if entry.get('id'):
+            yield _entry(entry)
+            if known is None:
+                continue
+            streak = streak + 1 if known(entry['id']) else 0
+            if streak >= KNOWN_STREAK:
+                if stopped is not None:
+                    stopped.append(url)
+                return
+
+
+def _entry(entry: Dict) -> Dict:
+    video_id = entry['id']
+    return {
+        'video_id': video_id,
+        'url': f"https://www.youtube.com/watch?v={video_id}",
+        'title': entry.get('title') or '',
+        'duration': entry.get('duration'),
+    }
+
+
+class SyncIndex:
+    """已转录视频的本地索引（SQLite）
+
+    videos 表按视频ID记录同步过的视频：成功转录的输出路径，或失败的次数和错误信息。
+    与来源无关，同一视频出现在多个播放列表中时只转录一次。
+    sources 表记录每个播放列表 / 频道最近一次同步的时间和结果。
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        if path is None:
+            path = get_index_path()
+        self.path = path
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS videos (
+                video_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                source_url TEXT,
+                title TEXT,
+                transcript_source TEXT,
+                path TEXT,
+                error TEXT,
+                synced_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS sources (
+                url TEXT PRIMARY KEY,
+                last_sync REAL NOT NULL,
+                entries INTEGER NOT NULL,
+                new INTEGER NOT NULL,
+                failed INTEGER NOT NULL
+            )"""
+        )
+        self._conn.commit()
+
+    def states(self) -> Dict[str, Tuple[str, int]]:
+        """所有同步过的视频：视频ID -> (状态, 尝试次数)"""
+        with self._lock:
+            rows = self._conn.execute("SELECT video_id, status, attempts FROM videos").fetchall()
+        return {video_id: (status, attempts) for video_id, status, attempts in rows}
+
+    def mark_done(self, video_id: str, source_url: str, title: str, transcript_source: str,
+                  path: str):
+        with self._lock:
+            self._conn.execute(
+                """INSERT INTO videos
+                   (video_id, status, attempts, source_url, title, transcript_source, path, synced_at)
+                   VALUES (?, ?, 1, ?, ?, ?, ?, ?)
+                   ON CONFLICT (video_id) DO UPDATE SET
+                       status = excluded.status, attempts = attempts + 1, source_url = excluded.source_url,
+                       title = excluded.title, transcript_source = excluded.transcript_source,
+                       path = excluded.path, error = NULL, synced_at = excluded.synced_at""",
+                (video_id, DONE, source_url, title, transcript_source, path, time.time()),
+            )
+            self._conn.commit()
+
+    def mark_failed(self, video_id: str, source_url: str, title: str, error: str):
+        with self._lock:
+            self._conn.execute(
+                """INSERT INTO videos (video_id, status, attempts, source_url, title, error, synced_at)
+                   VALUES (?, ?, 1, ?, ?, ?, ?)
+                   ON CONFLICT (video_id) DO UPDATE SET
+                       status = excluded.status, attempts = attempts + 1, error = excluded.error,
+                       synced_at = excluded.synced_at""",
+                (video_id, FAILED, source_url, title, error, time.time()),
+            )
+            self._conn.commit()
+
+    def record_sync(self, url: str, entries: int, new: int, failed: int):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sources (url, last_sync, entries, new, failed) VALUES (?, ?, ?, ?, ?)",
+                (url, time.time(), entries, new, failed),
+            )
+            self._conn.commit()
+
+    def sources(self) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url, last_sync, entries, new, failed FROM sources ORDER BY url"
+            ).fetchall()
+        return [dict(zip(('url', 'last_sync', 'entries', 'new', 'failed'), row)) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def find_new(url: str, states: Dict[str, Tuple[str, int]], full: bool = False,
+             retry_failed: bool = False) -> Dict:
+    """展开播放列表或频道，找出需要处理的视频
+
+    需要处理的是索引中没有的视频，以及失败次数少于 MAX_SYNC_ATTEMPTS 的视频（retry_failed 时不限次数）。
+    频道的视频列表从新到旧排列，某个标签页（视频、Shorts、直播）中连续遇到 KNOWN_STREAK 个同步过的视频
+    （无论成功与否）时认为该标签页之后都已同步，不再翻页，继续读取下一个标签页；播放列表的顺序由作者决定，总是读取全部条目。full 为 True 时频道也读取全部条目。
+
+    Returns:
+        {'entries': 已读取的条目数, 'new': [新视频, ...], 'complete': 是否读取了全部条目}；
+        展开失败时返回 None
+    """
+    known = None if full or not is_channel_url(url) else (lambda video_id: video_id in states)
+    stopped = []
+    seen = set()
+    new = []
+    scanned = 0
+    with metrics.span('expand', url=url) as span:
+        try:
+            for entry in iter_entries(url, known, stopped):
+                video_id = entry['video_id']
+                if video_id in seen:
+                    continue
+                seen.add(video_id)
+                scanned += 1
+                state = states.get(video_id)
+                if state is None:
+                    new.append(entry)
+                    continue
+
+                status, attempts = state
+                if status == FAILED and (retry_failed or attempts < MAX_SYNC_ATTEMPTS):
+                    new.append(entry)
+        except Exception as e:
+            span.set(status='error', error=str(e))
+            print(f"展开播放列表 / 频道失败: {str(e)}")
+            return None
+        span.set(entries=scanned, new=len(new))
+    return {'entries': scanned, 'new': new, 'complete': not stopped}
+
+
+def sync_sources(urls: List[str], runner, index: SyncIndex, full: bool = False,
+                 retry_failed: bool = False, dry_run: bool = False) -> List[Dict]:
+    """同步多个播放列表 / 频道：只转录之前没有成功转录的视频
+
+    需要处理的视频交给 BatchRunner，每个视频结束后立即写入索引（中断后重新运行不会重复处理）；
+    失败的视频在之后的同步中重试，最多 MAX_SYNC_ATTEMPTS 次。
+
+    Returns:
+        每个来源的同步结果 {'url', 'entries', 'new', 'results', 'error'}
+    """
+    states = index.states()
+    reports = []
+    for url in urls:
+        print(f"正在展开: {url}")
+        found = find_new(url, states, full=full, retry_failed=retry_failed)
+        if found is None:
+            reports.append({'url': url, 'entries': 0, 'new': [], 'results': [],
+                            'error': '展开播放列表 / 频道失败'})
+            continue
+
+        new = found['new']
+        scope = '' if found['complete'] else '（之后的视频均已处理，停止翻页）'
+        print(f"读取 {found['entries']} 个视频{scope}，需要处理 {len(new)} 个")
+        report = {'url': url, 'entries': found['entries'], 'new': new, 'results': [], 'error': None}
+        reports.append(report)
+        if dry_run or not new:
+            if not dry_run:
+                index.record_sync(url, found['entries'], 0, 0)
+            continue
+
+        futures = []
+        for entry in new:
+            result, future = runner.submit(entry['url'])
+            future.add_done_callback(lambda f, entry=entry: _mark(index, url, entry, f))
+            futures.append(future)
+        report['results'] = [future.result() for future in futures]
+        # 同一视频出现在本次同步的多个来源中时只处理一次（失败的视频留到下次同步）
+        for entry in new:
+            states[entry['video_id']] = (DONE, 0)
+
+        failed = sum(1 for r in report['results'] if r['status'] != 'ok')
+        index.record_sync(url, found['entries'], len(new), failed)
+    return reports
+
+
+def _mark(index: SyncIndex, source_url: str, entry: Dict, future):
+    if future.cancelled() or future.exception() is not None:
+        return
+    result = future.result()
+    if result['status'] == 'ok':
+        index.mark_done(entry['video_id'], source_url, entry['title'], result['source'], result['path'])
+    else:
+        index.mark_failed(entry['video_id'], source_url, entry['title'], result['error'] or '处理失败')
@@ -0,0 +1,106 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Iterable, Optional
+from .cache import get_cache_dir
+
+# Gemini Files API 的文件保留 48 小时；未返回过期时间时按此估算
+DEFAULT_FILE_TTL = 48 * 3600
+
+# 距离过期不足该时间（秒）的文件不再复用，避免转录过程中文件过期
+EXPIRY_MARGIN = 30 * 60
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """计算文件内容的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class UploadRegistry:
+    """已上传到 Gemini 的文件登记表
+
+    以音频内容的哈希为键，记录远程文件名、URI、MIME 类型和过期时间。
+    重试或重新运行时，内容相同且未过期的文件直接复用，不再重复上传。
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        if path is None:
+            path = os.path.join(get_cache_dir(), "uploads.sqlite")
+        self.path = path
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS uploads (
+                sha256 TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                uri TEXT NOT NULL,
+                mime_type TEXT,
+                size INTEGER,
+                expires_at REAL NOT NULL,
+                uploaded_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_uploads_name ON uploads (name)")
+        self._conn.commit()
+
+    def lookup(self, sha256: str) -> Optional[Dict]:
+        """查找仍然有效的上传记录"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT name, uri, mime_type, expires_at FROM uploads WHERE sha256 = ?", (sha256,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[3] - EXPIRY_MARGIN <= time.time():
+                self._conn.execute("DELETE FROM uploads WHERE sha256 = ?", (sha256,))
+                self._conn.commit()
+                return None
+        return {'name': row[0], 'uri': row[1], 'mime_type': row[2], 'expires_at': row[3]}
+
+    def record(self, sha256: str, name: str, uri: str, mime_type: Optional[str] = None,
+               size: Optional[int] = None, expires_at: Optional[float] = None):
+        """登记一次上传"""
+        now = time.time()
+        if expires_at is None:
+            expires_at = now + DEFAULT_FILE_TTL
+        with self._lock:
+            self._conn.execute(
+                """INSERT OR REPLACE INTO uploads
+                   (sha256, name, uri, mime_type, size, expires_at, uploaded_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (sha256, name, uri, mime_type, size, expires_at, now),
+            )
+            self._conn.commit()
+
+    def forget(self, names: Iterable[str]):
+        """删除指定远程文件名的登记（文件已删除或已失效）"""
+        with self._lock:
+            self._conn.executemany("DELETE FROM uploads WHERE name = ?", [(n,) for n in names])
+            self._conn.commit()
+
+
+_registry: Optional[UploadRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_upload_registry() -> Optional[UploadRegistry]:
+    """获取进程内共享的上传登记表，无法打开时返回 None（不影响上传）"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            try:
+                _registry = UploadRegistry()
+            except Exception as e:
+                print(f"无法打开上传登记表，本次不复用已上传文件: {str(e)}")
+                return None
+        return _registry
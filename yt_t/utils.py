@@ -1,8 +1,9 @@
 import re
 import os
+import sys
+import tempfile
 from datetime import datetime
-from typing import Optional
-import requests
+from typing import Optional, TextIO
 
 
 def sanitize_filename(filename: str) -> str:
@@ -13,12 +14,32 @@ def sanitize_filename(filename: str) -> str:
 
 
 def get_video_title(video_id: str) -> Optional[str]:
-    """Get video title from YouTube (simplified without API)"""
+    """Get video title from YouTube (simplified without API)
+
+    Uses the small oEmbed JSON response first and only falls back to
+    scraping the watch page when oEmbed is unavailable.
+    """
+    import requests
+
+    url = f"https://www.youtube.com/watch?v={video_id}"
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+    }
+    try:
+        response = requests.get(
+            "https://www.youtube.com/oembed",
+            params={'url': url, 'format': 'json'},
+            headers=headers,
+            timeout=10,
+        )
+        if response.ok:
+            title = response.json().get('title')
+            if title:
+                return title
+    except Exception:
+        pass
+
     try:
-        url = f"https://www.youtube.com/watch?v={video_id}"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
         response = requests.get(url, headers=headers, timeout=10)
         
         match = re.search(r'<title>(.*?) - YouTube</title>', response.text)
@@ -35,8 +56,105 @@ def get_video_title(video_id: str) -> Optional[str]:
     return None
 
 
-def save_transcript(transcript: str, video_id: str, video_url: str, output_dir: str = None) -> str:
-    """Save transcript to file"""
+class TranscriptWriter:
+    """Incrementally write a transcript to a file or stdout
+
+    Text is appended to a temporary file next to the target as it arrives
+    and renamed into place on commit(), so readers never see a half-written
+    transcript. abort() keeps whatever was written as ``<path>.partial``.
+    A path of ``-`` writes straight to ``stream`` (stdout by default).
+    """
+
+    def __init__(self, path: str, header: str = "", stream: Optional[TextIO] = None):
+        self.path = path
+        self._tmp_path = None
+        if path == '-':
+            self._file = stream or sys.stdout
+        else:
+            directory = os.path.dirname(path) or '.'
+            os.makedirs(directory, exist_ok=True)
+            fd, self._tmp_path = tempfile.mkstemp(
+                prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory
+            )
+            self._file = os.fdopen(fd, 'w', encoding='utf-8')
+        if header:
+            self._file.write(header)
+        self.body_offset = self.tell()
+
+    @property
+    def temp_path(self) -> Optional[str]:
+        """The file being written until commit()/abort(); None for ``-``"""
+        return self._tmp_path
+
+    def write(self, text: str):
+        self._file.write(text)
+        self._file.flush()
+
+    def tell(self) -> int:
+        return self._file.tell() if self._tmp_path else 0
+
+    def rewind(self, offset: int):
+        """Discard everything written after ``offset`` (used when a stream is retried)"""
+        if self._tmp_path:
+            self._file.seek(offset)
+            self._file.truncate()
+        else:
+            print("\n[输出流重试，以下内容从头开始]", file=sys.stderr)
+
+    def commit(self) -> str:
+        """Move the finished transcript into place and return its path"""
+        if not self._tmp_path:
+            self._file.flush()
+            return self.path
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+        self._tmp_path = None
+        return os.path.abspath(self.path)
+
+    def abort(self) -> Optional[str]:
+        """Keep the partial output as ``<path>.partial`` and return that path"""
+        if not self._tmp_path:
+            return None
+        self._file.close()
+        partial_path = None
+        if os.path.getsize(self._tmp_path) > self.body_offset:
+            partial_path = self.path + ".partial"
+            os.replace(self._tmp_path, partial_path)
+        else:
+            os.remove(self._tmp_path)
+        self._tmp_path = None
+        return partial_path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+
+def transcript_header(video_id: str, video_url: str, title: Optional[str] = None) -> str:
+    """Build the header block written at the top of saved transcripts"""
+    header = f"原始视频地址: {video_url}\n"
+    header += f"视频ID: {video_id}\n"
+    if title:
+        header += f"视频标题: {title}\n"
+    header += f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+    header += "=" * 50 + "\n\n"
+    return header
+
+
+def open_transcript_writer(video_id: str, video_url: str, output_dir: str = None,
+                           title: Optional[str] = None, extension: str = 'txt',
+                           header: bool = True) -> TranscriptWriter:
+    """Open a writer for the default transcript file with its header already written
+
+    When the caller already resolved the video metadata, pass its title
+    to skip the extra title lookup. Pass ``header=False`` for subtitle
+    formats (srt, vtt, json) that must not start with the info block.
+    """
     # 默认保存目录
     if output_dir is None:
         output_dir = "transcripts"
@@ -44,25 +162,33 @@ def save_transcript(transcript: str, video_id: str, video_url: str, output_dir:
     # 确保输出目录存在
     os.makedirs(output_dir, exist_ok=True)
     
-    title = get_video_title(video_id)
+    if title is None:
+        title = get_video_title(video_id)
     
-    if title:
-        filename = f"{sanitize_filename(title)}_transcript_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    if title and header:
+        filename = f"{sanitize_filename(title)}_transcript_{timestamp}.{extension}"
+    elif title:
+        # Headerless formats carry the video ID in the name so the file can still be indexed
+        filename = f"{sanitize_filename(title)}_transcript_{video_id}_{timestamp}.{extension}"
     else:
-        filename = f"youtube_transcript_{video_id}.txt"
+        filename = f"youtube_transcript_{video_id}.{extension}"
     
     # 组合完整路径
     filepath = os.path.join(output_dir, filename)
     
-    content = f"原始视频地址: {video_url}\n"
-    content += f"视频ID: {video_id}\n"
-    if title:
-        content += f"视频标题: {title}\n"
-    content += f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-    content += "=" * 50 + "\n\n"
-    content += transcript
-    
-    with open(filepath, 'w', encoding='utf-8') as f:
-        f.write(content)
+    return TranscriptWriter(filepath, transcript_header(video_id, video_url, title) if header else "")
+
+
+def save_transcript(transcript: str, video_id: str, video_url: str, output_dir: str = None,
+                    title: Optional[str] = None) -> str:
+    """Save transcript to file
+
+    When the caller already resolved the video metadata, pass its title
+    to skip the extra title lookup.
+    """
+    writer = open_transcript_writer(video_id, video_url, output_dir, title)
+    with writer:
+        writer.write(transcript)
     
-    return os.path.abspath(filepath)
\ No newline at end of file
+    return os.path.abspath(writer.path)
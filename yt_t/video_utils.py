@@ -1,29 +1,50 @@
-import yt_dlp
 from typing import Dict, List, Tuple, Optional
 import math
+import threading
+
+_local = threading.local()
+
+
+def _info_extractor():
+    """当前线程复用的 YoutubeDL 实例
+
+    YoutubeDL 不是线程安全的，每个线程各用一个；同一线程处理多个视频时（批量处理、yt-t serve），
+    提取器实例及其缓存的播放器代码和网络连接在视频之间保留，不必每次重新初始化。
+    """
+    ydl = getattr(_local, 'ydl', None)
+    if ydl is None:
+        import yt_dlp
+
+        ydl_opts = {
+            'format': 'bestaudio/best',
+            'quiet': True,
+            'no_warnings': True,
+            'extract_flat': False,
+        }
+        ydl = _local.ydl = yt_dlp.YoutubeDL(ydl_opts)
+    return ydl
 
 
 def get_video_info(url: str) -> Dict:
-    """获取YouTube视频信息，包括时长"""
-    ydl_opts = {
-        'quiet': True,
-        'no_warnings': True,
-        'extract_flat': False,
-    }
+    """获取YouTube视频信息，包括时长
     
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        try:
-            info = ydl.extract_info(url, download=False)
-            return {
-                'title': info.get('title', ''),
-                'duration': info.get('duration', 0),  # 秒
-                'video_id': info.get('id', ''),
-                'uploader': info.get('uploader', ''),
-                'upload_date': info.get('upload_date', ''),
-            }
-        except Exception as e:
-            print(f"获取视频信息失败: {str(e)}")
-            return None
+    每个任务只需调用一次：返回的字典中 'info' 为 yt-dlp 的完整信息（已按音频下载选好格式），
+    可直接传给 download_audio / stream_audio_segments，避免再次解析视频页面。
+    """
+    ydl = _info_extractor()
+    try:
+        info = ydl.extract_info(url, download=False)
+        return {
+            'title': info.get('title', ''),
+            'duration': info.get('duration', 0),  # 秒
+            'video_id': info.get('id', ''),
+            'uploader': info.get('uploader', ''),
+            'upload_date': info.get('upload_date', ''),
+            'info': info,
+        }
+    except Exception as e:
+        print(f"获取视频信息失败: {str(e)}")
+        return None
 
 
 def calculate_segments(duration_seconds: int, segment_minutes: int = 50) -> List[Tuple[int, int]]:
@@ -0,0 +1,143 @@
+import os
+import socket
+import threading
+import contextvars
+from typing import Dict, Optional
+from . import metrics
+from .batch import BatchRunner
+from .jobqueue import JobQueue, DEFAULT_LEASE_SECONDS, DEAD
+
+# 队列为空时再次检查的间隔（秒）
+DEFAULT_POLL_SECONDS = 5.0
+
+# 当前上下文正在处理的 (worker, 任务)；分段转录等线程池中的工作通过 metrics.bind() 继承
+_current_job: contextvars.ContextVar = contextvars.ContextVar('yt_t_worker_job', default=None)
+
+
+class QueueWorker:
+    """从共享队列领取任务并处理
+
+    每个处理线程依次领取一个任务，在本线程中完成原生字幕 / Gemini 转录（BatchRunner.process）；
+    一个后台线程定期为所有进行中的任务续约。任务各阶段（metrics span）的开始和结束
+    记录为任务的阶段变化（随续约写入队列），包括长视频在分段线程池中执行的上传、生成等阶段。
+    """
+
+    def __init__(self, queue: JobQueue, runner: BatchRunner, name: Optional[str] = None,
+                 lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                 poll_interval: float = DEFAULT_POLL_SECONDS):
+        self.queue = queue
+        self.runner = runner
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.processed = 0
+        self._claimed = 0
+        self._active: Dict[int, Dict] = {}  # 线程 ID -> 正在处理的任务
+        self._lock = threading.Lock()
+        self._stop = threading.Event()       # 不再领取新任务
+        self._finished = threading.Event()   # 所有处理线程已结束，停止续约
+
+    def run(self, concurrency: int = 1, exit_when_idle: bool = False,
+            max_jobs: Optional[int] = None) -> int:
+        """启动处理线程，直到收到 Ctrl+C、队列为空（exit_when_idle）或处理完 max_jobs 个任务
+
+        Returns:
+            本次处理的任务数
+        """
+        metrics.add_listener(self._on_stage)
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name='yt-t-heartbeat', daemon=True)
+        heartbeat.start()
+        threads = [
+            threading.Thread(target=self._work_loop, args=(f"{self.name}/{i}", exit_when_idle, max_jobs),
+                             name=f'yt-t-worker-{i}', daemon=True)
+            for i in range(max(1, concurrency))
+        ]
+        for thread in threads:
+            thread.start()
+
+        print(f"worker {self.name} 已启动（并发数: {len(threads)}，队列: {self.queue.path}）")
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=1.0)
+        except KeyboardInterrupt:
+            print("\n不再领取新任务，等待进行中的任务结束（再次 Ctrl+C 立即退出，任务会在租约过期后重新排队）...")
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+        finally:
+            self._stop.set()
+            self._finished.set()
+            metrics.remove_listener(self._on_stage)
+        return self.processed
+
+    def _work_loop(self, worker: str, exit_when_idle: bool, max_jobs: Optional[int]):
+        while not self._stop.is_set():
+            with self._lock:
+                if max_jobs is not None and self._claimed >= max_jobs:
+                    return
+                self._claimed += 1
+            try:
+                job = self.queue.lease(worker, self.lease_seconds)
+            except Exception as e:
+                print(f"领取任务失败: {str(e)}")
+                job = None
+            if job is None:
+                with self._lock:
+                    self._claimed -= 1
+                if exit_when_idle:
+                    return
+                self._stop.wait(self.poll_interval)
+                continue
+            self._process(job)
+
+    def _process(self, job: Dict):
+        print(f"领取任务 #{job['id']}（第 {job['attempts']} 次尝试）: {job['url']}")
+        ident = threading.get_ident()
+        with self._lock:
+            self._active[ident] = job
+        token = _current_job.set((self, job))
+        try:
+            try:
+                result = self.runner.process(job['url'])
+            except Exception as e:
+                result = {'status': 'failed', 'error': str(e), 'source': None, 'path': None}
+        finally:
+            _current_job.reset(token)
+            with self._lock:
+                self._active.pop(ident, None)
+                self.processed += 1
+
+        if result['status'] == 'ok':
+            if not self.queue.complete(job, result['source'], result['path']):
+                print(f"任务 #{job['id']} 的租约已失效，结果没有记录到队列（字幕已保存到 {result['path']}）")
+            return
+
+        status = self.queue.fail(job, result['error'] or '处理失败')
+        if status is None:
+            print(f"任务 #{job['id']} 的租约已失效")
+        elif status == DEAD:
+            print(f"任务 #{job['id']} 已达到最大尝试次数，转入 dead: {result['error']}")
+        else:
+            print(f"任务 #{job['id']} 失败，稍后重试: {result['error']}")
+
+    def _on_stage(self, stage: str, status: str, fields: Dict):
+        # 按上下文而不是线程查找任务：分段转录的阶段在线程池中执行
+        current = _current_job.get()
+        if current is None or current[0] is not self:
+            return
+        job = current[1]
+        detail = fields.get('error') if status == 'error' else None
+        self.queue.record_stage(job, stage, status, detail)
+
+    def _heartbeat_loop(self):
+        interval = max(1.0, min(30.0, self.lease_seconds / 3))
+        while not self._finished.wait(interval):
+            with self._lock:
+                jobs = list(self._active.values())
+            for job in jobs:
+                try:
+                    if not self.queue.heartbeat(job, self.lease_seconds):
+                        print(f"任务 #{job['id']} 的租约已失效，可能已被其他 worker 领取")
+                except Exception as e:
+                    print(f"续约失败: {str(e)}")
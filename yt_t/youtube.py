@@ -1,8 +1,30 @@
-from typing import Optional, List, Dict
-from youtube_transcript_api import YouTubeTranscriptApi
-from youtube_transcript_api.formatters import TextFormatter
+from typing import Optional, List, Dict, Tuple
 import re
+import threading
 from urllib.parse import urlparse, parse_qs
+from . import metrics
+from .cues import CueList, CUES_VERSION, from_native_entries, serialize
+
+# 原生字幕缓存格式的版本，格式变化或选择字幕轨道的规则变化时需要修改，使旧缓存失效
+NATIVE_FORMAT_VERSION = f"{CUES_VERSION}:tracks-v2"
+
+# 同一种文字的其他语言代码，按优先级排列（YouTube 上简体中文字幕可能标为 zh-CN、zh-Hans 或 zh）
+LANGUAGE_ALIASES = {
+    'zh': ['zh-Hans', 'zh-CN'],
+    'zh-CN': ['zh-Hans', 'zh', 'zh-SG'],
+    'zh-SG': ['zh-Hans', 'zh-CN', 'zh'],
+    'zh-Hans': ['zh-CN', 'zh', 'zh-SG'],
+    'zh-TW': ['zh-Hant', 'zh-HK'],
+    'zh-HK': ['zh-Hant', 'zh-TW'],
+    'zh-Hant': ['zh-TW', 'zh-HK'],
+}
+
+# 字幕轨道的类型，按选择的优先级排列
+TRACK_MANUAL = 'manual'
+TRACK_GENERATED = 'generated'
+TRACK_TRANSLATED = 'translated'
+
+_local = threading.local()
 
 
 def extract_video_id(url: str) -> Optional[str]:
@@ -28,68 +50,120 @@ def extract_video_id(url: str) -> Optional[str]:
     return None
 
 
-def get_native_subtitles(video_id: str) -> Optional[str]:
-    """Get native subtitles from YouTube with language priority"""
-    # 语言优先级：英文 -> 中文 -> 其他可用语言
-    preferred_languages = ['en', 'zh-CN', 'zh', 'zh-Hans', 'zh-Hant']
-    
+def get_native_subtitles(video_id: str, language: str = 'zh-CN') -> Optional[str]:
+    """Get native subtitles from YouTube as `[mm:ss] text` lines"""
+    cues = get_native_cues(video_id, language)
+    return serialize(cues, 'txt') if cues is not None else None
+
+
+def list_tracks(video_id: str):
+    """List the caption tracks of a video (one request)
+
+    The returned TranscriptList can be passed to get_native_cues / get_available_languages
+    so the listing is fetched only once per video.
+    """
+    from youtube_transcript_api import YouTubeTranscriptApi
+
+    if not hasattr(YouTubeTranscriptApi, 'list'):
+        # youtube-transcript-api < 1.0
+        return YouTubeTranscriptApi.list_transcripts(video_id)
+    # 每个线程复用一个实例（及其 HTTP 连接）
+    api = getattr(_local, 'api', None)
+    if api is None:
+        api = _local.api = YouTubeTranscriptApi()
+    return api.list(video_id)
+
+
+def language_candidates(language: str) -> List[str]:
+    """Language codes that satisfy the requested language, best first"""
+    candidates = [language] + LANGUAGE_ALIASES.get(language, [])
+    base = language.split('-')[0]
+    if base not in candidates and base != 'zh':
+        candidates.append(base)
+    return candidates
+
+
+def match_language(codes: List[str], language: str) -> Optional[str]:
+    """Pick the code in `codes` that best matches the requested language
+
+    Exact codes and aliases come first, then regional variants of the same language
+    (`en` matches `en-US`); Simplified and Traditional Chinese never match each other.
+    """
+    for candidate in language_candidates(language):
+        if candidate in codes:
+            return candidate
+    base = language.split('-')[0]
+    if base == 'zh':
+        return None
+    return next((code for code in codes if code.split('-')[0] == base), None)
+
+
+def _translation_codes(transcript) -> List[str]:
+    # 0.6.x 为字典，1.x 为对象
+    return [lang['language_code'] if isinstance(lang, dict) else lang.language_code
+            for lang in transcript.translation_languages]
+
+
+def select_track(tracks, language: str) -> Tuple[Optional[object], Optional[str]]:
+    """Choose the caption track for the requested language
+
+    Order: a manual track in that language, an auto-generated track in that language,
+    then a YouTube translation (from a manual track if possible) into that language.
+
+    Returns:
+        (transcript, track kind), or (None, None) when none of them is available
+    """
+    tracks = list(tracks)
+    for kind, generated in ((TRACK_MANUAL, False), (TRACK_GENERATED, True)):
+        by_code = {t.language_code: t for t in tracks if t.is_generated == generated}
+        code = match_language(list(by_code), language)
+        if code:
+            return by_code[code], kind
+
+    # 人工字幕的翻译质量通常好于自动生成字幕的翻译
+    for transcript in sorted((t for t in tracks if t.is_translatable), key=lambda t: t.is_generated):
+        code = match_language(_translation_codes(transcript), language)
+        if code:
+            return transcript.translate(code), TRACK_TRANSLATED
+    return None, None
+
+
+def get_native_cues(video_id: str, language: str = 'zh-CN', tracks=None) -> Optional[CueList]:
+    """Get native subtitles from YouTube in the requested language
+
+    Keeps the exact start and end times of every entry. `tracks` is an already fetched
+    track listing (see list_tracks); returns None when no track fits, so the caller can
+    fall back to Gemini.
+    """
     try:
-        # 获取所有可用字幕
-        transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
-        available_transcripts = {}
-        
-        # 收集所有可用的字幕语言
-        for transcript in transcript_list:
-            available_transcripts[transcript.language_code] = transcript
-            print(f"发现字幕语言: {transcript.language_code} ({transcript.language})")
-        
-        # 按优先级尝试获取字幕
-        selected_transcript = None
-        selected_language = None
-        
-        for lang in preferred_languages:
-            if lang in available_transcripts:
-                selected_transcript = available_transcripts[lang]
-                selected_language = lang
-                print(f"选择字幕语言: {lang}")
-                break
-        
-        # 如果优先语言都没有，选择第一个可用的
-        if not selected_transcript and available_transcripts:
-            first_lang = list(available_transcripts.keys())[0]
-            selected_transcript = available_transcripts[first_lang]
-            selected_language = first_lang
-            print(f"使用可用字幕语言: {first_lang}")
-        
-        if not selected_transcript:
-            print("未找到任何可用字幕")
+        if tracks is None:
+            tracks = list_tracks(video_id)
+        tracks = list(tracks)
+        for transcript in tracks:
+            kind = '自动生成' if transcript.is_generated else '人工'
+            print(f"发现字幕语言: {transcript.language_code} ({transcript.language}, {kind})")
+
+        selected, kind = select_track(tracks, language)
+        if selected is None:
+            print(f"未找到 {language} 字幕，也无法翻译为 {language}")
             return None
-        
-        # 获取字幕内容
-        transcript_data = selected_transcript.fetch()
-        
-        formatted_transcript = []
-        for entry in transcript_data:
-            start_time = int(entry.start)
-            minutes = start_time // 60
-            seconds = start_time % 60
-            timestamp = f"[{minutes:02d}:{seconds:02d}]"
-            text = entry.text.replace('\n', ' ')
-            formatted_transcript.append(f"{timestamp} {text}")
-        
-        return '\n'.join(formatted_transcript)
-        
+
+        print(f"选择字幕: {selected.language_code}（{kind}）")
+        metrics.current().set(track=kind, track_language=selected.language_code)
+        return from_native_entries(selected.fetch())
+
     except Exception as e:
         print(f"无法获取原生字幕: {str(e)}")
         return None
 
 
-def get_available_languages(video_id: str) -> List[Dict]:
+def get_available_languages(video_id: str, tracks=None) -> List[Dict]:
     """Get available subtitle languages for a video"""
     try:
-        transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
+        if tracks is None:
+            tracks = list_tracks(video_id)
         languages = []
-        for transcript in transcript_list:
+        for transcript in tracks:
             languages.append({
                 'code': transcript.language_code,
                 'name': transcript.language,
@@ -98,4 +172,4 @@ def get_available_languages(video_id: str) -> List[Dict]:
             })
         return languages
     except:
-        return []
\ No newline at end of file
+        return []